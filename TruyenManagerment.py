@@ -1,18 +1,42 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog, Checkbutton, IntVar, DoubleVar, StringVar
-import json
+from tkinter import ttk, messagebox, simpledialog, Checkbutton
 import os
 from datetime import datetime
 import tkinter.scrolledtext as scrolledtext
-import shutil
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from storage import StoreTransaction, recover_store
+import metrics
+import codec
+from widgets import VirtualTreeview, Tooltip
+from watcher import LibraryWatcher
 
 COMICS_DIR = 'comics'
 COMIC_INDEX = os.path.join(COMICS_DIR, 'comic-index.json')
 
+def set_comics_dir(path):
+    """Point the folder-layout functions at another comics/ directory; returns the previous one."""
+    global COMICS_DIR, COMIC_INDEX
+    previous = COMICS_DIR
+    COMICS_DIR = path
+    COMIC_INDEX = os.path.join(COMICS_DIR, 'comic-index.json')
+    return previous
+
 def get_current_datetime():
     """Return current datetime in ISO format."""
     return datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
 
+@lru_cache(maxsize=65536)
+def format_iso_date(date_str):
+    """Format an ISO date string as 'YYYY-MM-DD HH:MM' (cached: lists repeat the same dates)."""
+    try:
+        dt = datetime.strptime(date_str, '%Y-%m-%dT%H:%M:%SZ')
+        return dt.strftime('%Y-%m-%d %H:%M')
+    except:
+        return date_str
+
 def ensure_comics_dir():
     if not os.path.exists(COMICS_DIR):
         os.makedirs(COMICS_DIR)
@@ -26,38 +50,277 @@ def get_comic_metadata_path(comic_id):
 def get_chapter_path(comic_id, vol, chap):
     return os.path.join(get_comic_folder(comic_id), f'chapter_{vol}_{chap}.json')
 
-def load_comics():
+class LazyChapter(dict):
+    """A chapter whose body is read from its file the first time it is used.
+
+    Until then only the 'vol' and 'chap' values from the link in comic.json are
+    present, which is enough for sorting, lookups and counting chapters.
+    Any other access (a missing key, iteration, json.dump, mutation, ...) loads
+    the full chapter first, so it can be used anywhere a chapter dict is.
+    """
+    LINK_KEYS = ('vol', 'chap')
+    _load_lock = threading.Lock()
+
+    def __init__(self, path, link):
+        super().__init__((key, link.get(key, 0)) for key in self.LINK_KEYS)
+        self.path = path
+        self.link = link
+        self.loaded = False
+
+    def load(self):
+        if not self.loaded:
+            # Readers may share chapters across threads, so load only once
+            with self._load_lock:
+                if not self.loaded:
+                    body = self._read_body()
+                    dict.clear(self)
+                    dict.update(self, body)
+                    self.loaded = True
+        return self
+
+    def _read_body(self):
+        return _read_json(self.path)
+
+    def read_images(self, start, count):
+        """Return (total, images[start:start + count]) without keeping the body loaded."""
+        body = self if self.loaded else self._read_body()
+        images = dict.get(body, 'images') or []
+        return len(images), images[start:start + count]
+
+    def __getitem__(self, key):
+        if key not in self.LINK_KEYS:
+            self.load()
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        if key not in self.LINK_KEYS:
+            self.load()
+        return dict.get(self, key, default)
+
+    def __contains__(self, key):
+        if key not in self.LINK_KEYS:
+            self.load()
+        return dict.__contains__(self, key)
+
+    def __repr__(self):
+        if not self.loaded:
+            return f"LazyChapter({self.link!r})"
+        return dict.__repr__(self)
+
+    def __reduce_ex__(self, protocol):
+        # Copies and pickles become plain chapter dicts
+        return (dict, (dict(self.items()),))
+
+def _chapter_body_method(name):
+    method = getattr(dict, name)
+    def wrapper(self, *args, **kwargs):
+        self.load()
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = name
+    return wrapper
+
+for _name in ('__iter__', '__len__', '__eq__', '__ne__', '__setitem__', '__delitem__',
+              'keys', 'values', 'items', 'copy', 'update', 'setdefault', 'pop',
+              'popitem', 'clear'):
+    setattr(LazyChapter, _name, _chapter_body_method(_name))
+
+def _read_json(path):
+    data, size = codec.read_file(path)
+    metrics.count_read(size)
+    return data
+
+def _load_comic_links(comic_id):
+    """Read one comic.json and resolve its chapter links to existing files.
+
+    Returns (comic, [(chapter_file, link), ...]) or None if the comic is missing.
+    """
+    folder_path = get_comic_folder(comic_id)
+    meta_path = os.path.join(folder_path, 'comic.json')
+    if not os.path.exists(meta_path):
+        return None
+    comic = _read_json(meta_path)
+    # Skip links whose file is missing
+    existing = set(os.listdir(folder_path))
+    links = [(os.path.join(folder_path, chap_link['file']), chap_link)
+             for chap_link in comic.get('chapters', [])
+             if chap_link['file'] in existing]
+    return comic, links
+
+def load_comics(lazy=True, workers=None):
+    """Load every comic listed in comic-index.json.
+
+    With lazy=True (the default) chapters are LazyChapter objects built from the
+    links in comic.json and their files are only opened when a chapter is used.
+    With lazy=False every chapter file is read up front.
+
+    If workers is a number, comic.json files (and chapter files when not lazy)
+    are read by a thread pool of that size; the result is the same as the
+    sequential load, in comic-index order with chapters sorted by (vol, chap).
+    """
     ensure_comics_dir()
+    # Finish or undo a save that was interrupted by a crash
+    recover_store(COMICS_DIR)
     comics = []
     # Use comic-index.json for fast lookup
     index_path = COMIC_INDEX
     if not os.path.exists(index_path):
         return []
-    with open(index_path, 'r', encoding='utf-8') as idxf:
-        comic_index = json.load(idxf)
-    for entry in comic_index:
-        comic_id = entry['id']
-        folder_path = get_comic_folder(comic_id)
-        meta_path = os.path.join(folder_path, 'comic.json')
-        if os.path.exists(meta_path):
-            with open(meta_path, 'r', encoding='utf-8') as f:
-                comic = json.load(f)
-            # Load chapters using links
-            chapters = []
-            for chap_link in comic.get('chapters', []):
-                chapter_file = os.path.join(folder_path, chap_link['file'])
-                if os.path.exists(chapter_file):
-                    with open(chapter_file, 'r', encoding='utf-8') as cf:
-                        chapters.append(json.load(cf))
-            chapters.sort(key=lambda c: (float(c.get('vol', 0)), float(c.get('chap', 0))))
-            comic['chapters'] = chapters
-            comics.append(comic)
+    comic_index = _read_json(index_path)
+    comic_ids = [entry['id'] for entry in comic_index]
+    executor = ThreadPoolExecutor(max_workers=workers) if workers else None
+    try:
+        if executor:
+            loaded = list(executor.map(metrics.propagate(_load_comic_links), comic_ids))
+        else:
+            loaded = [_load_comic_links(comic_id) for comic_id in comic_ids]
+        loaded = [item for item in loaded if item is not None]
+        if not lazy:
+            paths = [path for _, links in loaded for path, _ in links]
+            if executor:
+                bodies = iter(list(executor.map(metrics.propagate(_read_json), paths)))
+            else:
+                bodies = iter([_read_json(path) for path in paths])
+    finally:
+        if executor:
+            executor.shutdown()
+    for comic, links in loaded:
+        if lazy:
+            chapters = [LazyChapter(path, link) for path, link in links]
+        else:
+            chapters = [next(bodies) for _ in links]
+        comics.append(_with_chapters(comic, chapters))
     return comics
 
-def save_comics(comics):
+def _with_chapters(comic, chapters):
+    chapters.sort(key=lambda c: (float(c.get('vol', 0)), float(c.get('chap', 0))))
+    comic['chapters'] = chapters
+    return comic
+
+def load_comic_ids():
+    """The comic ids listed in comic-index.json, in order."""
+    if not os.path.exists(COMIC_INDEX):
+        return []
+    return [entry['id'] for entry in _read_json(COMIC_INDEX)]
+
+def load_comic(comic_id, lazy=True):
+    """Load one comic from its folder as load_comics() would, or None if it is missing."""
+    loaded = _load_comic_links(comic_id)
+    if loaded is None:
+        return None
+    comic, links = loaded
+    if lazy:
+        chapters = [LazyChapter(path, link) for path, link in links]
+    else:
+        chapters = [_read_json(path) for path, _ in links]
+    return _with_chapters(comic, chapters)
+
+def library_stamp():
+    """Return a cheap fingerprint of the library on disk.
+
+    Only stats the index, every comic folder and its comic.json, so it is much
+    cheaper than load_comics() and changes whenever save_comics() runs or files
+    are added, removed or renamed over in a comic folder. A chapter file that is
+    rewritten in place (not through a rename) does not change it; LibraryWatcher
+    stats every file and notices that too.
+    """
+    ensure_comics_dir()
+    stamp = []
+    with os.scandir(COMICS_DIR) as entries:
+        for entry in entries:
+            try:
+                st = entry.stat()
+                stamp.append((entry.name, st.st_mtime_ns, st.st_size))
+                if entry.is_dir():
+                    st = os.stat(os.path.join(entry.path, 'comic.json'))
+                    stamp.append((entry.name + '/comic.json', st.st_mtime_ns, st.st_size))
+            except OSError:
+                continue
+    stamp.sort()
+    return tuple(stamp)
+
+class ComicChanges:
+    """Records which parts of the library were modified since the last save.
+
+    Passed to save_comics() so that only the marked comic.json files, chapter
+    files and comic-index.json are rewritten.
+    """
+    def __init__(self):
+        self.comics = set()        # comic ids whose comic.json must be written
+        self.chapters = {}         # comic id -> set of (vol, chap) to write
+        self.all_chapters = set()  # comic ids whose chapter files must all be written
+        self.index = False         # comic-index.json must be written
+        self.removed = []          # chapter files to delete in the same save
+
+    def __bool__(self):
+        return bool(self.comics or self.index or self.removed)
+
+    def mark_comic(self, comic_id, index=False):
+        self.comics.add(str(comic_id))
+        if index:
+            self.index = True
+
+    def mark_chapter(self, comic_id, vol, chap):
+        self.mark_comic(comic_id)
+        self.chapters.setdefault(str(comic_id), set()).add((vol, chap))
+
+    def mark_all_chapters(self, comic_id):
+        self.mark_comic(comic_id)
+        self.all_chapters.add(str(comic_id))
+
+    def mark_index(self):
+        self.index = True
+
+    def remove_file(self, path):
+        self.removed.append(path)
+
+    def forget_comic(self, comic_id):
+        """Drop pending writes for a comic that was deleted."""
+        comic_id = str(comic_id)
+        self.comics.discard(comic_id)
+        self.chapters.pop(comic_id, None)
+        self.all_chapters.discard(comic_id)
+
+    def has_comic(self, comic_id):
+        return str(comic_id) in self.comics
+
+    def has_chapter(self, comic_id, vol, chap):
+        comic_id = str(comic_id)
+        return comic_id in self.all_chapters or (vol, chap) in self.chapters.get(comic_id, ())
+
+    def update(self, other):
+        """Merge the changes recorded in another ComicChanges into this one."""
+        self.comics |= other.comics
+        for comic_id, keys in other.chapters.items():
+            self.chapters.setdefault(comic_id, set()).update(keys)
+        self.all_chapters |= other.all_chapters
+        self.index = self.index or other.index
+        self.removed.extend(other.removed)
+
+    def clear(self):
+        self.comics.clear()
+        self.chapters.clear()
+        self.all_chapters.clear()
+        self.index = False
+        self.removed.clear()
+
+def save_comics(comics, changes=None):
+    """Write the library to disk.
+
+    If changes (a ComicChanges) is given only what it marked is written,
+    otherwise every chapter file, comic.json and comic-index.json is rewritten.
+    All files of one call are written as a single StoreTransaction.
+    """
+    prepare_save(comics, changes).commit()
+
+def prepare_save(comics, changes=None):
+    """Build (but do not commit) the StoreTransaction that save_comics() would write."""
     ensure_comics_dir()
+    tx = StoreTransaction(COMICS_DIR)
     comic_index = []
     for comic in comics:
+        comic_index.append({'id': comic['id'], 'title': comic.get('title', '')})
+        if changes is not None and not changes.has_comic(comic['id']):
+            continue
         folder = get_comic_folder(comic['id'])
         if not os.path.exists(folder):
             os.makedirs(folder)
@@ -65,32 +328,83 @@ def save_comics(comics):
         chapters = comic.get('chapters', [])
         chapter_links = []
         for chap in chapters:
+            if isinstance(chap, LazyChapter) and not chap.loaded and 'file' in chap.link:
+                # Never read, so the file on disk is still up to date
+                chapter_links.append(dict(chap.link))
+                continue
             vol = chap.get('vol', 0)
             chnum = chap.get('chap', 0)
             fname = f"vol_{vol}_chapter_{chnum}.json"
-            chapter_path = os.path.join(folder, fname)
-            with open(chapter_path, 'w', encoding='utf-8') as cf:
-                json.dump(chap, cf, indent=4, ensure_ascii=False)
-            chapter_links.append({'vol': vol, 'chap': chnum, 'file': fname})
+            renamed = isinstance(chap, LazyChapter) and chap.link.get('file') != fname
+            if changes is None or renamed or changes.has_chapter(comic['id'], vol, chnum):
+                tx.write_json(os.path.join(folder, fname), chap)
+            link = {'vol': vol, 'chap': chnum, 'file': fname}
+            if isinstance(chap, LazyChapter):
+                chap.link = link
+            chapter_links.append(link)
         # Save metadata (with chapter links)
         meta = dict(comic)
         meta['chapters'] = chapter_links
-        with open(get_comic_metadata_path(comic['id']), 'w', encoding='utf-8') as f:
-            json.dump(meta, f, indent=4, ensure_ascii=False)
-        comic_index.append({'id': comic['id'], 'title': comic.get('title', '')})
+        tx.write_json(get_comic_metadata_path(comic['id']), meta)
     # Write comic-index.json
-    with open(COMIC_INDEX, 'w', encoding='utf-8') as idxf:
-        json.dump(comic_index, idxf, indent=4, ensure_ascii=False)
+    if changes is None or changes.index:
+        tx.write_json(COMIC_INDEX, comic_index)
+    if changes is not None:
+        for path in changes.removed:
+            tx.remove(path)
+    return tx
+
+class DirectoryBackend:
+    """The comics/<id>/ folder layout, behind the interface ComicAPI uses for storage.
+
+    Other backends (see packed_store.py) provide the same four methods.
+    root, comic_ids() and load_comic() are extra: they let ComicAPI._watch() reload single comics.
+    """
+    @property
+    def root(self):
+        """The comics/ folder, for LibraryWatcher."""
+        return COMICS_DIR
+
+    def load_comics(self, lazy=True, workers=None):
+        return load_comics(lazy=lazy, workers=workers)
+
+    def load_comic(self, comic_id, lazy=True):
+        return load_comic(comic_id, lazy=lazy)
+
+    def comic_ids(self):
+        return load_comic_ids()
+
+    def prepare_save(self, comics, changes=None):
+        return prepare_save(comics, changes)
+
+    def save_comics(self, comics, changes=None):
+        self.prepare_save(comics, changes).commit()
+
+    def stamp(self):
+        return library_stamp()
 
 class TruyenManagermentApp(tk.Tk):
+    # How often (ms) the Tk thread picks up what the watcher found
+    DISK_POLL_MS = 500
+
     def __init__(self):
         super().__init__()
         self.title('Truyen Managerment')
         self.geometry('1200x700')
+        # Notice comics edited outside the app (synced folders, hand-edited JSON).
+        # Started before loading so nothing written in between is missed.
+        self.disk_changes = queue.Queue()
+        self.watcher = LibraryWatcher(COMICS_DIR, lambda ids, index: self.disk_changes.put((ids, index)))
+        self.watcher.start()
         self.comics = load_comics()
-        self.tooltip = None
-        self.tooltip_id = None
+        self.changes = ComicChanges()
+        self.comic_by_key = {}
         self.create_widgets()
+        self.after(self.DISK_POLL_MS, self.check_disk_changes)
+
+    def destroy(self):
+        self.watcher.stop()
+        super().destroy()
 
     def create_widgets(self):
         # Buttons
@@ -103,7 +417,9 @@ class TruyenManagermentApp(tk.Tk):
 
         # Treeview
         columns = ("Title", "Type", "Status", "Updated", "Latest Chapter", "Rating", "Star", "Language")
-        self.tree = ttk.Treeview(self, columns=columns, show='headings')
+        # Only the rows on screen are created; rows are keyed by comic id
+        self.view = VirtualTreeview(self, columns, self.comic_row)
+        self.tree = self.view.tree
         self.tree.heading("Title", text="Title")
         self.tree.heading("Type", text="Type")
         self.tree.heading("Status", text="Status")
@@ -123,101 +439,50 @@ class TruyenManagermentApp(tk.Tk):
         self.tree.column("Star", width=80)
         self.tree.column("Language", width=120)
         
-        # Add scrollbar
-        scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscroll=scrollbar.set)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.view.pack(fill=tk.BOTH, expand=True)
         
-        self.tree.pack(fill=tk.BOTH, expand=True)
+        # Description tooltip for the row under the mouse
+        self.tooltip = Tooltip(self.tree, self.view.key_at, self.comic_description)
         self.load_tree()
-        
-        # Bind tooltip events
-        self.tree.bind("<Motion>", self.show_description_tooltip)
-        self.tree.bind("<Leave>", self.hide_tooltip)
 
     def format_date(self, date_str):
         """Format ISO date string to a more readable format."""
-        try:
-            dt = datetime.strptime(date_str, '%Y-%m-%dT%H:%M:%SZ')
-            return dt.strftime('%Y-%m-%d %H:%M')
-        except:
-            return date_str
-
-    def show_description_tooltip(self, event):
-        # Hide the tooltip first
-        self.hide_tooltip(None)
-        
-        # Get the item under mouse
-        item = self.tree.identify_row(event.y)
-        if not item:
-            return
-        
-        # Get index and comic
-        idx = self.tree.index(item)
-        if idx >= len(self.comics):
-            return
-            
-        comic = self.comics[idx]
-        
-        # Show description tooltip if available
-        if 'description' in comic and comic['description']:
-            x, y, width, height = self.tree.bbox(item)
-            x = event.x_root
-            y = event.y_root + 10
-            
-            # Create tooltip
-            self.tooltip = tk.Toplevel(self)
-            self.tooltip.wm_overrideredirect(True)
-            self.tooltip.wm_geometry(f"+{x}+{y}")
-            
-            # Format description (limit length if too long)
-            desc = comic['description']
-            if len(desc) > 300:
-                desc = desc[:297] + "..."
-                
-            # Make sure it's not too wide
-            desc_lines = []
-            for i in range(0, len(desc), 60):
-                desc_lines.append(desc[i:i+60])
-            desc = "\n".join(desc_lines)
-            
-            label = tk.Label(self.tooltip, text=desc, justify=tk.LEFT,
-                             background="#ffffe0", relief=tk.SOLID, borderwidth=1,
-                             font=("Arial", "9", "normal"), padx=5, pady=5)
-            label.pack()
-            
-            # Auto-hide after 5 seconds
-            self.tooltip_id = self.after(5000, lambda: self.hide_tooltip(None))
+        return format_iso_date(date_str)
 
-    def hide_tooltip(self, event):
-        if self.tooltip:
-            self.tooltip.destroy()
-            self.tooltip = None
-        
-        if self.tooltip_id:
-            self.after_cancel(self.tooltip_id)
-            self.tooltip_id = None
+    def comic_description(self, key):
+        comic = self.comic_by_key.get(key)
+        return comic.get('description') if comic is not None else None
 
     def load_tree(self):
-        for row in self.tree.get_children():
-            self.tree.delete(row)
-        for comic in self.comics:
-            updated_at = comic.get('updated_at', comic.get('createtime', 'N/A'))
-            formatted_updated = self.format_date(updated_at)
-            
-            latest_chapter_at = comic.get('latest_chapter_at', 'N/A')
-            formatted_latest = self.format_date(latest_chapter_at)
-            
-            self.tree.insert('', tk.END, values=(
-                comic['title'],
-                comic.get('type', 'N/A'),
-                comic.get('status', 'N/A'),
-                formatted_updated,
-                formatted_latest,
-                comic.get('content_rating', 'N/A'),
-                comic.get('star', 0),
-                comic.get('original_language', 'N/A')
-            ))
+        """Show self.comics; only visible rows whose values changed are redrawn."""
+        self.comic_by_key = {str(comic['id']): comic for comic in self.comics}
+        self.view.set_rows(self.comic_by_key)
+        self.tooltip.clear()
+
+    def comic_row(self, key):
+        comic = self.comic_by_key[key]
+        updated_at = comic.get('updated_at', comic.get('createtime', 'N/A'))
+        formatted_updated = self.format_date(updated_at)
+        
+        latest_chapter_at = comic.get('latest_chapter_at', 'N/A')
+        formatted_latest = self.format_date(latest_chapter_at)
+        
+        return (
+            comic['title'],
+            comic.get('type', 'N/A'),
+            comic.get('status', 'N/A'),
+            formatted_updated,
+            formatted_latest,
+            comic.get('content_rating', 'N/A'),
+            comic.get('star', 0),
+            comic.get('original_language', 'N/A')
+        )
+
+    def selected_comic(self):
+        """The comic selected in the list, or None."""
+        if self.view.selected is None:
+            return None
+        return self.comic_by_key.get(self.view.selected)
 
     def add_comic(self):
         dialog = ComicDialog(self, title="Add Comic", is_add=True)
@@ -234,39 +499,40 @@ class TruyenManagermentApp(tk.Tk):
             ensure_comics_dir()
             os.makedirs(get_comic_folder(new_comic['id']), exist_ok=True)
             self.comics.append(new_comic)
-            save_comics(self.comics)
+            self.changes.mark_comic(new_comic['id'], index=True)
+            self.save_changes()
             self.load_tree()
+            self.view.select(str(new_comic['id']))
 
     def edit_comic(self):
-        selected = self.tree.selection()
-        if not selected:
+        comic = self.selected_comic()
+        if comic is None:
             messagebox.showwarning("No selection", "Please select a comic to edit.")
             return
-        idx = self.tree.index(selected[0])
-        comic = self.comics[idx]
         dialog = ComicDialog(self, title="Edit Comic", comic=comic)
         self.wait_window(dialog)
         if dialog.result:
             for key in dialog.result:
                 comic[key] = dialog.result[key]
             comic['updated_at'] = get_current_datetime()
-            save_comics(self.comics)
+            self.changes.mark_comic(comic['id'], index=True)
+            self.save_changes()
             self.load_tree()
 
     def delete_comic(self):
-        selected = self.tree.selection()
-        if not selected:
+        comic = self.selected_comic()
+        if comic is None:
             messagebox.showwarning("No selection", "Please select a comic to delete.")
             return
-        idx = self.tree.index(selected[0])
-        comic = self.comics[idx]
         if messagebox.askyesno("Delete Comic", f"Are you sure you want to delete '{comic['title']}'?"):
-            # Remove comic folder
+            self.comics[:] = [c for c in self.comics if c is not comic]
+            self.changes.forget_comic(comic['id'])
+            # The folder goes in the same save as comic-index.json, never before it
             folder = get_comic_folder(comic['id'])
             if os.path.exists(folder):
-                shutil.rmtree(folder)
-            del self.comics[idx]
-            save_comics(self.comics)
+                self.changes.remove_file(folder)
+            self.changes.mark_index()
+            self.save_changes()
             self.load_tree()
 
     def get_next_id(self):
@@ -275,27 +541,88 @@ class TruyenManagermentApp(tk.Tk):
         return max(c['id'] for c in self.comics) + 1
 
     def manage_chapters(self):
-        selected = self.tree.selection()
-        if not selected:
+        comic = self.selected_comic()
+        if comic is None:
             messagebox.showwarning("No selection", "Please select a comic to manage chapters.")
             return
-        idx = self.tree.index(selected[0])
-        comic = self.comics[idx]
         manager = ChapterManager(self, comic, self.save_comic_and_reload)
-        manager.comic_index = idx  # Store the comic index for the chapter manager
+        manager.comic_index = self.view.index(self.view.selected)  # Store the comic index for the chapter manager
 
-    def save_comic_and_reload(self, update_timestamp=True, update_latest_chapter=False):
-        # Find the comic by its index
-        selected = self.tree.selection()
-        if selected:
-            idx = self.tree.index(selected[0])
-            if 0 <= idx < len(self.comics):
-                if update_timestamp:
-                    self.comics[idx]['updated_at'] = get_current_datetime()
-                if update_latest_chapter:
-                    self.comics[idx]['latest_chapter_at'] = get_current_datetime()
+    def save_changes(self):
+        """Write only the parts of the library marked in self.changes."""
+        save_comics(self.comics, self.changes)
+        # Our own writes are not changes from outside
+        self.watcher.sync(self.changes.comics, self.changes.index)
+        self.changes.clear()
+
+    def check_disk_changes(self):
+        """Apply what the watcher reported (Tk may only be used from this thread)."""
+        comic_ids, index_changed = set(), False
+        while True:
+            try:
+                ids, index = self.disk_changes.get_nowait()
+            except queue.Empty:
+                break
+            comic_ids |= ids
+            index_changed = index_changed or index
+        if comic_ids or index_changed:
+            self.reload_from_disk(comic_ids, index_changed)
+        self.after(self.DISK_POLL_MS, self.check_disk_changes)
+
+    def reload_from_disk(self, comic_ids, index_changed):
+        """Reload comics changed outside the app; only their rows are redrawn."""
+        if index_changed:
+            # Comics were added, removed or renamed: read the whole list again, but keep
+            # the dicts already loaded (updated in place) so an open ChapterManager still
+            # edits a comic that is in the library
+            merged = []
+            for fresh in load_comics():
+                comic = self.comic_by_key.get(str(fresh['id']))
+                if comic is not None:
+                    comic.clear()
+                    comic.update(fresh)
+                    fresh = comic
+                merged.append(fresh)
+            self.comics[:] = merged
+            self.load_tree()
+            return
+        refreshed = []
+        removed = False
+        for key in comic_ids:
+            comic = self.comic_by_key.get(key)
+            if comic is None:
+                continue
+            fresh = load_comic(key)
+            if fresh is None:
+                self.comics[:] = [c for c in self.comics if c is not comic]
+                removed = True
+            else:
+                # Update in place so open dialogs keep pointing at this comic
+                comic.clear()
+                comic.update(fresh)
+                refreshed.append(key)
+        if removed:
+            self.load_tree()
+        elif refreshed:
+            self.view.refresh(refreshed)
+            self.tooltip.clear()
+
+    def save_comic_and_reload(self, update_timestamp=True, update_latest_chapter=False, chapter=None, removed=None):
+        """Save the selected comic; removed is a chapter file deleted in the same save."""
+        # Find the selected comic
+        comic = self.selected_comic()
+        if comic is not None:
+            if update_timestamp:
+                comic['updated_at'] = get_current_datetime()
+            if update_latest_chapter:
+                comic['latest_chapter_at'] = get_current_datetime()
+            self.changes.mark_comic(comic['id'])
+            if chapter is not None:
+                self.changes.mark_chapter(comic['id'], chapter.get('vol', 0), chapter.get('chap', 0))
+            if removed is not None:
+                self.changes.remove_file(removed)
         
-        save_comics(self.comics)
+        self.save_changes()
         self.load_tree()
 
 class ComicDialog(tk.Toplevel):
@@ -794,6 +1121,7 @@ class ChapterManager(tk.Toplevel):
         self.comic = comic
         self.on_save = on_save
         self.comic_index = -1  # Will be set by the parent
+        self.chapter_by_key = {}
         self.create_widgets()
         self.load_chapters()
         self.grab_set()
@@ -806,7 +1134,9 @@ class ChapterManager(tk.Toplevel):
         tk.Button(btn_frame, text="Delete Chapter", command=self.delete_chapter).pack(side=tk.LEFT, padx=2)
 
         columns = ("Vol", "Chap", "Language", "Updated", "Reading Progress", "Comments", "Images")
-        self.tree = ttk.Treeview(self, columns=columns, show='headings')
+        # Only visible chapters are created (and, for lazy chapters, read from disk)
+        self.view = VirtualTreeview(self, columns, self.chapter_row)
+        self.tree = self.view.tree
         self.tree.heading("Vol", text="Vol")
         self.tree.heading("Chap", text="Chap")
         self.tree.heading("Language", text="Language")
@@ -824,41 +1154,45 @@ class ChapterManager(tk.Toplevel):
         self.tree.column("Comments", width=120)
         self.tree.column("Images", width=200)
         
-        # Add scrollbar
-        scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscroll=scrollbar.set)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        self.tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.view.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
 
     def format_date(self, date_str):
         """Format ISO date string to a more readable format."""
-        try:
-            dt = datetime.strptime(date_str, '%Y-%m-%dT%H:%M:%SZ')
-            return dt.strftime('%Y-%m-%d %H:%M')
-        except:
-            return date_str
+        return format_iso_date(date_str)
     
     def load_chapters(self):
-        for row in self.tree.get_children():
-            self.tree.delete(row)
-        for chap in self.comic.get('chapters', []):
-            comment_count = len(chap.get('comments', []))
-            comment_text = f"{comment_count} comment(s)" if comment_count > 0 else "No comments"
-            
-            # Get and format the updated_at date
-            updated_at = chap.get('updated_at', 'N/A')
-            formatted_date = self.format_date(updated_at)
-            
-            self.tree.insert('', tk.END, values=(
-                chap['vol'], 
-                chap['chap'], 
-                chap.get('language', ''), 
-                formatted_date,
-                chap['reading_progress'],
-                comment_text,
-                f"{len(chap['images'])} image(s)"
-            ))
+        """Show the comic's chapters; rows are keyed by chapter object."""
+        self.chapter_by_key = {str(id(chap)): chap for chap in self.comic.get('chapters', [])}
+        self.view.set_rows(self.chapter_by_key)
+
+    def chapter_row(self, key):
+        chap = self.chapter_by_key[key]
+        comment_count = len(chap.get('comments', []))
+        comment_text = f"{comment_count} comment(s)" if comment_count > 0 else "No comments"
+        
+        # Get and format the updated_at date
+        updated_at = chap.get('updated_at', 'N/A')
+        formatted_date = self.format_date(updated_at)
+        
+        return (
+            chap['vol'], 
+            chap['chap'], 
+            chap.get('language', ''), 
+            formatted_date,
+            chap['reading_progress'],
+            comment_text,
+            f"{len(chap['images'])} image(s)"
+        )
+
+    def selected_chapter(self):
+        """(index in comic['chapters'], chapter) of the selected row, or (None, None)."""
+        chapter = self.chapter_by_key.get(self.view.selected) if self.view.selected else None
+        if chapter is None:
+            return None, None
+        for idx, chap in enumerate(self.comic['chapters']):
+            if chap is chapter:
+                return idx, chapter
+        return None, None
 
     def add_chapter(self):
         dialog = ChapterDialog(self, title="Add Chapter")
@@ -869,23 +1203,16 @@ class ChapterManager(tk.Toplevel):
             chapter['created_at'] = current_time
             chapter['updated_at'] = current_time
             self.comic.setdefault('chapters', []).append(chapter)
-            # Save chapter as file with new naming
-            folder = get_comic_folder(self.comic['id'])
-            vol = chapter.get('vol', 0)
-            chnum = chapter.get('chap', 0)
-            chapter_path = os.path.join(folder, f"vol_{vol}_chapter_{chnum}.json")
-            with open(chapter_path, 'w', encoding='utf-8') as cf:
-                json.dump(chapter, cf, indent=4, ensure_ascii=False)
-            self.on_save(update_timestamp=True, update_latest_chapter=True)
+            # Only the new chapter file and comic.json are written
+            self.on_save(update_timestamp=True, update_latest_chapter=True, chapter=chapter)
             self.load_chapters()
+            self.view.select(str(id(chapter)))
 
     def edit_chapter(self):
-        selected = self.tree.selection()
-        if not selected:
+        idx, chapter = self.selected_chapter()
+        if chapter is None:
             messagebox.showwarning("No selection", "Please select a chapter to edit.")
             return
-        idx = self.tree.index(selected[0])
-        chapter = self.comic['chapters'][idx]
         dialog = ChapterDialog(self, title="Edit Chapter", chapter=chapter)
         self.wait_window(dialog)
         if dialog.result:
@@ -894,35 +1221,30 @@ class ChapterManager(tk.Toplevel):
             if 'created_at' in chapter:
                 updated_chapter['created_at'] = chapter['created_at']
             self.comic['chapters'][idx] = updated_chapter
-            # Save updated chapter as file with new naming
-            folder = get_comic_folder(self.comic['id'])
-            vol = updated_chapter.get('vol', 0)
-            chnum = updated_chapter.get('chap', 0)
-            chapter_path = os.path.join(folder, f"vol_{vol}_chapter_{chnum}.json")
-            with open(chapter_path, 'w', encoding='utf-8') as cf:
-                json.dump(updated_chapter, cf, indent=4, ensure_ascii=False)
-            self.on_save(update_timestamp=True, update_latest_chapter=False)
+            # Only the updated chapter file and comic.json are written
+            self.on_save(update_timestamp=True, update_latest_chapter=False, chapter=updated_chapter)
             self.load_chapters()
+            self.view.select(str(id(updated_chapter)))
 
     def delete_chapter(self):
-        selected = self.tree.selection()
-        if not selected:
+        idx, chapter = self.selected_chapter()
+        if chapter is None:
             messagebox.showwarning("No selection", "Please select a chapter to delete.")
             return
-        idx = self.tree.index(selected[0])
-        chapter = self.comic['chapters'][idx]
         if messagebox.askyesno("Delete Chapter", "Are you sure you want to delete this chapter?"):
-            # Remove chapter file with new naming
+            # The chapter file is removed in the same save as comic.json, so no link dangles
             folder = get_comic_folder(self.comic['id'])
             vol = chapter.get('vol', 0)
             chnum = chapter.get('chap', 0)
             chapter_path = os.path.join(folder, f"vol_{vol}_chapter_{chnum}.json")
-            if os.path.exists(chapter_path):
-                os.remove(chapter_path)
             del self.comic['chapters'][idx]
-            self.on_save(update_timestamp=True, update_latest_chapter=False)
+            self.on_save(update_timestamp=True, update_latest_chapter=False,
+                         removed=chapter_path if os.path.exists(chapter_path) else None)
             self.load_chapters()
 
+# Image URLs added to ChapterDialog's images box per step
+IMAGE_CHUNK = 200
+
 class ChapterDialog(tk.Toplevel):
     def __init__(self, parent, title, chapter=None):
         super().__init__(parent)
@@ -930,6 +1252,9 @@ class ChapterDialog(tk.Toplevel):
         self.result = None
         self.chapter = chapter
         self.comments = []
+        # Image URLs not yet shown in the images box (filled in chunks)
+        self.pending_images = []
+        self.fill_images_id = None
         if chapter and 'comments' in chapter:
             self.comments = chapter['comments']
         self.create_widgets()
@@ -982,7 +1307,8 @@ class ChapterDialog(tk.Toplevel):
             self.entries['chap'].insert(0, str(self.chapter.get('chap', '')))
             self.entries['language'].insert(0, self.chapter.get('language', ''))
             self.entries['reading_progress'].insert(0, str(self.chapter.get('reading_progress', 0)))
-            self.entries['images'].insert('1.0', '\n'.join(self.chapter.get('images', [])))
+            self.pending_images = list(self.chapter.get('images', []))
+            self.fill_images()
             self.one_shot_var.set(self.chapter.get('one_shot', False))
             # Set comments
             if 'comments' in self.chapter:
@@ -998,8 +1324,35 @@ class ChapterDialog(tk.Toplevel):
         tk.Button(btn_frame, text="OK", command=self.on_ok).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Cancel", command=self.destroy).pack(side=tk.LEFT, padx=5)
 
+    def fill_images(self, chunk=IMAGE_CHUNK):
+        """Add the next chunk of image URLs to the images box, then schedule the rest.
+
+        Long-strip chapters have hundreds of images; inserting them a chunk at a
+        time keeps the dialog responsive while it opens.
+        """
+        self.fill_images_id = None
+        text = self.entries['images']
+        images = self.pending_images[:chunk]
+        del self.pending_images[:chunk]
+        if images:
+            if text.index('end-1c') != '1.0':
+                text.insert(tk.END, '\n')
+            text.insert(tk.END, '\n'.join(images))
+        if self.pending_images:
+            self.fill_images_id = self.after(1, self.fill_images)
+
+    def destroy(self):
+        if self.fill_images_id:
+            self.after_cancel(self.fill_images_id)
+            self.fill_images_id = None
+        super().destroy()
+
     def on_ok(self):
         try:
+            # Make sure every image is in the box before reading it back
+            if self.fill_images_id:
+                self.after_cancel(self.fill_images_id)
+            self.fill_images(chunk=len(self.pending_images))
             images_text = self.entries['images'].get('1.0', tk.END)
             images = [line.strip() for line in images_text.splitlines() if line.strip()]
             # Parse comments from text field
@@ -1,27 +1,684 @@
 import json
 from TruyenManagerment import (
-    load_comics, save_comics, get_current_datetime, ensure_comics_dir,
-    get_comic_folder, get_comic_metadata_path, get_chapter_path
+    get_current_datetime, get_comic_folder, ComicChanges, DirectoryBackend, LazyChapter
 )
+from search import SearchIndex, FIELD_WEIGHTS
+from json_patch import apply_patch, top_level_keys, PatchError
+from watcher import LibraryWatcher
+import codec
+from metrics import Metrics
+import metrics
 import os
+import atexit
+import base64
+import bisect
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext, ExitStack
+
+class ReadWriteLock:
+    """Cho nhiều luồng đọc cùng lúc nhưng chỉ một luồng ghi; luồng ghi đang chờ được ưu tiên.
+
+    Luồng đang giữ khóa ghi vẫn có thể lấy khóa đọc, và khóa đọc lồng nhau không bị chặn.
+    """
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._write_depth = 0
+        self._writers_waiting = 0
+        self._local = threading.local()
+
+    @contextmanager
+    def read(self):
+        me = threading.get_ident()
+        nested = self._writer == me or getattr(self._local, 'reads', 0) > 0
+        if not nested:
+            with self._cond:
+                while self._writer is not None or self._writers_waiting:
+                    self._cond.wait()
+                self._readers += 1
+        self._local.reads = getattr(self._local, 'reads', 0) + 1
+        try:
+            yield
+        finally:
+            self._local.reads -= 1
+            if not nested:
+                with self._cond:
+                    self._readers -= 1
+                    if not self._readers:
+                        self._cond.notify_all()
+
+    def writing(self):
+        """True nếu luồng hiện tại đang giữ khóa ghi."""
+        return self._writer == threading.get_ident()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer != me:
+                self._writers_waiting += 1
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+                self._writers_waiting -= 1
+                self._writer = me
+            self._write_depth += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._write_depth -= 1
+                if not self._write_depth:
+                    self._writer = None
+                    self._cond.notify_all()
+
+# Các trường danh sách có chỉ mục ngược (dùng cho get_all_* và lọc theo term)
+TAXONOMY_FIELDS = ('genres', 'themes', 'formats', 'tags', 'artists')
+
+class TaxonomyIndex:
+    """Chỉ mục ngược: với mỗi trường, term -> {id comic: số lần term xuất hiện trong comic}.
+
+    Được cập nhật dần theo từng lần sửa, nên danh sách term, số comic dùng mỗi term
+    và "các comic có genre X" không cần duyệt lại cả thư viện.
+    """
+    def __init__(self, comics=()):
+        self._terms = {field: {} for field in TAXONOMY_FIELDS}
+        # field -> danh sách term đã sắp xếp, bỏ đi khi tập term thay đổi
+        self._sorted = {}
+        for comic in comics:
+            self.add_comic(comic)
+
+    def add(self, field, comic_id, term):
+        ids = self._terms[field].get(term)
+        if ids is None:
+            ids = self._terms[field][term] = {}
+            self._sorted.pop(field, None)
+        key = str(comic_id)
+        ids[key] = ids.get(key, 0) + 1
+
+    def remove(self, field, comic_id, term):
+        ids = self._terms[field].get(term)
+        key = str(comic_id)
+        if not ids or key not in ids:
+            return
+        ids[key] -= 1
+        if not ids[key]:
+            del ids[key]
+            if not ids:
+                del self._terms[field][term]
+                self._sorted.pop(field, None)
+
+    def add_comic(self, comic):
+        for field in TAXONOMY_FIELDS:
+            for term in comic.get(field) or []:
+                self.add(field, comic['id'], term)
+
+    def remove_comic(self, comic):
+        for field in TAXONOMY_FIELDS:
+            for term in comic.get(field) or []:
+                self.remove(field, comic['id'], term)
+
+    def terms(self, field):
+        """Các term của field, đã sắp xếp."""
+        terms = self._sorted.get(field)
+        if terms is None:
+            terms = self._sorted[field] = sorted(self._terms[field])
+        return terms
+
+    def counts(self, field):
+        """term -> số comic đang dùng term đó."""
+        return {term: len(self._terms[field][term]) for term in self.terms(field)}
+
+    def comic_ids(self, field, term):
+        """Id (dạng str) của các comic có term trong field."""
+        return list(self._terms[field].get(term, ()))
+
+# Các cột mặc định của get_comics_page (đủ cho danh sách truyện)
+PAGE_FIELDS = ('id', 'title', 'type', 'status', 'updated_at', 'latest_chapter_at',
+               'content_rating', 'star', 'original_language', 'chapter_count')
+# Trường tính ra từ comic, không lưu trong comic.json
+COMPUTED_FIELDS = {
+    'chapter_count': lambda comic: len(comic.get('chapters') or []),
+}
+
+def _field_value(comic, field):
+    compute = COMPUTED_FIELDS.get(field)
+    return compute(comic) if compute else comic.get(field)
+
+def _sort_key(comic, field):
+    """Khóa sắp xếp so sánh được giữa mọi kiểu giá trị; id để phân định các giá trị bằng nhau."""
+    value = _field_value(comic, field)
+    if isinstance(value, bool) or value is None:
+        rank, value = (2, '') if value is None else (0, int(value))
+    elif isinstance(value, (int, float)):
+        rank = 0
+    else:
+        rank, value = 1, str(value)
+    cid = comic.get('id')
+    return (rank, value) + ((0, cid) if isinstance(cid, (int, float)) else (1, str(cid)))
+
+def _encode_cursor(sort, key):
+    data = json.dumps({"sort": sort, "after": list(key)}, ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+def _decode_cursor(cursor):
+    data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    return data['sort'], tuple(data['after'])
+
+def _dumps(obj):
+    """Mã hóa kết quả trả về (qua codec); khi bật metrics thời gian được tính vào pha 'serialize'."""
+    with metrics.phase('serialize'):
+        return codec.dumps(obj)
+
+class ResponseCache:
+    """Cache LRU các chuỗi JSON đã mã hóa của method đọc, giới hạn theo số mục và tổng số ký tự.
+
+    Khóa gồm tên method, tham số và phiên bản dữ liệu mà kết quả phụ thuộc vào,
+    nên khi dữ liệu đổi thì mục cũ không bao giờ được dùng lại mà chỉ bị đẩy ra dần.
+    """
+    def __init__(self, max_chars=32 * 1024 * 1024, max_entries=1024):
+        self.max_chars = max_chars
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if len(value) > self.max_chars:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._chars -= len(old)
+            self._entries[key] = value
+            self._chars += len(value)
+            while self._chars > self.max_chars or len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._chars -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._chars = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "chars": self._chars,
+                    "hits": self.hits, "misses": self.misses}
+
+def _cache_key(self, method, per_comic, args, kwargs):
+    """Khóa cache của một lời gọi đọc, hoặc None nếu tham số không mã hóa được."""
+    try:
+        # Kiểu được giữ lại trong khóa: get_comic(1) và get_comic("1") là hai mục riêng
+        params = codec.dumps([args, kwargs])
+    except (TypeError, ValueError):
+        return None
+    if per_comic:
+        # Kết quả chỉ phụ thuộc vào comic này: sửa comic khác không làm mất cache
+        comic_id = args[0] if args else kwargs.get('comic_id')
+        version = (self._epoch, self._comic_versions.get(str(comic_id), 0))
+    else:
+        version = self._generation
+    return (method, version, params)
+
+def _api_method(method, lock_mode, cache=False, flush_first=False):
+    name = method.__name__
+    params = list(inspect.signature(method).parameters)
+    # Method đọc/ghi nhận comic_id làm tham số đầu chỉ chạm tới đúng comic đó
+    per_comic = len(params) > 1 and params[1] == 'comic_id'
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._measure(name):
+            with ExitStack() as stack:
+                with metrics.phase('wait'):
+                    if flush_first:
+                        # Luôn lấy _flush_lock trước khóa đọc/ghi, như _flush_pending, để không khóa chéo
+                        stack.enter_context(self._flush_lock)
+                    stack.enter_context(getattr(self._rw, lock_mode)())
+                key = None
+                # Lời gọi đọc lồng trong một lời gọi ghi thấy dữ liệu đang sửa dở: không dùng cache
+                if cache and self._responses is not None and not self._rw.writing():
+                    self._load()
+                    key = _cache_key(self, name, per_comic, args, kwargs)
+                    if key is not None:
+                        result = self._responses.get(key)
+                        if result is not None:
+                            return result
+                try:
+                    result = method(self, *args, **kwargs)
+                finally:
+                    if lock_mode == 'write' and per_comic:
+                        self._touch(args[0] if args else kwargs.get('comic_id'))
+                if key is not None and result.startswith('{"success":true'):
+                    # Chỉ cache kết quả thành công: lỗi như "Comic not found" có thể hết sau khi thêm comic
+                    self._responses.put(key, result)
+            if lock_mode == 'write' and not self._rw.writing() and (not self._write_behind or self._closed):
+                # Ghi đồng bộ sau khi đã nhả khóa ghi (lời gọi lồng trong apply_batch thì để lời gọi ngoài ghi)
+                error = self._flush_pending()
+                if error is not None:
+                    # Thay đổi vẫn nằm trong bộ nhớ và được ghi lại ở lần sau, nhưng chưa có trên đĩa
+                    return _dumps({"success": False, "error": f"Save failed: {error}"})
+            return result
+    # Giữ nguyên chữ ký để pywebview sinh đúng hàm JS
+    wrapper.__signature__ = inspect.signature(method)
+    wrapper.lock_mode = lock_mode
+    return wrapper
+
+def reads(method=None, *, cache=True):
+    """Chạy method dưới khóa đọc: nhiều lời gọi đọc có thể chạy song song.
+
+    Kết quả được lưu trong cache phản hồi cho tới khi dữ liệu nó dựa vào thay đổi;
+    dùng @reads(cache=False) cho method có kết quả thay đổi mà thư viện không đổi.
+    """
+    if method is None:
+        return lambda method: _api_method(method, 'read', cache)
+    return _api_method(method, 'read', cache)
+
+def writes(method=None, *, flush_first=False):
+    """Chạy method dưới khóa ghi: các lời gọi sửa dữ liệu được thực hiện lần lượt.
+
+    Dùng @writes(flush_first=True) cho method cần gọi _flush_pending trong lúc giữ khóa ghi.
+    """
+    if method is None:
+        return lambda method: _api_method(method, 'write', flush_first=flush_first)
+    return _api_method(method, 'write')
 
 class ComicAPI:
+    def __init__(self, write_behind=True, write_delay=0.2, load_workers=None, backend=None,
+                 collect_metrics=None, metrics_file=None, response_cache=32 * 1024 * 1024,
+                 stamp_interval=1.0):
+        # Nơi lưu trữ: mặc định là thư mục comics/, có thể thay bằng PackedBackend, ...
+        self._backend = backend if backend is not None else DirectoryBackend()
+        # Thư viện được giữ trong bộ nhớ, chỉ đọc lại khi dữ liệu trên đĩa thay đổi
+        self._comics = None
+        # Số luồng dùng để đọc thư viện (None = đọc tuần tự)
+        self._load_workers = load_workers
+        # Dấu vân tay của thư viện trên đĩa (backend.stamp()), kiểm tra lại tối đa mỗi
+        # stamp_interval giây; khi đang _watch() thì chỉ luồng theo dõi báo thay đổi.
+        # Với DirectoryBackend, stamp không thấy file chapter bị ghi đè tại chỗ: cần _watch() cho việc đó.
+        self._stamp = None
+        self._stamp_interval = stamp_interval
+        self._stamp_checked = 0.0
+        self._generation = 0
+        self._changes = ComicChanges()
+        # Ghi trễ: các thay đổi được gom lại và một luồng riêng ghi xuống đĩa
+        self._write_behind = write_behind
+        self._write_delay = write_delay
+        # _rw bảo vệ dữ liệu thư viện; _lock bảo vệ trạng thái cache/ghi trễ
+        self._rw = ReadWriteLock()
+        self._lock = threading.RLock()
+        # Thứ tự khóa: _flush_lock rồi mới tới _rw (RLock để apply_batch gọi lại được _flush_pending)
+        self._flush_lock = threading.RLock()
+        self._wakeup = threading.Condition(self._lock)
+        self._writing = False
+        self._closed = False
+        self._write_error = None
+        if write_behind:
+            self._writer = threading.Thread(target=self._writer_loop, name='ComicAPI-writer', daemon=True)
+            self._writer.start()
+            atexit.register(self._close)
+        # Chỉ mục tra cứu: str(id) -> comic, và str(id) -> {(vol, chap): vị trí chapter}
+        self._by_id = {}
+        self._chapter_pos = {}
+        # Chỉ mục ngược genres/themes/... (TaxonomyIndex), dựng khi cần lần đầu
+        self._taxonomy = None
+        # Chỉ mục tìm kiếm toàn văn (SearchIndex), dựng khi cần lần đầu
+        self._search = None
+        # Thứ tự sắp xếp gần nhất của get_comics_page: (generation, sort, keys, comics)
+        self._page_order = None
+        # Đo thời gian/IO từng lời gọi (tắt mặc định; bật bằng collect_metrics=True hoặc COMIC_API_METRICS=1).
+        # Nếu có metrics_file (hoặc COMIC_API_METRICS_FILE) thì số liệu được ghi ra file khi _close().
+        self._metrics_file = metrics_file or os.environ.get('COMIC_API_METRICS_FILE') or None
+        if collect_metrics is None:
+            collect_metrics = os.environ.get('COMIC_API_METRICS', '').lower() in ('1', 'true', 'yes') or bool(self._metrics_file)
+        self._metrics = Metrics() if collect_metrics else None
+        # Cache phản hồi của các method đọc, tối đa response_cache ký tự (0/None = tắt).
+        # Method theo comic_id dùng phiên bản riêng của comic; method khác dùng _generation.
+        self._responses = ResponseCache(response_cache) if response_cache else None
+        self._comic_versions = {}
+        # Tăng mỗi lần thư viện được đọc lại từ đĩa (mọi phiên bản comic cũ hết hiệu lực)
+        self._epoch = 0
+        # Theo dõi comics/ (_watch()); _committing là các thay đổi đang được ghi xuống đĩa
+        self._watcher = None
+        self._on_change = None
+        self._committing = None
+
+    def _load(self):
+        """Trả về thư viện đã cache, tải lại nếu dấu vân tay trên đĩa đổi (sửa từ bên ngoài)."""
+        with metrics.phase('load'), self._lock:
+            if self._comics is not None and (self._changes or self._writing):
+                # Còn thay đổi chưa ghi xong: bộ nhớ là bản mới nhất
+                return self._comics
+            now = time.monotonic()
+            if (self._comics is not None and self._stamp is not None
+                    and (self._watcher is not None or now - self._stamp_checked < self._stamp_interval)):
+                # stamp() duyệt cả thư mục comics/: không làm lại ở mỗi lời gọi (kể cả khi trúng cache)
+                return self._comics
+            stamp = self._backend.stamp()
+            self._stamp_checked = now
+            if self._comics is None or stamp != self._stamp:
+                self._comics = self._backend.load_comics(workers=self._load_workers)
+                self._by_id = {str(c['id']): c for c in self._comics}
+                self._chapter_pos = {}
+                self._taxonomy = None
+                self._search = None
+                self._stamp = stamp
+                self._generation += 1
+                self._epoch += 1
+                self._comic_versions = {}
+                if self._responses is not None:
+                    self._responses.clear()
+            return self._comics
+
+    def _find(self, comic_id):
+        """Tìm comic theo id trong O(1), trả về None nếu không có."""
+        return self._by_id.get(str(comic_id))
+
+    def _find_chapter(self, comic, vol, chap):
+        """Trả về vị trí của chapter (vol, chap) trong comic['chapters'], hoặc None."""
+        key = str(comic['id'])
+        positions = self._chapter_pos.get(key)
+        if positions is None:
+            positions = {}
+            for i, c in enumerate(comic.get('chapters', [])):
+                positions.setdefault((c.get('vol'), c.get('chap')), i)
+            self._chapter_pos[key] = positions
+        return positions.get((vol, chap))
+
+    def _taxonomy_index(self):
+        """Trả về chỉ mục ngược của thư viện hiện tại, dựng nó nếu chưa có."""
+        with self._lock:
+            if self._taxonomy is None:
+                self._taxonomy = TaxonomyIndex(self._comics or [])
+            return self._taxonomy
+
+    def _taxonomy_update(self, field, comic, removed=(), added=()):
+        """Cập nhật chỉ mục ngược sau khi danh sách field của comic thay đổi."""
+        if self._taxonomy is None or field not in TAXONOMY_FIELDS:
+            # Chưa dựng thì lần dựng sau sẽ đọc thẳng dữ liệu mới
+            return
+        for term in removed:
+            self._taxonomy.remove(field, comic['id'], term)
+        for term in added:
+            self._taxonomy.add(field, comic['id'], term)
+
+    def _search_index(self):
+        """Trả về chỉ mục tìm kiếm của thư viện hiện tại, dựng nó nếu chưa có."""
+        with self._lock:
+            if self._search is None:
+                self._search = SearchIndex(self._comics or [])
+            return self._search
+
+    def _search_update(self, comic, removed=False):
+        """Đánh chỉ mục lại một comic (hoặc bỏ nó ra) sau khi nó bị sửa."""
+        if self._search is None:
+            return
+        if removed:
+            self._search.remove_comic(comic['id'])
+        else:
+            self._search.update_comic(comic)
+
+    def _sorted_comics(self, sort):
+        """(keys, comics) theo thứ tự sort, dùng lại được cho tới lần sửa tiếp theo."""
+        with self._lock:
+            cached = self._page_order
+            if cached is not None and cached[0] == self._generation and cached[1] == sort:
+                return cached[2], cached[3]
+            generation = self._generation
+            comics = list(self._comics or [])
+        field = sort.lstrip('-')
+        pairs = sorted(((_sort_key(c, field), c) for c in comics), key=lambda p: p[0])
+        keys = [k for k, _ in pairs]
+        ordered = [c for _, c in pairs]
+        with self._lock:
+            self._page_order = (generation, sort, keys, ordered)
+        return keys, ordered
+
+    def _touch(self, comic_id):
+        """Đánh dấu comic đã đổi: các phản hồi đã cache của nó không còn được dùng."""
+        key = str(comic_id)
+        with self._lock:
+            self._comic_versions[key] = self._comic_versions.get(key, 0) + 1
+
+    def _chapters_changed(self, comic):
+        """Bỏ chỉ mục chapter của comic sau khi danh sách chapters thay đổi."""
+        self._chapter_pos.pop(str(comic['id']), None)
+
+    def _save(self, comics, comic=None):
+        """Ghi nhận thay đổi; luồng ghi sẽ lưu xuống đĩa (hoặc lưu ngay nếu tắt ghi trễ).
+
+        Nếu truyền comic thì comic.json của nó được đánh dấu cần ghi.
+        """
+        with self._lock:
+            if comic is not None:
+                self._changes.mark_comic(comic['id'])
+                self._search_update(comic)
+            self._comics = comics
+            self._generation += 1
+            self._wakeup.notify()
+
+    def _flush_pending(self):
+        """Ghi mọi thay đổi đang chờ thành một transaction. Trả về lỗi nếu có."""
+        with metrics.phase('save'), self._flush_lock:
+            changes = None
+            stamp = None
+            try:
+                # Chụp lại dữ liệu dưới khóa đọc, còn việc ghi đĩa thì không giữ khóa
+                with self._rw.read(), self._lock:
+                    if not self._changes:
+                        return self._write_error
+                    changes = self._changes
+                    self._changes = ComicChanges()
+                    self._writing = True
+                    self._committing = changes
+                    tx = self._backend.prepare_save(self._comics, changes)
+                    seen = self._stamp
+                # Đĩa chỉ được coi là đã biết nếu ngay trước khi ghi nó vẫn là bản ta đã đọc:
+                # sửa từ bên ngoài trong lúc chờ ghi thì lần _load sau phải đọc lại
+                unchanged = seen is not None and self._backend.stamp() == seen
+                tx.commit()
+                stamp = self._backend.stamp() if unchanged else None
+                self._write_error = None
+                if self._watcher is not None:
+                    # Không báo lại chính những file vừa ghi
+                    self._watcher.sync(changes.comics, changes.index)
+            except Exception as e:
+                # Giữ lại các thay đổi (kể cả khi lỗi ngay lúc dựng transaction) để lần ghi sau thử lại
+                if changes is not None:
+                    with self._lock:
+                        changes.update(self._changes)
+                        self._changes = changes
+                self._write_error = str(e)
+            finally:
+                if changes is not None:
+                    with self._lock:
+                        self._writing = False
+                        self._committing = None
+                        if self._write_error is None:
+                            self._stamp = stamp
+            return self._write_error
+
+    def _writer_loop(self):
+        while True:
+            with self._lock:
+                while not self._changes and not self._closed:
+                    self._wakeup.wait()
+                if self._closed:
+                    return
+            # Đợi một chút để gom các lần sửa liên tiếp vào một lần ghi
+            time.sleep(self._write_delay)
+            try:
+                with self._measure('background_flush'):
+                    error = self._flush_pending()
+            except Exception as e:
+                # Luồng ghi không được chết: các thay đổi sau vẫn phải được ghi
+                error = self._write_error = str(e)
+            if error is not None:
+                time.sleep(1)
+
+    def _measure(self, name):
+        """Ghi số liệu cho lời gọi name nếu metrics đang bật."""
+        return self._metrics.call(name) if self._metrics is not None else nullcontext()
+
+    def flush(self):
+        """Ghi ngay mọi thay đổi đang chờ xuống đĩa."""
+        with self._measure('flush'):
+            error = self._flush_pending()
+        if error is not None:
+            return _dumps({"success": False, "error": error})
+        return _dumps({"success": True})
+
+    # _close, _watch và _dump_metrics dành cho mã Python (run_webview.py, benchmark.py):
+    # pywebview không đưa method bắt đầu bằng _ sang JS.
+    def _close(self):
+        """Dừng luồng ghi và lưu nốt các thay đổi còn lại; báo RuntimeError nếu không lưu được."""
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify_all()
+        with self._measure('close'):
+            error = self._flush_pending()
+        if self._metrics is not None and self._metrics_file:
+            self._metrics.dump(self._metrics_file)
+        if error is not None:
+            raise RuntimeError(f"Could not save pending changes: {error}")
+
+    def _watch(self, on_change=None, interval=1.0, use_inotify=True):
+        """Theo dõi thư mục comics/ và chỉ nạp lại những comic bị sửa từ bên ngoài.
+
+        on_change(comic_ids, index_changed) được gọi trên luồng theo dõi sau mỗi lần nạp lại,
+        ví dụ để báo cho giao diện. Khi comic-index.json đổi thì cả thư viện được đọc lại
+        ở lời gọi sau. Comic còn thay đổi chưa ghi thì giữ bản trong bộ nhớ.
+        """
+        root = getattr(self._backend, 'root', None)
+        if root is None or not hasattr(self._backend, 'load_comic') or not hasattr(self._backend, 'comic_ids'):
+            raise ValueError("_watch() needs a backend with root, comic_ids() and load_comic()")
+        if self._watcher is not None:
+            self._watcher.stop()
+        self._on_change = on_change
+        self._watcher = LibraryWatcher(root, self._disk_changed, interval=interval, use_inotify=use_inotify)
+        self._watcher.start()
+
+    def _disk_changed(self, comic_ids, index_changed):
+        """Gọi từ LibraryWatcher khi file trong comics/ bị sửa từ bên ngoài."""
+        with self._rw.write():
+            reloaded = self._reload_comics(comic_ids, index_changed)
+        if (reloaded or index_changed) and self._on_change is not None:
+            self._on_change(reloaded, index_changed)
+
+    def _reload_comics(self, comic_ids, index_changed):
+        """Đọc lại các comic này từ đĩa vào thư viện trong bộ nhớ; trả về id của các comic đã nạp lại."""
+        with self._lock:
+            if self._comics is None:
+                # Chưa đọc thư viện: lần _load đầu tiên sẽ đọc bản mới
+                return []
+            pending = [self._changes] + ([self._committing] if self._committing is not None else [])
+            busy = set().union(*(changes.comics for changes in pending))
+            if index_changed and not self._changes and not self._writing:
+                # Danh sách comic đổi: _load sẽ đọc lại toàn bộ
+                self._stamp = None
+                return []
+            reloaded = []
+            keys = set(map(str, comic_ids))
+            if index_changed:
+                # Lần ghi đang chờ có thể ghi lại comic-index.json từ bộ nhớ: gộp ngay danh sách
+                # comic trên đĩa vào bộ nhớ để không làm mất comic được thêm/xóa từ bên ngoài
+                deleting = {os.path.normpath(path) for changes in pending for path in changes.removed}
+                listed = [str(i) for i in self._backend.comic_ids()]
+                for key in listed:
+                    if key in self._by_id or os.path.normpath(get_comic_folder(key)) in deleting:
+                        continue
+                    keys.discard(key)
+                    fresh = self._backend.load_comic(key)
+                    if fresh is None:
+                        continue
+                    self._comics.append(fresh)
+                    self._by_id[key] = fresh
+                    if self._taxonomy is not None:
+                        self._taxonomy.add_comic(fresh)
+                    self._search_update(fresh)
+                    self._touch(key)
+                    reloaded.append(fresh['id'])
+                listed = set(listed)
+                for key in [key for key in self._by_id if key not in listed and key not in busy]:
+                    keys.discard(key)
+                    reloaded.append(self._drop_comic(self._by_id[key]))
+            for key in keys:
+                comic = self._by_id.get(key)
+                # Comic chưa có trong comic-index.json chỉ xuất hiện khi index đổi
+                if comic is None or key in busy:
+                    continue
+                fresh = self._backend.load_comic(key)
+                if fresh is None:
+                    reloaded.append(self._drop_comic(comic))
+                    continue
+                if self._taxonomy is not None:
+                    self._taxonomy.remove_comic(comic)
+                # Sửa tại chỗ để những ai đang giữ comic này thấy bản mới
+                comic.clear()
+                comic.update(fresh)
+                if self._taxonomy is not None:
+                    self._taxonomy.add_comic(comic)
+                self._search_update(comic)
+                self._chapters_changed(comic)
+                self._touch(key)
+                reloaded.append(comic['id'])
+            if reloaded:
+                self._generation += 1
+                if not index_changed:
+                    self._stamp = self._backend.stamp()
+            return reloaded
+
+    def _drop_comic(self, comic):
+        """Bỏ một comic đã bị xóa trên đĩa khỏi thư viện trong bộ nhớ; trả về id của nó."""
+        key = str(comic['id'])
+        self._comics[:] = [c for c in self._comics if c is not comic]
+        del self._by_id[key]
+        if self._taxonomy is not None:
+            self._taxonomy.remove_comic(comic)
+        self._search_update(comic, removed=True)
+        self._chapters_changed(comic)
+        self._touch(key)
+        return comic['id']
+
+    @reads
     def get_comics(self):
         """Lấy danh sách tất cả comics, kèm chapters, alt_names, ..."""
-        comics = load_comics()
-        return json.dumps({"success": True, "data": comics})
+        comics = self._load()
+        return _dumps({"success": True, "data": comics})
 
+    @reads
     def get_comic(self, comic_id):
         """Lấy chi tiết một comic theo id."""
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                return json.dumps({"success": True, "data": comic})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        return _dumps({"success": True, "data": comic})
 
+    @writes
     def add_comic(self, comic_data):
         """Thêm một comic mới. comic_data là dict (từ JSON)."""
-        comics = load_comics()
+        comics = self._load()
         new_id = max([c['id'] for c in comics], default=0) + 1
         comic_data['id'] = new_id
         comic_data['chapters'] = []
@@ -29,8 +686,6 @@ class ComicAPI:
         comic_data['createtime'] = now
         comic_data['updated_at'] = now
         comic_data['latest_chapter_at'] = 'N/A'
-        ensure_comics_dir()
-        os.makedirs(get_comic_folder(new_id), exist_ok=True)
         # Convert 'chap' in chapters to float if present
         if 'chapters' in comic_data:
             for chapter in comic_data['chapters']:
@@ -40,538 +695,905 @@ class ComicAPI:
                     except Exception:
                         chapter['chap'] = 0.0
         comics.append(comic_data)
-        save_comics(comics)
-        return json.dumps({"success": True, "data": comic_data})
+        self._by_id[str(new_id)] = comic_data
+        for field in TAXONOMY_FIELDS:
+            self._taxonomy_update(field, comic_data, added=comic_data.get(field) or [])
+        self._changes.mark_comic(new_id, index=True)
+        self._search_update(comic_data)
+        self._save(comics)
+        return _dumps({"success": True, "data": comic_data})
 
+    @writes
     def edit_comic(self, comic_id, comic_data):
         """Sửa thông tin một comic."""
-        comics = load_comics()
-        for i, comic in enumerate(comics):
-            if str(comic['id']) == str(comic_id):
-                # Nếu có chapters, đảm bảo mọi chapter['chap'] là float
-                if 'chapters' in comic_data:
-                    for chapter in comic_data['chapters']:
-                        if 'chap' in chapter:
-                            try:
-                                chapter['chap'] = float(chapter['chap'])
-                            except Exception:
-                                chapter['chap'] = 0.0
-                # Nếu không có chapters trong comic_data nhưng có trong comic, vẫn đảm bảo mọi chapter['chap'] là float
-                elif 'chapters' in comic:
-                    for chapter in comic['chapters']:
-                        if 'chap' in chapter:
-                            try:
-                                chapter['chap'] = float(chapter['chap'])
-                            except Exception:
-                                chapter['chap'] = 0.0
-                for key in comic_data:
-                    comic[key] = comic_data[key]
-                comic['updated_at'] = get_current_datetime()
-                comics[i] = comic
-                save_comics(comics)
-                return json.dumps({"success": True, "data": comic})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        # Nếu có chapters, đảm bảo mọi chapter['chap'] là float
+        if 'chapters' in comic_data:
+            for chapter in comic_data['chapters']:
+                if 'chap' in chapter:
+                    try:
+                        chapter['chap'] = float(chapter['chap'])
+                    except Exception:
+                        chapter['chap'] = 0.0
+            self._changes.mark_all_chapters(comic['id'])
+            self._chapters_changed(comic)
+        # Nếu không có chapters trong comic_data nhưng có trong comic, vẫn đảm bảo mọi chapter['chap'] là float
+        elif 'chapters' in comic:
+            for chapter in comic['chapters']:
+                if 'chap' in chapter and not isinstance(chapter['chap'], float):
+                    try:
+                        chapter['chap'] = float(chapter['chap'])
+                    except Exception:
+                        chapter['chap'] = 0.0
+                    self._changes.mark_chapter(comic['id'], chapter.get('vol', 0), chapter['chap'])
+                    self._chapters_changed(comic)
+        for key in comic_data:
+            self._taxonomy_update(key, comic, removed=comic.get(key) or [], added=comic_data[key] or [])
+            comic[key] = comic_data[key]
+        comic['updated_at'] = get_current_datetime()
+        self._changes.mark_comic(comic['id'], index='title' in comic_data)
+        self._search_update(comic)
+        self._save(comics)
+        return _dumps({"success": True, "data": comic})
 
+    @writes
     def delete_comic(self, comic_id):
         """Xóa một comic."""
-        comics = load_comics()
-        for i, comic in enumerate(comics):
-            if str(comic['id']) == str(comic_id):
-                folder = get_comic_folder(comic['id'])
-                if os.path.exists(folder):
-                    import shutil
-                    shutil.rmtree(folder)
-                del comics[i]
-                save_comics(comics)
-                return json.dumps({"success": True})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        # Thư mục của comic được xóa cùng lúc với lần ghi comic-index.json
+        folder = get_comic_folder(comic['id'])
+        if os.path.exists(folder):
+            self._changes.remove_file(folder)
+        comics[:] = [c for c in comics if c is not comic]
+        del self._by_id[str(comic['id'])]
+        for field in TAXONOMY_FIELDS:
+            self._taxonomy_update(field, comic, removed=comic.get(field) or [])
+        self._chapters_changed(comic)
+        self._changes.forget_comic(comic['id'])
+        self._search_update(comic, removed=True)
+        self._changes.mark_index()
+        self._save(comics)
+        return _dumps({"success": True})
 
+    @writes
     def add_chapter(self, comic_id, chapter_data):
         """Thêm chapter cho comic."""
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                now = get_current_datetime()
-                chapter_data['created_at'] = now
-                chapter_data['updated_at'] = now
-                comic.setdefault('chapters', []).append(chapter_data)
-                # Lưu file chapter
-                folder = get_comic_folder(comic['id'])
-                vol = chapter_data.get('vol', 0)
-                chnum = chapter_data.get('chap', 0)
-                chapter_path = os.path.join(folder, f"vol_{vol}_chapter_{chnum}.json")
-                with open(chapter_path, 'w', encoding='utf-8') as cf:
-                    json.dump(chapter_data, cf, indent=4, ensure_ascii=False)
-                save_comics(comics)
-                return json.dumps({"success": True, "data": chapter_data})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        now = get_current_datetime()
+        chapter_data['created_at'] = now
+        chapter_data['updated_at'] = now
+        comic.setdefault('chapters', []).append(chapter_data)
+        self._chapters_changed(comic)
+        # Chỉ ghi file chapter mới và comic.json
+        self._changes.mark_chapter(comic['id'], chapter_data.get('vol', 0), chapter_data.get('chap', 0))
+        self._save(comics)
+        return _dumps({"success": True, "data": chapter_data})
 
+    @writes
     def edit_chapter(self, comic_id, vol, chap, chapter_data):
         """Sửa chapter cho comic."""
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                for i, c in enumerate(comic.get('chapters', [])):
-                    if c.get('vol') == vol and c.get('chap') == chap:
-                        chapter_data['updated_at'] = get_current_datetime()
-                        if 'created_at' in c:
-                            chapter_data['created_at'] = c['created_at']
-                        comic['chapters'][i] = chapter_data
-                        # Lưu file chapter
-                        folder = get_comic_folder(comic['id'])
-                        chapter_path = os.path.join(folder, f"vol_{vol}_chapter_{chap}.json")
-                        with open(chapter_path, 'w', encoding='utf-8') as cf:
-                            json.dump(chapter_data, cf, indent=4, ensure_ascii=False)
-                        save_comics(comics)
-                        return json.dumps({"success": True, "data": chapter_data})
-                return json.dumps({"success": False, "error": "Chapter not found"})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        i = self._find_chapter(comic, vol, chap)
+        if i is None:
+            return _dumps({"success": False, "error": "Chapter not found"})
+        c = comic['chapters'][i]
+        chapter_data['updated_at'] = get_current_datetime()
+        if 'created_at' in c:
+            chapter_data['created_at'] = c['created_at']
+        comic['chapters'][i] = chapter_data
+        self._chapters_changed(comic)
+        # Chỉ ghi lại file chapter này và comic.json
+        self._changes.mark_chapter(comic['id'], chapter_data.get('vol', 0), chapter_data.get('chap', 0))
+        self._save(comics)
+        return _dumps({"success": True, "data": chapter_data})
 
+    @writes
     def delete_chapter(self, comic_id, vol, chap):
         """Xóa chapter cho comic."""
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                for i, c in enumerate(comic.get('chapters', [])):
-                    if c.get('vol') == vol and c.get('chap') == chap:
-                        # Xóa file chapter
-                        folder = get_comic_folder(comic['id'])
-                        chapter_path = os.path.join(folder, f"vol_{vol}_chapter_{chap}.json")
-                        if os.path.exists(chapter_path):
-                            os.remove(chapter_path)
-                        del comic['chapters'][i]
-                        save_comics(comics)
-                        return json.dumps({"success": True})
-                return json.dumps({"success": False, "error": "Chapter not found"})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        i = self._find_chapter(comic, vol, chap)
+        if i is None:
+            return _dumps({"success": False, "error": "Chapter not found"})
+        # Xóa file chapter cùng lúc với lần ghi comic.json
+        folder = get_comic_folder(comic['id'])
+        chapter_path = os.path.join(folder, f"vol_{vol}_chapter_{chap}.json")
+        if os.path.exists(chapter_path):
+            self._changes.remove_file(chapter_path)
+        del comic['chapters'][i]
+        self._chapters_changed(comic)
+        self._save(comics, comic)
+        return _dumps({"success": True})
+
+    @reads
+    def get_chapter_images(self, comic_id, vol, chap, start=0, count=50):
+        """Lấy một đoạn danh sách ảnh của chapter: images[start:start + count].
+
+        Chapter chưa được đọc thì không bị nạp vào bộ nhớ; với SQLite chỉ đọc đúng các dòng cần.
+        Trả về {"total": tổng số ảnh, "start": start, "images": [...]}.
+        """
+        self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        i = self._find_chapter(comic, vol, chap)
+        if i is None:
+            return _dumps({"success": False, "error": "Chapter not found"})
+        start = max(int(start), 0)
+        count = max(int(count), 0)
+        chapter = comic['chapters'][i]
+        if isinstance(chapter, LazyChapter):
+            total, images = chapter.read_images(start, count)
+        else:
+            all_images = chapter.get('images') or []
+            total, images = len(all_images), all_images[start:start + count]
+        return _dumps({"success": True, "data": {"total": total, "start": start, "images": images}})
 
     # --- ALT NAMES ---
+    @reads
     def get_alt_names(self, comic_id):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                return json.dumps({"success": True, "data": comic.get('alt_names', [])})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        return _dumps({"success": True, "data": comic.get('alt_names', [])})
 
+    @writes
     def add_alt_name(self, comic_id, alt_name):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                comic.setdefault('alt_names', []).append(alt_name)
-                comic['updated_at'] = get_current_datetime()
-                save_comics(comics)
-                return json.dumps({"success": True, "data": comic['alt_names']})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        comic.setdefault('alt_names', []).append(alt_name)
+        comic['updated_at'] = get_current_datetime()
+        self._save(comics, comic)
+        return _dumps({"success": True, "data": comic['alt_names']})
 
+    @writes
     def edit_alt_name(self, comic_id, index, alt_name):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                if 0 <= index < len(comic.get('alt_names', [])):
-                    comic['alt_names'][index] = alt_name
-                    comic['updated_at'] = get_current_datetime()
-                    save_comics(comics)
-                    return json.dumps({"success": True, "data": comic['alt_names']})
-                return json.dumps({"success": False, "error": "Alt name index out of range"})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        if 0 <= index < len(comic.get('alt_names', [])):
+            comic['alt_names'][index] = alt_name
+            comic['updated_at'] = get_current_datetime()
+            self._save(comics, comic)
+            return _dumps({"success": True, "data": comic['alt_names']})
+        return _dumps({"success": False, "error": "Alt name index out of range"})
 
+    @writes
     def delete_alt_name(self, comic_id, index):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                if 0 <= index < len(comic.get('alt_names', [])):
-                    del comic['alt_names'][index]
-                    comic['updated_at'] = get_current_datetime()
-                    save_comics(comics)
-                    return json.dumps({"success": True, "data": comic['alt_names']})
-                return json.dumps({"success": False, "error": "Alt name index out of range"})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        if 0 <= index < len(comic.get('alt_names', [])):
+            del comic['alt_names'][index]
+            comic['updated_at'] = get_current_datetime()
+            self._save(comics, comic)
+            return _dumps({"success": True, "data": comic['alt_names']})
+        return _dumps({"success": False, "error": "Alt name index out of range"})
 
     # --- GENRES ---
+    @reads
     def get_genres(self, comic_id):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                return json.dumps({"success": True, "data": comic.get('genres', [])})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        return _dumps({"success": True, "data": comic.get('genres', [])})
 
+    @writes
     def add_genre(self, comic_id, genre):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                comic.setdefault('genres', []).append(genre)
-                comic['updated_at'] = get_current_datetime()
-                save_comics(comics)
-                return json.dumps({"success": True, "data": comic['genres']})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        comic.setdefault('genres', []).append(genre)
+        self._taxonomy_update('genres', comic, added=[genre])
+        comic['updated_at'] = get_current_datetime()
+        self._save(comics, comic)
+        return _dumps({"success": True, "data": comic['genres']})
 
+    @writes
     def edit_genre(self, comic_id, index, genre):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                if 0 <= index < len(comic.get('genres', [])):
-                    comic['genres'][index] = genre
-                    comic['updated_at'] = get_current_datetime()
-                    save_comics(comics)
-                    return json.dumps({"success": True, "data": comic['genres']})
-                return json.dumps({"success": False, "error": "Genre index out of range"})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        if 0 <= index < len(comic.get('genres', [])):
+            self._taxonomy_update('genres', comic, removed=[comic['genres'][index]], added=[genre])
+            comic['genres'][index] = genre
+            comic['updated_at'] = get_current_datetime()
+            self._save(comics, comic)
+            return _dumps({"success": True, "data": comic['genres']})
+        return _dumps({"success": False, "error": "Genre index out of range"})
 
+    @writes
     def delete_genre(self, comic_id, index):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                if 0 <= index < len(comic.get('genres', [])):
-                    del comic['genres'][index]
-                    comic['updated_at'] = get_current_datetime()
-                    save_comics(comics)
-                    return json.dumps({"success": True, "data": comic['genres']})
-                return json.dumps({"success": False, "error": "Genre index out of range"})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        if 0 <= index < len(comic.get('genres', [])):
+            self._taxonomy_update('genres', comic, removed=[comic['genres'][index]])
+            del comic['genres'][index]
+            comic['updated_at'] = get_current_datetime()
+            self._save(comics, comic)
+            return _dumps({"success": True, "data": comic['genres']})
+        return _dumps({"success": False, "error": "Genre index out of range"})
 
     # --- THEMES ---
+    @reads
     def get_themes(self, comic_id):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                return json.dumps({"success": True, "data": comic.get('themes', [])})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        return _dumps({"success": True, "data": comic.get('themes', [])})
 
+    @writes
     def add_theme(self, comic_id, theme):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                comic.setdefault('themes', []).append(theme)
-                comic['updated_at'] = get_current_datetime()
-                save_comics(comics)
-                return json.dumps({"success": True, "data": comic['themes']})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        comic.setdefault('themes', []).append(theme)
+        self._taxonomy_update('themes', comic, added=[theme])
+        comic['updated_at'] = get_current_datetime()
+        self._save(comics, comic)
+        return _dumps({"success": True, "data": comic['themes']})
 
+    @writes
     def edit_theme(self, comic_id, index, theme):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                if 0 <= index < len(comic.get('themes', [])):
-                    comic['themes'][index] = theme
-                    comic['updated_at'] = get_current_datetime()
-                    save_comics(comics)
-                    return json.dumps({"success": True, "data": comic['themes']})
-                return json.dumps({"success": False, "error": "Theme index out of range"})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        if 0 <= index < len(comic.get('themes', [])):
+            self._taxonomy_update('themes', comic, removed=[comic['themes'][index]], added=[theme])
+            comic['themes'][index] = theme
+            comic['updated_at'] = get_current_datetime()
+            self._save(comics, comic)
+            return _dumps({"success": True, "data": comic['themes']})
+        return _dumps({"success": False, "error": "Theme index out of range"})
 
+    @writes
     def delete_theme(self, comic_id, index):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                if 0 <= index < len(comic.get('themes', [])):
-                    del comic['themes'][index]
-                    comic['updated_at'] = get_current_datetime()
-                    save_comics(comics)
-                    return json.dumps({"success": True, "data": comic['themes']})
-                return json.dumps({"success": False, "error": "Theme index out of range"})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        if 0 <= index < len(comic.get('themes', [])):
+            self._taxonomy_update('themes', comic, removed=[comic['themes'][index]])
+            del comic['themes'][index]
+            comic['updated_at'] = get_current_datetime()
+            self._save(comics, comic)
+            return _dumps({"success": True, "data": comic['themes']})
+        return _dumps({"success": False, "error": "Theme index out of range"})
 
     # --- FORMATS ---
+    @reads
     def get_formats(self, comic_id):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                return json.dumps({"success": True, "data": comic.get('formats', [])})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        return _dumps({"success": True, "data": comic.get('formats', [])})
 
+    @writes
     def add_format(self, comic_id, format_):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                comic.setdefault('formats', []).append(format_)
-                comic['updated_at'] = get_current_datetime()
-                save_comics(comics)
-                return json.dumps({"success": True, "data": comic['formats']})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        comic.setdefault('formats', []).append(format_)
+        self._taxonomy_update('formats', comic, added=[format_])
+        comic['updated_at'] = get_current_datetime()
+        self._save(comics, comic)
+        return _dumps({"success": True, "data": comic['formats']})
 
+    @writes
     def edit_format(self, comic_id, index, format_):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                if 0 <= index < len(comic.get('formats', [])):
-                    comic['formats'][index] = format_
-                    comic['updated_at'] = get_current_datetime()
-                    save_comics(comics)
-                    return json.dumps({"success": True, "data": comic['formats']})
-                return json.dumps({"success": False, "error": "Format index out of range"})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        if 0 <= index < len(comic.get('formats', [])):
+            self._taxonomy_update('formats', comic, removed=[comic['formats'][index]], added=[format_])
+            comic['formats'][index] = format_
+            comic['updated_at'] = get_current_datetime()
+            self._save(comics, comic)
+            return _dumps({"success": True, "data": comic['formats']})
+        return _dumps({"success": False, "error": "Format index out of range"})
 
+    @writes
     def delete_format(self, comic_id, index):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                if 0 <= index < len(comic.get('formats', [])):
-                    del comic['formats'][index]
-                    comic['updated_at'] = get_current_datetime()
-                    save_comics(comics)
-                    return json.dumps({"success": True, "data": comic['formats']})
-                return json.dumps({"success": False, "error": "Format index out of range"})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        if 0 <= index < len(comic.get('formats', [])):
+            self._taxonomy_update('formats', comic, removed=[comic['formats'][index]])
+            del comic['formats'][index]
+            comic['updated_at'] = get_current_datetime()
+            self._save(comics, comic)
+            return _dumps({"success": True, "data": comic['formats']})
+        return _dumps({"success": False, "error": "Format index out of range"})
 
     # --- TAGS ---
+    @reads
     def get_tags(self, comic_id):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                return json.dumps({"success": True, "data": comic.get('tags', [])})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        return _dumps({"success": True, "data": comic.get('tags', [])})
 
+    @writes
     def add_tag(self, comic_id, tag):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                comic.setdefault('tags', []).append(tag)
-                comic['updated_at'] = get_current_datetime()
-                save_comics(comics)
-                return json.dumps({"success": True, "data": comic['tags']})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        comic.setdefault('tags', []).append(tag)
+        self._taxonomy_update('tags', comic, added=[tag])
+        comic['updated_at'] = get_current_datetime()
+        self._save(comics, comic)
+        return _dumps({"success": True, "data": comic['tags']})
 
+    @writes
     def edit_tag(self, comic_id, index, tag):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                if 0 <= index < len(comic.get('tags', [])):
-                    comic['tags'][index] = tag
-                    comic['updated_at'] = get_current_datetime()
-                    save_comics(comics)
-                    return json.dumps({"success": True, "data": comic['tags']})
-                return json.dumps({"success": False, "error": "Tag index out of range"})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        if 0 <= index < len(comic.get('tags', [])):
+            self._taxonomy_update('tags', comic, removed=[comic['tags'][index]], added=[tag])
+            comic['tags'][index] = tag
+            comic['updated_at'] = get_current_datetime()
+            self._save(comics, comic)
+            return _dumps({"success": True, "data": comic['tags']})
+        return _dumps({"success": False, "error": "Tag index out of range"})
 
+    @writes
     def delete_tag(self, comic_id, index):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                if 0 <= index < len(comic.get('tags', [])):
-                    del comic['tags'][index]
-                    comic['updated_at'] = get_current_datetime()
-                    save_comics(comics)
-                    return json.dumps({"success": True, "data": comic['tags']})
-                return json.dumps({"success": False, "error": "Tag index out of range"})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        if 0 <= index < len(comic.get('tags', [])):
+            self._taxonomy_update('tags', comic, removed=[comic['tags'][index]])
+            del comic['tags'][index]
+            comic['updated_at'] = get_current_datetime()
+            self._save(comics, comic)
+            return _dumps({"success": True, "data": comic['tags']})
+        return _dumps({"success": False, "error": "Tag index out of range"})
 
     # --- ARTISTS ---
+    @reads
     def get_artists(self, comic_id):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                return json.dumps({"success": True, "data": comic.get('artists', [])})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        return _dumps({"success": True, "data": comic.get('artists', [])})
 
+    @writes
     def add_artist(self, comic_id, artist):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                comic.setdefault('artists', []).append(artist)
-                comic['updated_at'] = get_current_datetime()
-                save_comics(comics)
-                return json.dumps({"success": True, "data": comic['artists']})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        comic.setdefault('artists', []).append(artist)
+        self._taxonomy_update('artists', comic, added=[artist])
+        comic['updated_at'] = get_current_datetime()
+        self._save(comics, comic)
+        return _dumps({"success": True, "data": comic['artists']})
 
+    @writes
     def edit_artist(self, comic_id, index, artist):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                if 0 <= index < len(comic.get('artists', [])):
-                    comic['artists'][index] = artist
-                    comic['updated_at'] = get_current_datetime()
-                    save_comics(comics)
-                    return json.dumps({"success": True, "data": comic['artists']})
-                return json.dumps({"success": False, "error": "Artist index out of range"})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        if 0 <= index < len(comic.get('artists', [])):
+            self._taxonomy_update('artists', comic, removed=[comic['artists'][index]], added=[artist])
+            comic['artists'][index] = artist
+            comic['updated_at'] = get_current_datetime()
+            self._save(comics, comic)
+            return _dumps({"success": True, "data": comic['artists']})
+        return _dumps({"success": False, "error": "Artist index out of range"})
 
+    @writes
     def delete_artist(self, comic_id, index):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                if 0 <= index < len(comic.get('artists', [])):
-                    del comic['artists'][index]
-                    comic['updated_at'] = get_current_datetime()
-                    save_comics(comics)
-                    return json.dumps({"success": True, "data": comic['artists']})
-                return json.dumps({"success": False, "error": "Artist index out of range"})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        if 0 <= index < len(comic.get('artists', [])):
+            self._taxonomy_update('artists', comic, removed=[comic['artists'][index]])
+            del comic['artists'][index]
+            comic['updated_at'] = get_current_datetime()
+            self._save(comics, comic)
+            return _dumps({"success": True, "data": comic['artists']})
+        return _dumps({"success": False, "error": "Artist index out of range"})
 
     # --- ARTS ---
+    @reads
     def get_arts(self, comic_id):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                return json.dumps({"success": True, "data": comic.get('arts', [])})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        return _dumps({"success": True, "data": comic.get('arts', [])})
 
+    @writes
     def add_art(self, comic_id, art):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                comic.setdefault('arts', []).append(art)
-                comic['updated_at'] = get_current_datetime()
-                save_comics(comics)
-                return json.dumps({"success": True, "data": comic['arts']})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        comic.setdefault('arts', []).append(art)
+        comic['updated_at'] = get_current_datetime()
+        self._save(comics, comic)
+        return _dumps({"success": True, "data": comic['arts']})
 
+    @writes
     def edit_art(self, comic_id, index, art):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                if 0 <= index < len(comic.get('arts', [])):
-                    comic['arts'][index] = art
-                    comic['updated_at'] = get_current_datetime()
-                    save_comics(comics)
-                    return json.dumps({"success": True, "data": comic['arts']})
-                return json.dumps({"success": False, "error": "Art index out of range"})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        if 0 <= index < len(comic.get('arts', [])):
+            comic['arts'][index] = art
+            comic['updated_at'] = get_current_datetime()
+            self._save(comics, comic)
+            return _dumps({"success": True, "data": comic['arts']})
+        return _dumps({"success": False, "error": "Art index out of range"})
 
+    @writes
     def delete_art(self, comic_id, index):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                if 0 <= index < len(comic.get('arts', [])):
-                    del comic['arts'][index]
-                    comic['updated_at'] = get_current_datetime()
-                    save_comics(comics)
-                    return json.dumps({"success": True, "data": comic['arts']})
-                return json.dumps({"success": False, "error": "Art index out of range"})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        if 0 <= index < len(comic.get('arts', [])):
+            del comic['arts'][index]
+            comic['updated_at'] = get_current_datetime()
+            self._save(comics, comic)
+            return _dumps({"success": True, "data": comic['arts']})
+        return _dumps({"success": False, "error": "Art index out of range"})
 
     # --- COMMENTS (comic-level) ---
+    @reads
     def get_comments(self, comic_id):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                return json.dumps({"success": True, "data": comic.get('comments', [])})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        return _dumps({"success": True, "data": comic.get('comments', [])})
 
+    @writes
     def add_comment(self, comic_id, comment):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                comic.setdefault('comments', []).append(comment)
-                comic['updated_at'] = get_current_datetime()
-                save_comics(comics)
-                return json.dumps({"success": True, "data": comic['comments']})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        comic.setdefault('comments', []).append(comment)
+        comic['updated_at'] = get_current_datetime()
+        self._save(comics, comic)
+        return _dumps({"success": True, "data": comic['comments']})
 
+    @writes
     def edit_comment(self, comic_id, index, comment):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                if 0 <= index < len(comic.get('comments', [])):
-                    comic['comments'][index] = comment
-                    comic['updated_at'] = get_current_datetime()
-                    save_comics(comics)
-                    return json.dumps({"success": True, "data": comic['comments']})
-                return json.dumps({"success": False, "error": "Comment index out of range"})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        if 0 <= index < len(comic.get('comments', [])):
+            comic['comments'][index] = comment
+            comic['updated_at'] = get_current_datetime()
+            self._save(comics, comic)
+            return _dumps({"success": True, "data": comic['comments']})
+        return _dumps({"success": False, "error": "Comment index out of range"})
 
+    @writes
     def delete_comment(self, comic_id, index):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                if 0 <= index < len(comic.get('comments', [])):
-                    del comic['comments'][index]
-                    comic['updated_at'] = get_current_datetime()
-                    save_comics(comics)
-                    return json.dumps({"success": True, "data": comic['comments']})
-                return json.dumps({"success": False, "error": "Comment index out of range"})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        if 0 <= index < len(comic.get('comments', [])):
+            del comic['comments'][index]
+            comic['updated_at'] = get_current_datetime()
+            self._save(comics, comic)
+            return _dumps({"success": True, "data": comic['comments']})
+        return _dumps({"success": False, "error": "Comment index out of range"})
 
     # --- DEMOGRAPHICS ---
+    @reads
     def get_demographics(self, comic_id):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                return json.dumps({"success": True, "data": comic.get('demographics', [])})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        return _dumps({"success": True, "data": comic.get('demographics', [])})
 
+    @writes
     def set_demographics(self, comic_id, demographics):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                comic['demographics'] = demographics
-                comic['updated_at'] = get_current_datetime()
-                save_comics(comics)
-                return json.dumps({"success": True, "data": comic['demographics']})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        comic['demographics'] = demographics
+        comic['updated_at'] = get_current_datetime()
+        self._save(comics, comic)
+        return _dumps({"success": True, "data": comic['demographics']})
 
     # --- STAR ---
+    @reads
     def get_star(self, comic_id):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                return json.dumps({"success": True, "data": comic.get('star', 0)})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        return _dumps({"success": True, "data": comic.get('star', 0)})
 
+    @writes
     def set_star(self, comic_id, star):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                comic['star'] = star
-                comic['updated_at'] = get_current_datetime()
-                save_comics(comics)
-                return json.dumps({"success": True, "data": comic['star']})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        comic['star'] = star
+        comic['updated_at'] = get_current_datetime()
+        self._save(comics, comic)
+        return _dumps({"success": True, "data": comic['star']})
 
     # --- DESCRIPTION ---
+    @reads
     def get_description(self, comic_id):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                return json.dumps({"success": True, "data": comic.get('description', '')})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        return _dumps({"success": True, "data": comic.get('description', '')})
 
+    @writes
     def set_description(self, comic_id, description):
-        comics = load_comics()
-        for comic in comics:
-            if str(comic['id']) == str(comic_id):
-                comic['description'] = description
-                comic['updated_at'] = get_current_datetime()
-                save_comics(comics)
-                return json.dumps({"success": True, "data": comic['description']})
-        return json.dumps({"success": False, "error": "Comic not found"})
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        comic['description'] = description
+        comic['updated_at'] = get_current_datetime()
+        self._save(comics, comic)
+        return _dumps({"success": True, "data": comic['description']})
 
     # --- ALL DATA ---
+    @reads
     def get_all_genres(self):
-        comics = load_comics()
-        genres = set()
-        for comic in comics:
-            for g in comic.get('genres', []):
-                genres.add(g)
-        return json.dumps({"success": True, "data": sorted(genres)})
+        self._load()
+        return _dumps({"success": True, "data": self._taxonomy_index().terms('genres')})
 
+    @reads
     def get_all_themes(self):
-        comics = load_comics()
-        themes = set()
-        for comic in comics:
-            for t in comic.get('themes', []):
-                themes.add(t)
-        return json.dumps({"success": True, "data": sorted(themes)})
+        self._load()
+        return _dumps({"success": True, "data": self._taxonomy_index().terms('themes')})
 
+    @reads
     def get_all_formats(self):
-        comics = load_comics()
-        formats = set()
-        for comic in comics:
-            for f in comic.get('formats', []):
-                formats.add(f)
-        return json.dumps({"success": True, "data": sorted(formats)})
+        self._load()
+        return _dumps({"success": True, "data": self._taxonomy_index().terms('formats')})
 
+    @reads
     def get_all_tags(self):
-        comics = load_comics()
-        tags = set()
-        for comic in comics:
-            for t in comic.get('tags', []):
-                tags.add(t)
-        return json.dumps({"success": True, "data": sorted(tags)})
+        self._load()
+        return _dumps({"success": True, "data": self._taxonomy_index().terms('tags')})
 
+    @reads
     def get_all_artists(self):
-        comics = load_comics()
-        artists = set()
-        for comic in comics:
-            for a in comic.get('artists', []):
-                artists.add(a)
-        return json.dumps({"success": True, "data": sorted(artists)})
+        self._load()
+        return _dumps({"success": True, "data": self._taxonomy_index().terms('artists')})
+
+    # --- FILTER ---
+    def _matches(self, comic, filters):
+        for field, wanted in filters.items():
+            value = comic.get(field)
+            if isinstance(value, list):
+                values = [wanted] if isinstance(wanted, str) else wanted
+                if not all(v in value for v in values):
+                    return False
+            elif value != wanted:
+                return False
+        return True
+
+    @reads
+    def filter_comics(self, filters):
+        """Lọc comics theo nhiều trường, ví dụ {"status": "Ongoing", "genres": ["Yuri"]}.
+
+        Trường đơn phải bằng giá trị cho trước; trường danh sách phải chứa đủ mọi giá trị.
+        Backend có find_comic_ids (SQLite) thì truy vấn theo chỉ mục thay vì duyệt hết.
+        """
+        comics = self._load()
+        with self._lock:
+            use_index = hasattr(self._backend, 'find_comic_ids') and not self._changes and not self._writing
+        if use_index:
+            try:
+                ids = self._backend.find_comic_ids(filters)
+            except ValueError as e:
+                return _dumps({"success": False, "error": str(e)})
+            result = [self._find(i) for i in ids]
+            result = [c for c in result if c is not None]
+        else:
+            candidates = comics
+            taxonomy = self._taxonomy_index()
+            for field, wanted in filters.items():
+                if field in TAXONOMY_FIELDS:
+                    # Thu hẹp bằng chỉ mục ngược trước khi so từng comic
+                    for value in ([wanted] if isinstance(wanted, str) else wanted):
+                        ids = set(taxonomy.comic_ids(field, value))
+                        candidates = [c for c in candidates if str(c['id']) in ids]
+            result = [c for c in candidates if self._matches(c, filters)]
+        return _dumps({"success": True, "data": result})
+
+    @reads
+    def get_taxonomy_counts(self, field):
+        """Số comic dùng mỗi term của field (genres, themes, formats, tags, artists)."""
+        if field not in TAXONOMY_FIELDS:
+            return _dumps({"success": False, "error": f"Unknown field: {field}"})
+        self._load()
+        return _dumps({"success": True, "data": self._taxonomy_index().counts(field)})
+
+    @reads
+    def get_comics_by_term(self, field, term):
+        """Các comic có term trong field, ví dụ get_comics_by_term("genres", "Yuri")."""
+        if field not in TAXONOMY_FIELDS:
+            return _dumps({"success": False, "error": f"Unknown field: {field}"})
+        self._load()
+        ids = self._taxonomy_index().comic_ids(field, term)
+        comics = [self._find(i) for i in ids]
+        return _dumps({"success": True, "data": [c for c in comics if c is not None]})
+
+    # --- SEARCH ---
+    @reads
+    def search(self, query, limit=20, offset=0):
+        """Tìm comic theo tên, tên khác, tác giả, họa sĩ và mô tả; kết quả xếp theo độ liên quan.
+
+        Không phân biệt hoa thường và dấu tiếng Việt; tên tiếng Trung/Nhật/Hàn cũng tìm được.
+        Trả về {"total": số kết quả, "results": [{"score": ..., "comic": ...}]} cho trang offset/limit.
+        """
+        self._load()
+        hits = self._search_index().search(query or '')
+        offset = max(int(offset), 0)
+        results = []
+        for key, score in hits[offset:offset + max(int(limit), 0)]:
+            comic = self._find(key)
+            if comic is not None:
+                results.append({"score": round(score, 3), "comic": comic})
+        return _dumps({"success": True, "data": {"total": len(hits), "results": results}})
+
+    # --- PAGING ---
+    @reads
+    def get_comics_page(self, offset=0, limit=50, fields=None, sort=None, cursor=None):
+        """Lấy một trang comics, chỉ gồm các trường cần dùng.
+
+        fields: danh sách trường (hoặc tên một trường; mặc định PAGE_FIELDS), có thể gồm trường tính sẵn 'chapter_count'.
+        sort: tên trường, thêm '-' phía trước để sắp giảm dần (mặc định 'id').
+        cursor: next_cursor của trang trước; trang tiếp theo không bị lệch khi comic
+        được thêm/xóa giữa hai lần gọi. Khi có cursor thì offset tính từ sau cursor.
+        Trả về {"total", "items", "next_cursor"} (next_cursor là None ở trang cuối).
+        """
+        self._load()
+        sort = sort or 'id'
+        if isinstance(fields, str):
+            # Một tên trường, không phải danh sách ký tự
+            fields = [fields]
+        elif fields is not None and not isinstance(fields, (list, tuple)):
+            return _dumps({"success": False, "error": "fields must be a list of field names"})
+        fields = list(fields) if fields else list(PAGE_FIELDS)
+        # keys/ordered luôn tăng dần; sắp giảm dần thì đọc từ cuối danh sách
+        keys, ordered = self._sorted_comics(sort)
+        descending = sort.startswith('-')
+        total = len(ordered)
+        start = 0
+        if cursor:
+            try:
+                cursor_sort, after = _decode_cursor(cursor)
+            except (ValueError, KeyError, TypeError, AttributeError):
+                return _dumps({"success": False, "error": "Invalid cursor"})
+            if cursor_sort != sort:
+                return _dumps({"success": False, "error": "Cursor was made for a different sort"})
+            if descending:
+                start = total - bisect.bisect_left(keys, after)
+            else:
+                start = bisect.bisect_right(keys, after)
+        start = min(start + max(int(offset), 0), total)
+        end = min(start + max(int(limit), 0), total)
+        if descending:
+            page = ordered[total - end:total - start][::-1]
+            last = total - end
+        else:
+            page = ordered[start:end]
+            last = end - 1
+        items = [{f: _field_value(comic, f) for f in fields if f in comic or f in COMPUTED_FIELDS}
+                 for comic in page]
+        next_cursor = None
+        if end < total and items:
+            next_cursor = _encode_cursor(sort, keys[last])
+        return _dumps({"success": True, "data": {
+            "total": total, "items": items, "next_cursor": next_cursor}})
+
+    # --- PATCH ---
+    @writes
+    def patch_comic(self, comic_id, patch):
+        """Sửa một phần comic bằng JSON Patch (RFC 6902), ví dụ [{"op": "replace", "path": "/star", "value": 8}].
+
+        Dùng thao tác "test" để kiểm tra giá trị hiện tại trước khi sửa: nếu không khớp thì
+        không có gì bị thay đổi. Chapters sửa bằng patch_chapter. Chỉ trả về updated_at mới.
+        """
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        try:
+            keys = top_level_keys(patch)
+            if 'id' in keys or 'chapters' in keys:
+                raise PatchError("id and chapters cannot be patched")
+            patched = apply_patch(comic, patch)
+        except PatchError as e:
+            return _dumps({"success": False, "error": str(e)})
+        for key in keys:
+            self._taxonomy_update(key, comic, removed=comic.get(key) or [], added=patched.get(key) or [])
+            if key in patched:
+                comic[key] = patched[key]
+            else:
+                comic.pop(key, None)
+        if 'updated_at' not in keys:
+            comic['updated_at'] = get_current_datetime()
+        self._changes.mark_comic(comic['id'], index='title' in keys)
+        if any(field in keys for field, _ in FIELD_WEIGHTS):
+            self._search_update(comic)
+        self._save(comics)
+        return _dumps({"success": True, "data": {"updated_at": comic.get('updated_at')}})
+
+    @writes
+    def patch_chapter(self, comic_id, vol, chap, patch):
+        """Sửa một phần chapter bằng JSON Patch, ví dụ [{"op": "replace", "path": "/reading_progress", "value": 12}].
+
+        Chỉ chapter này được ghi lại (cùng comic.json); nếu vol/chap đổi thì file cũ bị xóa.
+        Chỉ trả về updated_at mới, không gửi lại cả danh sách ảnh.
+        """
+        comics = self._load()
+        comic = self._find(comic_id)
+        if comic is None:
+            return _dumps({"success": False, "error": "Comic not found"})
+        i = self._find_chapter(comic, vol, chap)
+        if i is None:
+            return _dumps({"success": False, "error": "Chapter not found"})
+        c = comic['chapters'][i]
+        try:
+            keys = top_level_keys(patch)
+            patched = apply_patch(c, patch)
+        except PatchError as e:
+            return _dumps({"success": False, "error": str(e)})
+        new_key = (patched.get('vol', 0), patched.get('chap', 0))
+        old_file = c.link.get('file') if isinstance(c, LazyChapter) else None
+        old_file = old_file or f"vol_{c.get('vol', 0)}_chapter_{c.get('chap', 0)}.json"
+        # So theo tên file chứ không theo giá trị: vol 1 và 1.0 bằng nhau trong Python
+        # nhưng là hai file khác nhau
+        moved = f"vol_{new_key[0]}_chapter_{new_key[1]}.json" != old_file
+        if moved and self._find_chapter(comic, *new_key) not in (None, i):
+            return _dumps({"success": False, "error": "Chapter already exists"})
+        for key in keys:
+            if key in patched:
+                c[key] = patched[key]
+            else:
+                c.pop(key, None)
+        if 'updated_at' not in keys:
+            c['updated_at'] = get_current_datetime()
+        if moved:
+            # Chapter mang tên file mới; file cũ được xóa cùng lúc với lần ghi
+            self._chapters_changed(comic)
+            chapter_path = os.path.join(get_comic_folder(comic['id']), old_file)
+            if os.path.exists(chapter_path):
+                self._changes.remove_file(chapter_path)
+        self._changes.mark_chapter(comic['id'], *new_key)
+        self._save(comics)
+        return _dumps({"success": True, "data": {"updated_at": c.get('updated_at')}})
+
+    # --- BATCH ---
+    @writes(flush_first=True)
+    def apply_batch(self, ops, atomic=True):
+        """Thực hiện lần lượt nhiều thao tác sửa trong một lần khóa và một lần ghi đĩa.
+
+        ops là danh sách {"op": tên method ghi, "args": [...], "kwargs": {...}},
+        ví dụ {"op": "add_tag", "args": [3, "Isekai"]}. Kết quả của từng thao tác
+        nằm trong data.results theo đúng thứ tự. Nếu atomic và một thao tác lỗi thì
+        mọi thao tác trước đó của batch bị hủy và không có gì được ghi.
+        """
+        if not isinstance(ops, list):
+            return _dumps({"success": False, "error": "ops must be a list"})
+        if atomic and self._flush_pending() is not None:
+            # Để hủy được batch thì dữ liệu trên đĩa phải khớp với bộ nhớ trước khi bắt đầu
+            return _dumps({"success": False, "error": f"Cannot start batch: {self._write_error}"})
+        results = []
+        for i, op in enumerate(ops):
+            result = self._apply_op(op)
+            results.append(result)
+            if atomic and not result.get("success"):
+                self._rollback()
+                return _dumps({"success": False, "error": f"Operation {i} failed: {result.get('error')}",
+                               "data": {"results": results, "applied": 0}})
+        applied = sum(1 for r in results if r.get("success"))
+        return _dumps({"success": applied == len(results),
+                       "data": {"results": results, "applied": applied}})
+
+    def _apply_op(self, op):
+        """Chạy một thao tác của apply_batch, trả về kết quả của nó dưới dạng dict."""
+        if not isinstance(op, dict):
+            return {"success": False, "error": "Operation must be an object"}
+        name = op.get("op")
+        method = getattr(type(self), name, None) if isinstance(name, str) else None
+        if getattr(method, 'lock_mode', None) != 'write' or name == 'apply_batch':
+            return {"success": False, "error": f"Unknown operation: {name}"}
+        args = op.get("args", [])
+        kwargs = op.get("kwargs", {})
+        if not isinstance(args, list):
+            return {"success": False, "error": f"args of {name} must be a list"}
+        if not isinstance(kwargs, dict):
+            return {"success": False, "error": f"kwargs of {name} must be an object"}
+        try:
+            return codec.loads(getattr(self, name)(*args, **kwargs))
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def _rollback(self):
+        """Bỏ mọi thay đổi chưa ghi; lần _load sau đọc lại thư viện từ đĩa."""
+        with self._lock:
+            self._changes = ComicChanges()
+            self._comics = None
+            self._stamp = None
+
+    # --- METRICS ---
+    @reads(cache=False)
+    def get_metrics(self, reset=False):
+        """Số liệu của từng method: số lần gọi, thời gian (chia theo pha), byte đọc/ghi, số file mở.
+
+        Chỉ có khi ComicAPI được tạo với collect_metrics=True; reset=True thì xóa số liệu sau khi lấy.
+        Kèm theo số liệu của cache phản hồi nếu nó đang bật.
+        """
+        if self._metrics is None:
+            return _dumps({"success": False, "error": "Metrics are disabled"})
+        data = self._metrics.snapshot()
+        if self._responses is not None:
+            data['response_cache'] = self._responses.stats()
+        if reset:
+            self._metrics.reset()
+        return _dumps({"success": True, "data": data})
+
+    def _dump_metrics(self, path):
+        """Ghi số liệu metrics ra file JSON."""
+        if self._metrics is None:
+            return _dumps({"success": False, "error": "Metrics are disabled"})
+        try:
+            self._metrics.dump(path)
+        except OSError as e:
+            return _dumps({"success": False, "error": str(e)})
+        return _dumps({"success": True, "data": path})
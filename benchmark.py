@@ -0,0 +1,361 @@
+"""Benchmarks for the storage layer, ComicAPI and the Tk list view.
+
+Generates a synthetic comics/ tree (N comics x M chapters x K images, with
+Vietnamese descriptions and CJK alt names), then times load_comics,
+save_comics, every ComicAPI method family and TruyenManagermentApp.load_tree.
+Each case reports latency percentiles, the files it touched and the bytes it
+wrote; the results are written as JSON so runs can be compared.
+
+    python benchmark.py --comics 500 --chapters 20 --images 40 -o before.json
+    python benchmark.py --comics 500 --chapters 20 --images 40 -o after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import fsck
+import TruyenManagerment as tm
+from TruyenManagerment import ComicChanges, load_comics, save_comics, set_comics_dir
+
+GENRES = ['Action', 'Adventure', 'Comedy', 'Drama', 'Fantasy', 'Romance', 'Slice of Life',
+          'Yuri', 'Horror', 'Mystery', 'Isekai', 'Historical', 'Psychological', 'Wuxia']
+THEMES = ['Magic', 'School Life', 'Monsters', 'Reincarnation', 'Office Workers', 'Martial Arts']
+FORMATS = ['Long Strip', 'Full Color', 'Web Comic', 'Adaptation', '4-Koma']
+TAGS = ['Transformation/s', 'Former Hero/s', 'Demon Lord/s', 'Villainess', 'Time Travel',
+        'Overpowered MC', 'Slow Burn', 'Cultivation', 'Idol/s', 'Cooking']
+TYPES = ['Manga', 'Manhwa', 'Manhua']
+STATUSES = ['Ongoing', 'Completed', 'Hiatus']
+LANGUAGES = ['jp', 'kr', 'cn']
+WORDS = ['thiên', 'đường', 'ma', 'vương', 'cô', 'gái', 'thế', 'giới', 'yên', 'bình', 'hành', 'trình',
+         'dũng', 'giả', 'lâu', 'đài', 'phép', 'thuật', 'tình', 'yêu', 'học', 'viện', 'rồng', 'kiếm']
+CJK = '魔王城少女世界勇者恋愛学園竜剣物語天使月夜花火悪役令嬢異世界転生'
+
+
+def _sentence(rng, n):
+    return ' '.join(rng.choice(WORDS) for _ in range(n)).capitalize()
+
+
+def generate_library(root, comics=100, chapters=10, images=20, seed=1):
+    """Write a synthetic comics/ tree under root; returns the number of files written."""
+    rng = random.Random(seed)
+    library = []
+    for cid in range(1, comics + 1):
+        title = _sentence(rng, rng.randint(2, 5))
+        comic = {
+            'title': title,
+            'publication_year': rng.randint(1990, 2025),
+            'createtime': '2025-05-04T16:01:50Z',
+            'author': _sentence(rng, 2),
+            'mangadex_url': f'https://mangadex.org/title/{cid:08d}',
+            'pinned': False,
+            'favorites': rng.random() < 0.1,
+            'following': rng.random() < 0.3,
+            'status': rng.choice(STATUSES),
+            'alt_names': [
+                {'language': 'en', 'name': _sentence(rng, 3)},
+                {'language': rng.choice(LANGUAGES), 'name': ''.join(rng.sample(CJK, rng.randint(3, 8)))},
+            ],
+            'id': cid,
+            'chapters': [],
+            'type': rng.choice(TYPES),
+            'original_language': rng.choice(LANGUAGES),
+            'content_rating': rng.choice(['Safe', 'Suggestive']),
+            'star': round(rng.uniform(5, 10), 1),
+            'demographics': [rng.choice(['Shounen', 'Shoujo', 'Seinen', 'Josei'])],
+            'arts': [f'https://img.example/{cid}/art{i}.jpg' for i in range(rng.randint(0, 3))],
+            'genres': rng.sample(GENRES, rng.randint(1, 5)),
+            'themes': rng.sample(THEMES, rng.randint(0, 2)),
+            'formats': rng.sample(FORMATS, rng.randint(0, 2)),
+            'artists': [_sentence(rng, 2)],
+            'tags': rng.sample(TAGS, rng.randint(0, 6)),
+            'comments': [],
+            'description': _sentence(rng, rng.randint(20, 120)) + '.',
+            'updated_at': f'2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T12:00:00Z',
+            'latest_chapter_at': f'2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T12:00:00Z',
+        }
+        for n in range(1, chapters + 1):
+            comic['chapters'].append({
+                'chapter_name': _sentence(rng, 3),
+                'vol': (n - 1) // 10 + 1,
+                'chap': float(n),
+                'language': 'vi',
+                'reading_progress': 0,
+                'images': [f'https://img.example/{cid}/{n}/{i:03d}.jpg' for i in range(images)],
+                'comments': [],
+                'one_shot': False,
+                'created_at': '2025-07-12T20:08:02Z',
+                'updated_at': '2025-07-12T20:08:02Z',
+            })
+        library.append(comic)
+    set_comics_dir(os.path.join(root, 'comics'))
+    save_comics(library)
+    return comics * (chapters + 1) + 1
+
+
+# --- measuring ---
+def _snapshot(root):
+    files = {}
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files[path] = (st.st_mtime_ns, st.st_size)
+    return files
+
+
+def _io_written():
+    """Bytes this process has written so far (Linux), or None."""
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('wchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def measure(root, fn, repeat):
+    """Run fn repeat times; latency percentiles (ms), files touched and bytes written."""
+    before = _snapshot(root)
+    io_before = _io_written()
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        times.append((time.perf_counter() - start) * 1000.0)
+    io_after = _io_written()
+    after = _snapshot(root)
+    touched = [p for p in set(before) | set(after) if before.get(p) != after.get(p)]
+    if io_before is not None:
+        written = io_after - io_before
+    else:
+        written = sum(after[p][1] for p in touched if p in after)
+    times.sort()
+    return {
+        'runs': repeat,
+        'mean_ms': round(sum(times) / len(times), 3),
+        'p50_ms': round(_percentile(times, 50), 3),
+        'p90_ms': round(_percentile(times, 90), 3),
+        'p99_ms': round(_percentile(times, 99), 3),
+        'max_ms': round(times[-1], 3),
+        'files_touched': len(touched),
+        'bytes_written': written,
+    }
+
+
+# --- cases ---
+LIST_FAMILIES = [
+    ('alt_name', lambda i: {'language': 'vi', 'name': f'Tên khác {i}'}),
+    ('genre', lambda i: GENRES[i % len(GENRES)]),
+    ('theme', lambda i: THEMES[i % len(THEMES)]),
+    ('format', lambda i: FORMATS[i % len(FORMATS)]),
+    ('tag', lambda i: f'Tag {i}'),
+    ('artist', lambda i: f'Artist {i}'),
+    ('art', lambda i: f'https://img.example/art/{i}.jpg'),
+    ('comment', lambda i: {'author': 'bench', 'text': f'comment {i}', 'date': '2025-01-01'}),
+]
+
+
+def storage_cases(args):
+    comics = load_comics(lazy=False)
+    one = ComicChanges()
+    one.mark_comic(comics[0]['id'])
+    return [
+        ('storage.load_comics', lambda i: load_comics()),
+        ('storage.load_comics_eager', lambda i: load_comics(lazy=False)),
+        ('storage.load_comics_threads', lambda i: load_comics(workers=args.workers)),
+        ('storage.save_comics_one_comic', lambda i: save_comics(comics, one)),
+        ('storage.save_comics_full', lambda i: save_comics(comics)),
+        ('storage.fsck', lambda i: fsck.check_library(tm.COMICS_DIR, workers=args.workers)),
+    ]
+
+
+def api_cases(args, rng):
+    from api import ComicAPI
+    # The response cache would turn repeated reads into lookups; measure the real work
+    api = ComicAPI(write_behind=False, response_cache=0)
+    cached = ComicAPI(write_behind=False)
+    comics = json.loads(api.get_comics_page(limit=10 ** 9, fields=['id', 'chapter_count']))['data']['items']
+    ids = [c['id'] for c in comics]
+    pick = lambda i: ids[(i * 7919) % len(ids)]
+    added_comics = []
+    cases = [
+        ('api.get_comics', lambda i: api.get_comics()),
+        ('api.get_comics_cached', lambda i: cached.get_comics()),
+        ('api.get_comic', lambda i: api.get_comic(pick(i))),
+        ('api.get_comics_page', lambda i: api.get_comics_page(offset=(i * 50) % len(ids), limit=50)),
+        ('api.search', lambda i: api.search(rng.choice(WORDS) + ' ' + rng.choice(WORDS)[:2], 20, 0)),
+        ('api.search_cjk', lambda i: api.search(''.join(rng.sample(CJK, 2)), 20, 0)),
+        ('api.get_all_facets', lambda i: (api.get_all_genres(), api.get_all_themes(), api.get_all_formats(),
+                                          api.get_all_tags(), api.get_all_artists())),
+        ('api.get_taxonomy_counts', lambda i: api.get_taxonomy_counts('genres')),
+        ('api.filter_comics', lambda i: api.filter_comics({'status': 'Ongoing', 'genres': [GENRES[i % len(GENRES)]]})),
+        ('api.get_chapter_images', lambda i: api.get_chapter_images(pick(i), 1, 1.0, 0, 20)),
+        ('api.get_list_fields', lambda i: [getattr(api, f'get_{name}s')(pick(i)) for name, _ in LIST_FAMILIES]),
+        ('api.get_scalars', lambda i: (api.get_star(pick(i)), api.get_description(pick(i)),
+                                       api.get_demographics(pick(i)))),
+        ('api.set_scalars', lambda i: (api.set_star(pick(i), 5 + i % 5), api.set_description(pick(i), f'mô tả {i}'),
+                                       api.set_demographics(pick(i), ['Seinen']))),
+        ('api.edit_comic', lambda i: api.edit_comic(pick(i), {'status': STATUSES[i % 3]})),
+        ('api.add_chapter', lambda i: api.add_chapter(pick(i), {'vol': 999, 'chap': float(i), 'images': ['x'] * 10,
+                                                               'comments': [], 'reading_progress': 0})),
+        ('api.edit_chapter', lambda i: api.edit_chapter(pick(i), 999, float(i), {'vol': 999, 'chap': float(i),
+                                                                              'images': ['y'] * 10, 'comments': [],
+                                                                              'reading_progress': 1})),
+        ('api.patch_chapter_progress', lambda i: api.patch_chapter(pick(i), 999, float(i), [
+            {'op': 'replace', 'path': '/reading_progress', 'value': 2}])),
+        ('api.delete_chapter', lambda i: api.delete_chapter(pick(i), 999, float(i))),
+    ]
+    for name, value in LIST_FAMILIES:
+        cases.append((f'api.add_{name}', lambda i, name=name, value=value: getattr(api, f'add_{name}')(pick(i), value(i))))
+        cases.append((f'api.edit_{name}', lambda i, name=name, value=value: getattr(api, f'edit_{name}')(pick(i), 0, value(i + 1))))
+        cases.append((f'api.delete_{name}', lambda i, name=name: getattr(api, f'delete_{name}')(pick(i), 0)))
+
+    def add_comic(i):
+        result = json.loads(api.add_comic({'title': f'Bench {i}', 'genres': ['Action']}))
+        added_comics.append(result['data']['id'])
+
+    cases.append(('api.apply_batch_tag_20', lambda i: api.apply_batch(
+        [{'op': 'add_tag', 'args': [pick(i * 20 + k), f'Batch {i}']} for k in range(20)])))
+    cases.append(('api.add_comic', add_comic))
+    cases.append(('api.delete_comic', lambda i: api.delete_comic(added_comics[i]) if i < len(added_comics) else None))
+    return api, cases
+
+
+def tk_cases(args):
+    """load_tree cases, or a reason why the Tk app cannot be created here."""
+    try:
+        app = tm.TruyenManagermentApp()
+    except Exception as e:  # no display, no Tk, ...
+        return None, [], str(e).splitlines()[0]
+    app.withdraw()
+
+    def after_edit(i):
+        comic = app.comics[(i * 7919) % len(app.comics)]
+        comic['star'] = 5 + i % 5
+        app.load_tree()
+        app.update_idletasks()
+
+    return app, [
+        ('tk.load_tree', lambda i: (app.load_tree(), app.update_idletasks())),
+        ('tk.load_tree_after_edit', after_edit),
+        ('tk.scroll_page', lambda i: (app.view.yview('scroll', 1, 'pages'), app.update_idletasks())),
+    ], None
+
+
+def _git_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args):
+    work = tempfile.mkdtemp(prefix='comic-bench-')
+    cwd = os.getcwd()
+    results = {}
+    skipped = {}
+    try:
+        os.chdir(work)
+        start = time.perf_counter()
+        files = generate_library(work, args.comics, args.chapters, args.images, args.seed)
+        generate_ms = (time.perf_counter() - start) * 1000.0
+        rng = random.Random(args.seed)
+
+        def run_cases(cases):
+            for name, fn in cases:
+                if args.only and not any(part in name for part in args.only):
+                    continue
+                results[name] = measure(work, fn, args.repeat)
+                print(f"{name:32s} p50 {results[name]['p50_ms']:9.3f} ms  p99 {results[name]['p99_ms']:9.3f} ms  "
+                      f"files {results[name]['files_touched']:5d}  bytes {results[name]['bytes_written']}")
+
+        run_cases(storage_cases(args))
+        api, cases = api_cases(args, rng)
+        run_cases(cases)
+        api._close()
+        if args.tk:
+            app, cases, reason = tk_cases(args)
+            if reason is not None:
+                skipped['tk'] = reason
+                print(f"tk cases skipped: {reason}")
+            else:
+                run_cases(cases)
+                app.destroy()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work, ignore_errors=True)
+    return {
+        'meta': {
+            'version': _git_version(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'library': {'comics': args.comics, 'chapters': args.chapters, 'images': args.images,
+                        'seed': args.seed, 'files': files, 'generate_ms': round(generate_ms, 1)},
+            'repeat': args.repeat,
+            'skipped': skipped,
+        },
+        'results': results,
+    }
+
+
+def compare(old, new, threshold):
+    """Print p50 changes between two result files; returns the names that got slower."""
+    slower = []
+    for name, result in new['results'].items():
+        before = old['results'].get(name)
+        if before is None or not before['p50_ms']:
+            continue
+        ratio = result['p50_ms'] / before['p50_ms']
+        mark = ''
+        if ratio > 1 + threshold:
+            mark = '  SLOWER'
+            slower.append(name)
+        elif ratio < 1 - threshold:
+            mark = '  faster'
+        print(f"{name:32s} {before['p50_ms']:9.3f} -> {result['p50_ms']:9.3f} ms  x{ratio:5.2f}{mark}")
+    return slower
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the comic store, ComicAPI and the Tk list view.")
+    parser.add_argument('--comics', type=int, default=200)
+    parser.add_argument('--chapters', type=int, default=10)
+    parser.add_argument('--images', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=20, help="runs per case")
+    parser.add_argument('--workers', type=int, default=8, help="threads for storage.load_comics_threads")
+    parser.add_argument('--only', nargs='*', help="run only cases whose name contains one of these")
+    parser.add_argument('--no-tk', dest='tk', action='store_false', help="skip the Tk load_tree cases")
+    parser.add_argument('-o', '--output', default='benchmark-results.json')
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="relative p50 change reported as a regression")
+    args = parser.parse_args()
+    report = run(args)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            slower = compare(json.load(f), report, args.threshold)
+        sys.exit(1 if slower else 0)
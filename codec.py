@@ -0,0 +1,105 @@
+"""JSON encoding and decoding for the store and the API, using the fastest library available.
+
+orjson is used when it is installed, then ujson (for decoding only: it walks
+dict subclasses such as LazyChapter without going through their methods),
+then the standard json module. Everything else in the project goes through
+these functions, so the choice is made in one place.
+
+Files in comics/ are written indented (indent=4) by default, exactly as
+before. With compact storage (set_compact_storage(True), or the environment
+variable COMIC_COMPACT_STORAGE=1) they are written without indentation,
+which is faster and takes less space; both forms are read the same way.
+"""
+import json
+import os
+
+# COMIC_JSON_BACKEND=json (or ujson) skips the faster libraries, e.g. to rule them out
+_FORCED = os.environ.get('COMIC_JSON_BACKEND', '').lower()
+
+orjson = ujson = None
+if _FORCED not in ('json', 'ujson'):
+    try:
+        import orjson
+    except ImportError:
+        pass
+if _FORCED != 'json':
+    try:
+        import ujson
+    except ImportError:
+        pass
+
+if orjson is not None:
+    BACKEND = 'orjson'
+elif ujson is not None:
+    BACKEND = 'ujson'
+else:
+    BACKEND = 'json'
+
+COMPACT_STORAGE = os.environ.get('COMIC_COMPACT_STORAGE', '').lower() in ('1', 'true', 'yes')
+
+
+def set_compact_storage(compact):
+    """Write comics/ files without indentation from now on (True) or indented (False)."""
+    global COMPACT_STORAGE
+    COMPACT_STORAGE = bool(compact)
+
+
+def _orjson_default(obj):
+    # Subclasses are passed through to here so that a LazyChapter is read via
+    # its own items() (which loads it) instead of orjson's raw dict access
+    if isinstance(obj, dict):
+        return dict(obj.items())
+    if isinstance(obj, (list, tuple)):
+        return list(obj)
+    if isinstance(obj, str):
+        return str(obj)
+    if isinstance(obj, bool):
+        return bool(obj)
+    if isinstance(obj, int):
+        return int(obj)
+    if isinstance(obj, float):
+        return float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_SUBCLASS
+
+    def dumps_bytes(obj):
+        """Compact UTF-8 JSON as bytes."""
+        return orjson.dumps(obj, default=_orjson_default, option=_ORJSON_OPTIONS)
+
+    def dumps(obj):
+        """Compact JSON as str (for API responses)."""
+        return orjson.dumps(obj, default=_orjson_default, option=_ORJSON_OPTIONS).decode('utf-8')
+
+    loads = orjson.loads
+else:
+    def dumps_bytes(obj):
+        """Compact UTF-8 JSON as bytes."""
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def dumps(obj):
+        """Compact JSON as str (for API responses)."""
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+    if ujson is not None:
+        def loads(data):
+            return ujson.loads(data)
+    else:
+        def loads(data):
+            return json.loads(data)
+
+
+def encode_document(obj):
+    """Bytes of a comics/ file: indented like before, or compact in compact storage mode."""
+    if COMPACT_STORAGE:
+        return dumps_bytes(obj)
+    return json.dumps(obj, indent=4, ensure_ascii=False).encode('utf-8')
+
+
+def read_file(path):
+    """Return (decoded JSON, size in bytes) of a file."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    return loads(data), len(data)
@@ -0,0 +1,280 @@
+"""Check a comics/ folder tree for files and links that disagree, and optionally repair them.
+
+Every comic folder is checked on a thread pool against its comic.json
+links and comic-index.json. Problems found:
+
+    missing_index           comic-index.json is missing or unreadable
+    interrupted_save        a save's journal was left behind (load_comics would recover it)
+    duplicate_index_entry   an id is listed more than once in comic-index.json
+    index_without_comic     an indexed id has no folder or no comic.json
+    unindexed_comic         a folder with a comic.json that comic-index.json does not list
+    stale_index_title       the title in comic-index.json differs from comic.json
+    orphan_folder           a folder without comic.json
+    unreadable_file         comic.json or a chapter file is not valid JSON
+    id_mismatch             comic.json's id is not its folder name (reported only)
+    missing_chapter_file    a chapter link points to a file that does not exist
+    link_mismatch           a link's vol/chap differs from the chapter file's own
+    duplicate_chapter       two links (or a link and a stray file) for the same chapter
+    non_canonical_key       a chapter is not stored as vol_<int>_chapter_<float>.json
+    orphan_chapter_file     a chapter file no link points to
+
+With --repair, dead links and duplicate index entries are dropped, titles
+and links follow the chapter files, and chapters are renamed to their
+canonical key. Unindexed comics are added to the index. All of these are
+written as one StoreTransaction. Orphaned and duplicate files are not
+deleted: they are moved out of the library into a separate folder.
+
+    python fsck.py                      # report on ./comics
+    python fsck.py comics --repair      # repair, orphans go to comics-orphans/
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import codec
+from storage import StoreTransaction, recover_store, JOURNAL_NAME
+
+INDEX_NAME = 'comic-index.json'
+META_NAME = 'comic.json'
+_CHAPTER_FILE_RE = re.compile(r'^vol_(.+)_chapter_(.+)\.json$')
+
+
+def canonical_key(vol, chap):
+    """(vol, chap) as the app writes them: vol an int when it is a whole number, chap a float."""
+    try:
+        number = float(vol)
+        vol = int(number) if number.is_integer() else number
+    except (TypeError, ValueError):
+        pass
+    try:
+        chap = float(chap)
+    except (TypeError, ValueError):
+        pass
+    return vol, chap
+
+
+def _types(key):
+    # 1 == 1.0 == True in Python, but '1', 1 and 1.0 are different keys to the app
+    return tuple((type(part), part) for part in key)
+
+
+def chapter_file_name(vol, chap):
+    return f"vol_{vol}_chapter_{chap}.json"
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return codec.loads(f.read())
+
+
+class Plan:
+    """The repairs of one comic folder (or of the whole library, once merged)."""
+
+    def __init__(self):
+        self.writes = {}   # path -> JSON document
+        self.removes = []  # paths deleted by the transaction
+        self.orphans = []  # paths moved out of the library
+
+    def merge(self, other):
+        self.writes.update(other.writes)
+        self.removes.extend(other.removes)
+        self.orphans.extend(other.orphans)
+
+    def __bool__(self):
+        return bool(self.writes or self.removes or self.orphans)
+
+
+def _issue(kind, comic=None, path=None, detail=''):
+    return {'kind': kind, 'comic': comic, 'path': path, 'detail': detail}
+
+
+def check_comic(root, name):
+    """Check one comic folder. Returns (issues, plan, comic.json or None)."""
+    folder = os.path.join(root, name)
+    issues = []
+    plan = Plan()
+    files = set()
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith('.json'):
+                files.add(entry.name)
+    if META_NAME not in files:
+        issues.append(_issue('orphan_folder', name, folder, f"{len(files)} JSON files, no {META_NAME}"))
+        plan.orphans.append(folder)
+        return issues, plan, None
+    meta_path = os.path.join(folder, META_NAME)
+    try:
+        meta = _read(meta_path)
+    except ValueError as e:
+        issues.append(_issue('unreadable_file', name, meta_path, str(e)))
+        return issues, plan, None
+    if str(meta.get('id')) != name:
+        issues.append(_issue('id_mismatch', name, meta_path, f"id is {meta.get('id')!r}"))
+
+    links = []
+    keys = {}     # canonical (vol, chap) -> file name it is stored in
+    kept = set()  # files that stay in the library
+    changed = False
+    for link in meta.get('chapters', []):
+        fname = link.get('file')
+        path = os.path.join(folder, fname or '')
+        if not fname or fname not in files:
+            issues.append(_issue('missing_chapter_file', name, path, f"link vol={link.get('vol')!r} chap={link.get('chap')!r}"))
+            changed = True
+            continue
+        try:
+            body = _read(path)
+        except ValueError as e:
+            issues.append(_issue('unreadable_file', name, path, str(e)))
+            links.append(link)
+            kept.add(fname)
+            continue
+        # The chapter file is what the app reads once the chapter is opened
+        vol, chap = body.get('vol', link.get('vol')), body.get('chap', link.get('chap'))
+        if (vol, chap) != (link.get('vol'), link.get('chap')):
+            issues.append(_issue('link_mismatch', name, path,
+                                 f"link says vol={link.get('vol')!r} chap={link.get('chap')!r}, file says vol={vol!r} chap={chap!r}"))
+            changed = True
+        key = canonical_key(vol, chap)
+        if key in keys:
+            issues.append(_issue('duplicate_chapter', name, path, f"same chapter as {keys[key]}"))
+            if fname not in kept:
+                plan.orphans.append(path)
+            changed = True
+            continue
+        canonical = chapter_file_name(*key)
+        if fname != canonical or _types(key) != _types((vol, chap)):
+            if fname != canonical:
+                detail = f"should be {canonical}"
+            else:
+                detail = f"vol={vol!r} chap={chap!r} should be vol={key[0]!r} chap={key[1]!r}"
+            issues.append(_issue('non_canonical_key', name, path, detail))
+            if canonical != fname and canonical in files and canonical not in kept:
+                # A stray copy already has the canonical name: set it aside first
+                issues.append(_issue('duplicate_chapter', name, os.path.join(folder, canonical), f"same chapter as {fname}"))
+                plan.orphans.append(os.path.join(folder, canonical))
+            body = dict(body, vol=key[0], chap=key[1])
+            plan.writes[os.path.join(folder, canonical)] = body
+            if fname != canonical:
+                plan.removes.append(path)
+            changed = True
+        keys[key] = canonical
+        kept.add(canonical)
+        links.append({'vol': key[0], 'chap': key[1], 'file': canonical})
+
+    renamed = {os.path.basename(p) for p in plan.removes}
+    set_aside = {os.path.basename(p) for p in plan.orphans}
+    for fname in sorted(files - kept - renamed - set_aside - {META_NAME}):
+        path = os.path.join(folder, fname)
+        match = _CHAPTER_FILE_RE.match(fname)
+        key = canonical_key(*match.groups()) if match else None
+        if key in keys:
+            issues.append(_issue('duplicate_chapter', name, path, f"same chapter as {keys[key]}"))
+        else:
+            issues.append(_issue('orphan_chapter_file', name, path))
+        plan.orphans.append(path)
+
+    if changed:
+        plan.writes[meta_path] = dict(meta, chapters=links)
+    return issues, plan, meta
+
+
+def check_library(root, workers=8):
+    """Check every comic folder in parallel. Returns (issues, plan)."""
+    issues = []
+    plan = Plan()
+    if os.path.exists(os.path.join(root, JOURNAL_NAME)):
+        issues.append(_issue('interrupted_save', path=os.path.join(root, JOURNAL_NAME)))
+    index_path = os.path.join(root, INDEX_NAME)
+    try:
+        index = _read(index_path)
+    except (OSError, ValueError) as e:
+        issues.append(_issue('missing_index', path=index_path, detail=str(e)))
+        index = []
+    with os.scandir(root) as entries:
+        names = sorted(e.name for e in entries if e.is_dir() and not e.name.startswith('.'))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda name: check_comic(root, name), names))
+    metas = {}
+    for name, (comic_issues, comic_plan, meta) in zip(names, results):
+        issues.extend(comic_issues)
+        plan.merge(comic_plan)
+        if meta is not None:
+            metas[name] = meta
+
+    new_index = []
+    seen = set()
+    index_changed = False
+    for entry in index:
+        key = str(entry.get('id'))
+        if key in seen:
+            issues.append(_issue('duplicate_index_entry', key, index_path))
+            index_changed = True
+            continue
+        seen.add(key)
+        meta = metas.get(key)
+        if meta is None:
+            issues.append(_issue('index_without_comic', key, os.path.join(root, key)))
+            index_changed = True
+            continue
+        title = meta.get('title', '')
+        if entry.get('title') != title:
+            issues.append(_issue('stale_index_title', key, index_path, f"{entry.get('title')!r} != {title!r}"))
+            entry = dict(entry, title=title)
+            index_changed = True
+        new_index.append(entry)
+    for key in sorted(set(metas) - seen, key=lambda k: (not k.isdigit(), int(k) if k.isdigit() else 0, k)):
+        issues.append(_issue('unindexed_comic', key, os.path.join(root, key)))
+        new_index.append({'id': metas[key].get('id'), 'title': metas[key].get('title', '')})
+        index_changed = True
+    if index_changed:
+        plan.writes[index_path] = new_index
+    return issues, plan
+
+
+def repair(root, plan, orphans_dir):
+    """Apply a plan: move orphans out of the library, then write the rest as one transaction."""
+    recover_store(root)
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    for path in plan.orphans:
+        target = os.path.join(orphans_dir, stamp, os.path.relpath(path, root))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(path, target)
+    tx = StoreTransaction(root)
+    for path, document in plan.writes.items():
+        tx.write_json(path, document)
+    for path in plan.removes:
+        tx.remove(path)
+    tx.commit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check (and repair) a comics/ folder tree.")
+    parser.add_argument('comics_dir', nargs='?', default='comics')
+    parser.add_argument('--repair', action='store_true', help="fix what was found")
+    parser.add_argument('--orphans-dir', help="where repaired orphans go (default: <comics_dir>-orphans)")
+    parser.add_argument('--workers', type=int, default=8, help="folders checked in parallel")
+    parser.add_argument('--json', action='store_true', help="print the issues as JSON")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    issues, plan = check_library(args.comics_dir, workers=args.workers)
+    elapsed = time.perf_counter() - start
+    if args.json:
+        print(json.dumps(issues, indent=4, ensure_ascii=False))
+    else:
+        for issue in issues:
+            comic = f"[{issue['comic']}] " if issue['comic'] is not None else ''
+            detail = f" ({issue['detail']})" if issue['detail'] else ''
+            print(f"{issue['kind']:<22} {comic}{issue['path'] or ''}{detail}")
+        print(f"{len(issues)} issues in {elapsed:.2f}s")
+    if args.repair and plan:
+        orphans_dir = args.orphans_dir or os.path.normpath(args.comics_dir) + '-orphans'
+        repair(args.comics_dir, plan, orphans_dir)
+        if not args.json:
+            print(f"Repaired: {len(plan.writes)} files written, {len(plan.removes)} renamed away, "
+                  f"{len(plan.orphans)} moved to {orphans_dir}")
+    raise SystemExit(1 if issues else 0)
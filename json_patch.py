@@ -0,0 +1,156 @@
+"""JSON Patch (RFC 6902) for comic and chapter records.
+
+A patch is a list of operations such as
+    {"op": "replace", "path": "/reading_progress", "value": 12}
+with the operations add, remove, replace, move, copy and test, and paths
+written as JSON Pointers (RFC 6901). Every operation must address a member
+of the record (a path below the root), so a patch can only change parts
+of it; the members it reaches are what top_level_keys() returns.
+
+apply_patch() works on copies of the touched members and returns the
+patched record. When any operation fails, including a "test" that does not
+match the current values, it raises PatchError and the original record is
+left untouched.
+"""
+import copy
+
+OPERATIONS = ('add', 'remove', 'replace', 'move', 'copy', 'test')
+
+
+class PatchError(ValueError):
+    """The patch is malformed, or cannot be applied to the current record."""
+
+
+def parse_pointer(path):
+    """Split a JSON Pointer into its reference tokens ("/a~1b/0" -> ["a/b", "0"])."""
+    if not isinstance(path, str) or (path and not path.startswith('/')):
+        raise PatchError(f"Invalid path: {path!r}")
+    if not path:
+        return []
+    return [token.replace('~1', '/').replace('~0', '~') for token in path[1:].split('/')]
+
+
+def _paths(op):
+    if not isinstance(op, dict) or op.get('op') not in OPERATIONS:
+        raise PatchError(f"Invalid operation: {op!r}")
+    paths = [op.get('path')]
+    if op['op'] in ('move', 'copy'):
+        paths.append(op.get('from'))
+    if op['op'] in ('add', 'replace', 'test') and 'value' not in op:
+        raise PatchError(f"Operation {op['op']} needs a value")
+    return paths
+
+
+def top_level_keys(ops):
+    """Names of the record members the patch reads or changes, in order of first use."""
+    if not isinstance(ops, list):
+        raise PatchError("A patch must be a list of operations")
+    keys = {}
+    for op in ops:
+        for path in _paths(op):
+            tokens = parse_pointer(path)
+            if not tokens:
+                raise PatchError("Patching the whole record is not allowed")
+            keys[tokens[0]] = None
+    return list(keys)
+
+
+def _index(container, token, adding=False):
+    if adding and token == '-':
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith('0')):
+        raise PatchError(f"Invalid array index: {token!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not adding):
+        raise PatchError(f"Array index out of range: {token}")
+    return index
+
+
+def _parent(doc, tokens, path):
+    """The container holding the last token of path."""
+    node = doc
+    for token in tokens[:-1]:
+        if isinstance(node, dict) and token in node:
+            node = node[token]
+        elif isinstance(node, list):
+            node = node[_index(node, token)]
+        else:
+            raise PatchError(f"Path not found: {path}")
+    if not isinstance(node, (dict, list)):
+        raise PatchError(f"Path not found: {path}")
+    return node
+
+
+def _get(doc, path):
+    tokens = parse_pointer(path)
+    parent = _parent(doc, tokens, path)
+    if isinstance(parent, list):
+        return parent[_index(parent, tokens[-1])]
+    if tokens[-1] not in parent:
+        raise PatchError(f"Path not found: {path}")
+    return parent[tokens[-1]]
+
+
+def _add(doc, path, value):
+    tokens = parse_pointer(path)
+    parent = _parent(doc, tokens, path)
+    if isinstance(parent, list):
+        parent.insert(_index(parent, tokens[-1], adding=True), value)
+    else:
+        parent[tokens[-1]] = value
+
+
+def _remove(doc, path):
+    tokens = parse_pointer(path)
+    parent = _parent(doc, tokens, path)
+    if isinstance(parent, list):
+        return parent.pop(_index(parent, tokens[-1]))
+    if tokens[-1] not in parent:
+        raise PatchError(f"Path not found: {path}")
+    return parent.pop(tokens[-1])
+
+
+def _equal(a, b):
+    """JSON equality: unlike in Python, true is not 1."""
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return a == b
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_equal(a[k], b[k]) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(_equal(x, y) for x, y in zip(a, b))
+    return type(a) is type(b) and a == b
+
+
+def _apply(doc, op):
+    kind = op['op']
+    path = op['path']
+    if kind == 'add':
+        _add(doc, path, copy.deepcopy(op['value']))
+    elif kind == 'remove':
+        _remove(doc, path)
+    elif kind == 'replace':
+        _remove(doc, path)
+        _add(doc, path, copy.deepcopy(op['value']))
+    elif kind == 'move':
+        source = op['from']
+        if path != source and path.startswith(source + '/'):
+            raise PatchError(f"Cannot move {source} into itself")
+        _add(doc, path, _remove(doc, source))
+    elif kind == 'copy':
+        _add(doc, path, copy.deepcopy(_get(doc, op['from'])))
+    elif not _equal(_get(doc, path), op['value']):
+        raise PatchError(f"Test failed at {path}")
+
+
+def apply_patch(record, ops):
+    """Return a patched copy of record; members the patch does not reach are shared, not copied."""
+    keys = top_level_keys(ops)
+    result = dict(record.items())
+    for key in keys:
+        if key in result:
+            result[key] = copy.deepcopy(result[key])
+    for op in ops:
+        _apply(result, op)
+    return result
@@ -0,0 +1,161 @@
+"""Opt-in call metrics for ComicAPI.
+
+When a ComicAPI is created with metrics enabled, every API call runs inside
+Metrics.call(), which records its wall time split into phases (waiting for
+the lock, loading, mutating, saving, serializing) and the bytes and files the
+storage code read and wrote on its behalf. Storage code reports I/O through
+count_read() / count_write(); these do nothing unless a call is being recorded
+on the current thread, so the hooks cost next to nothing when metrics are off.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# 'mutate' is whatever is left of a call's time after the other phases
+PHASES = ('wait', 'load', 'mutate', 'save', 'serialize')
+
+_local = threading.local()
+
+
+class _Record:
+    """Counters of one call in progress."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.files_opened = 0
+        self.phase = None
+
+
+def _current():
+    return getattr(_local, 'record', None)
+
+
+def recording():
+    """True if I/O on this thread is being attributed to a call."""
+    return _current() is not None
+
+
+def count_read(nbytes, files=1):
+    record = _current()
+    if record is not None:
+        with record.lock:
+            record.bytes_read += nbytes
+            record.files_opened += files
+
+
+def count_write(nbytes, files=1):
+    record = _current()
+    if record is not None:
+        with record.lock:
+            record.bytes_written += nbytes
+            record.files_opened += files
+
+
+@contextmanager
+def phase(name):
+    """Time a block as one phase of the current call; nested phases count once."""
+    record = _current()
+    if record is None or record.phase is not None:
+        yield
+        return
+    record.phase = name
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000.0
+        record.phase = None
+        with record.lock:
+            record.phases[name] += elapsed
+
+
+def propagate(fn):
+    """Wrap fn so that, run on a worker thread, its I/O counts towards the caller's call."""
+    record = _current()
+    if record is None:
+        return fn
+
+    def wrapper(*args, **kwargs):
+        previous = _current()
+        _local.record = record
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.record = previous
+    return wrapper
+
+
+class Metrics:
+    """Per-method totals of the calls recorded so far."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.started = time.time()
+
+    @contextmanager
+    def call(self, name):
+        if _current() is not None:
+            # A call made from inside another one is part of the outer call
+            yield
+            return
+        record = _Record()
+        _local.record = record
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000.0
+            _local.record = None
+            self._add(name, record, elapsed, failed)
+
+    def _add(self, name, record, elapsed, failed):
+        other = sum(ms for key, ms in record.phases.items() if key != 'mutate')
+        record.phases['mutate'] = max(0.0, elapsed - other)
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = {
+                    'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                    'phases_ms': dict.fromkeys(PHASES, 0.0),
+                    'bytes_read': 0, 'bytes_written': 0, 'files_opened': 0,
+                }
+            stats['calls'] += 1
+            stats['errors'] += failed
+            stats['total_ms'] += elapsed
+            stats['max_ms'] = max(stats['max_ms'], elapsed)
+            for key, ms in record.phases.items():
+                stats['phases_ms'][key] += ms
+            stats['bytes_read'] += record.bytes_read
+            stats['bytes_written'] += record.bytes_written
+            stats['files_opened'] += record.files_opened
+
+    def snapshot(self):
+        """A JSON-ready copy of the totals, with the mean time per call added."""
+        with self._lock:
+            methods = {}
+            for name, stats in self._stats.items():
+                stats = dict(stats, phases_ms={k: round(v, 3) for k, v in stats['phases_ms'].items()})
+                stats['total_ms'] = round(stats['total_ms'], 3)
+                stats['max_ms'] = round(stats['max_ms'], 3)
+                stats['mean_ms'] = round(stats['total_ms'] / stats['calls'], 3)
+                methods[name] = stats
+        return {'since': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.started)),
+                'methods': methods}
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            self.started = time.time()
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=4, ensure_ascii=False)
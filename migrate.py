@@ -0,0 +1,356 @@
+"""Migrate the legacy single-file comics.json ({"comics": [...]}) to the comics/<id>/ layout.
+
+The source is parsed one comic at a time, so memory use is about the size of
+the largest comic, not of the file. Comics are written by a pool of worker
+threads in the same layout save_comics() produces, with chapter keys made
+canonical (see fsck.canonical_key). Each comic is read back after it is
+written and must match the SHA-256 of the source comic before it counts as
+migrated. comic-index.json is written last, in source order.
+
+Progress is kept in <comics_dir>/.migration.json. An interrupted run
+resumes where it stopped: comics already verified are skipped. The file is
+removed once every comic is migrated.
+
+    python migrate.py comics.json comics            # migrate (or resume)
+    python migrate.py comics.json comics --verify   # compare comics/ with the source
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import codec
+from fsck import canonical_key, chapter_file_name
+from storage import StoreTransaction, TMP_SUFFIX, sync_files
+from TruyenManagerment import load_comic, set_comics_dir
+
+STATE_NAME = '.migration.json'
+INDEX_NAME = 'comic-index.json'
+# Save progress at most this often (seconds)
+STATE_INTERVAL = 2.0
+
+_WS = re.compile(r'\s*')
+_decoder = json.JSONDecoder()
+
+
+class MigrationError(Exception):
+    pass
+
+
+class _Reader:
+    """Reads JSON values one by one from a file, keeping only the unread part in memory."""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        data = self.f.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """The next non-blank character ('' at the end of the file)."""
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or not self._fill():
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise MigrationError(f"Expected {char!r} in the source, found {self.peek()!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                end = None
+            # A value that ends with the buffer (e.g. a number) may go on in the next chunk
+            if end is not None and (end < len(self.buf) or self.eof):
+                self.pos = end
+                return value
+            # Read until the unread part doubles, so retrying stays linear overall
+            target = 2 * (len(self.buf) - self.pos) + self.chunk_size
+            while len(self.buf) - self.pos < target and self._fill():
+                pass
+
+
+def _array(reader):
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.pos += 1
+        return
+    while True:
+        yield reader.value()
+        char = reader.peek()
+        reader.pos += 1
+        if char == ']':
+            return
+        if char != ',':
+            raise MigrationError(f"Expected ',' or ']' in the comics array, found {char!r}")
+
+
+def iter_comics(path, chunk_size=1 << 20):
+    """Yield the comics of a legacy comics.json (or of a bare JSON array) one by one."""
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = _Reader(f, chunk_size)
+        if reader.peek() == '[':
+            yield from _array(reader)
+            return
+        reader.expect('{')
+        if reader.peek() == '}':
+            return
+        while True:
+            key = reader.value()
+            reader.expect(':')
+            if key == 'comics':
+                yield from _array(reader)
+            else:
+                # Other top-level fields are not part of the library
+                reader.value()
+            char = reader.peek()
+            reader.pos += 1
+            if char == '}':
+                return
+            if char != ',':
+                raise MigrationError(f"Expected ',' or '}}' in the source, found {char!r}")
+
+
+def normalize_comic(comic):
+    """The comic as it will read back from comics/: canonical chapter keys, chapters sorted."""
+    chapters = []
+    seen = set()
+    for chapter in comic.get('chapters') or []:
+        vol, chap = canonical_key(chapter.get('vol', 0), chapter.get('chap', 0))
+        if (vol, chap) in seen:
+            raise MigrationError(f"Comic {comic.get('id')} has chapter vol={vol} chap={chap} twice")
+        seen.add((vol, chap))
+        chapters.append(dict(chapter, vol=vol, chap=chap))
+    chapters.sort(key=lambda c: (float(c['vol']), float(c['chap'])))
+    return dict(comic, chapters=chapters)
+
+
+def checksum(comic):
+    return hashlib.sha256(codec.dumps_bytes(comic)).hexdigest()
+
+
+def _write_file(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def write_comic(root, comic):
+    """Write one normalized comic as comics/<id>/ (comic.json last), replacing a partial earlier attempt.
+
+    The files are on disk when this returns, so the comic can be recorded as migrated.
+    """
+    folder = os.path.join(root, str(comic['id']))
+    if os.path.exists(folder):
+        shutil.rmtree(folder)
+    os.makedirs(folder)
+    written = []
+    links = []
+    for chapter in comic['chapters']:
+        fname = chapter_file_name(chapter['vol'], chapter['chap'])
+        written.append(_write_file(os.path.join(folder, fname), codec.encode_document(chapter)))
+        links.append({'vol': chapter['vol'], 'chap': chapter['chap'], 'file': fname})
+    # comic.json appears whole or not at all: a folder without it is only an orphan
+    meta = os.path.join(folder, 'comic.json')
+    os.replace(_write_file(meta + TMP_SUFFIX, codec.encode_document(dict(comic, chapters=links))), meta)
+    sync_files(written + [meta], [root])
+
+
+def _migrate_one(root, comic, expected):
+    write_comic(root, comic)
+    loaded = load_comic(comic['id'], lazy=False)
+    if loaded is None or checksum(loaded) != expected:
+        raise MigrationError(f"Comic {comic['id']} does not read back as written")
+
+
+def _source_info(source):
+    st = os.stat(source)
+    return {'path': os.path.abspath(source), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def _save_state(path, state):
+    # Comics are synced by write_comic() before they are listed here; a lost
+    # state file only means they are migrated again
+    with open(path + TMP_SUFFIX, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(path + TMP_SUFFIX, path)
+
+
+def _load_state(root, source, force):
+    path = os.path.join(root, STATE_NAME)
+    info = _source_info(source)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('source') != info:
+            raise MigrationError(f"{source} changed since the interrupted migration; "
+                                 f"delete {path} to start over")
+        return path, state
+    if os.path.exists(os.path.join(root, INDEX_NAME)) and not force:
+        raise MigrationError(f"{root} already holds a library; use --force to migrate into it")
+    return path, {'source': info, 'done': {}}
+
+
+def migrate(source, comics_dir='comics', workers=4, force=False, progress=None):
+    """Migrate (or resume migrating) source into comics_dir.
+
+    Returns {'migrated', 'skipped', 'failed': [(id, error)]}; progress(done count) is
+    called as comics finish.
+    """
+    os.makedirs(comics_dir, exist_ok=True)
+    # load_comic() reads from the folder set here; put the caller's back afterwards
+    previous = set_comics_dir(comics_dir)
+    try:
+        return _migrate(source, comics_dir, workers, force, progress)
+    finally:
+        set_comics_dir(previous)
+
+
+def _migrate(source, comics_dir, workers, force, progress):
+    state_path, state = _load_state(comics_dir, source, force)
+    done = state['done']
+    index = []
+    seen = set()
+    failed = []
+    migrated = skipped = 0
+    last_save = time.monotonic()
+
+    def collect(futures):
+        nonlocal migrated, last_save
+        for future in futures:
+            key, sha = inflight.pop(future)
+            try:
+                future.result()
+            except Exception as e:
+                failed.append((key, str(e)))
+                continue
+            done[key] = sha
+            migrated += 1
+        if time.monotonic() - last_save >= STATE_INTERVAL:
+            _save_state(state_path, state)
+            last_save = time.monotonic()
+        if progress is not None:
+            progress(migrated + skipped)
+
+    inflight = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for comic in iter_comics(source):
+            comic_id = comic.get('id') if isinstance(comic, dict) else None
+            key = str(comic_id)
+            if not isinstance(comic_id, int) or isinstance(comic_id, bool):
+                failed.append((key, "Comic has no integer id"))
+                continue
+            if key in seen:
+                failed.append((key, "Duplicate comic id"))
+                continue
+            seen.add(key)
+            try:
+                comic = normalize_comic(comic)
+            except MigrationError as e:
+                failed.append((key, str(e)))
+                continue
+            index.append({'id': comic_id, 'title': comic.get('title', '')})
+            sha = checksum(comic)
+            if done.get(key) == sha:
+                skipped += 1
+                continue
+            # Keep only a few comics in memory at once
+            while len(inflight) >= workers * 2:
+                finished, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                collect(finished)
+            inflight[executor.submit(_migrate_one, comics_dir, comic, sha)] = (key, sha)
+        while inflight:
+            finished, _ = wait(inflight, return_when=FIRST_COMPLETED)
+            collect(finished)
+
+    failed_ids = {key for key, _ in failed}
+    tx = StoreTransaction(comics_dir)
+    tx.write_json(os.path.join(comics_dir, INDEX_NAME), [e for e in index if str(e['id']) not in failed_ids])
+    tx.commit()
+    if failed:
+        _save_state(state_path, state)
+    elif os.path.exists(state_path):
+        os.remove(state_path)
+    return {'migrated': migrated, 'skipped': skipped, 'failed': failed}
+
+
+def verify(source, comics_dir='comics', workers=4):
+    """Compare every comic of source with comics_dir; returns [(id, problem)]."""
+    previous = set_comics_dir(comics_dir)
+    try:
+        return _verify(source, workers)
+    finally:
+        set_comics_dir(previous)
+
+
+def _verify(source, workers):
+    def check(item):
+        key, sha = item
+        if sha is None:
+            return key, "cannot be migrated"
+        loaded = load_comic(key, lazy=False)
+        if loaded is None:
+            return key, "missing"
+        if checksum(loaded) != sha:
+            return key, "differs from the source"
+        return None
+
+    def expected():
+        for comic in iter_comics(source):
+            try:
+                yield str(comic.get('id')), checksum(normalize_comic(comic))
+            except MigrationError:
+                yield str(comic.get('id')), None
+
+    problems = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(check, expected()):
+            if result is not None:
+                problems.append(result)
+    return problems
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Migrate a legacy comics.json to comics/<id>/ folders.")
+    parser.add_argument('source', nargs='?', default='comics.json')
+    parser.add_argument('comics_dir', nargs='?', default='comics')
+    parser.add_argument('--workers', type=int, default=4, help="comics written in parallel")
+    parser.add_argument('--force', action='store_true', help="migrate into a folder that already has a library")
+    parser.add_argument('--verify', action='store_true', help="only compare comics_dir with the source")
+    args = parser.parse_args()
+    try:
+        if args.verify:
+            problems = verify(args.source, args.comics_dir, workers=args.workers)
+            for comic_id, problem in problems:
+                print(f"[{comic_id}] {problem}")
+            print(f"{len(problems)} comics differ from {args.source}")
+            raise SystemExit(1 if problems else 0)
+        result = migrate(args.source, args.comics_dir, workers=args.workers, force=args.force,
+                         progress=lambda n: print(f"\r{n} comics", end='', flush=True))
+    except (MigrationError, ValueError) as e:
+        raise SystemExit(f"Error: {e}")
+    print(f"\rMigrated {result['migrated']} comics, {result['skipped']} already done")
+    for comic_id, error in result['failed']:
+        print(f"[{comic_id}] failed: {error}")
+    raise SystemExit(1 if result['failed'] else 0)
@@ -0,0 +1,364 @@
+"""Single-file packed library format, usable as a ComicAPI backend.
+
+Layout of a .pack file:
+
+    header   b'CPAK' | version u32 | table offset u64 | table length u64
+    records  u32 length + compact UTF-8 JSON, one per comic.json / chapter
+    table    one more record: the comic index and, per comic, the offset and
+             length of its metadata record and of each chapter record
+
+A chapter is read with a single seek + read, without opening any other file.
+Saves append only the changed records and a new table, then point the header
+at it, so a one-field edit writes a few hundred bytes. Records nothing refers
+to any more are dropped by compact(), which also runs automatically when they
+take up more than half of the file.
+
+    ComicAPI(backend=PackedBackend('library.pack'))
+
+    python packed_store.py import comics library.pack   # folders -> pack
+    python packed_store.py export library.pack comics   # pack -> folders
+"""
+import argparse
+import os
+import struct
+import threading
+
+import codec
+import metrics
+from TruyenManagerment import LazyChapter, load_comics, save_comics, set_comics_dir
+
+MAGIC = b'CPAK'
+VERSION = 1
+HEADER = struct.Struct('<4sIQQ')
+LENGTH = struct.Struct('<I')
+TMP_SUFFIX = '.tmp'
+# Below this size a file is never compacted automatically
+MIN_COMPACT_SIZE = 64 * 1024
+
+
+def _encode(obj):
+    return codec.dumps_bytes(obj)
+
+
+def _chapter_sort_key(c):
+    return (float(c.get('vol', 0)), float(c.get('chap', 0)))
+
+
+class PackedChapter(LazyChapter):
+    """A LazyChapter whose body is a record in a .pack file."""
+
+    def __init__(self, backend, link):
+        super().__init__(None, link)
+        self.backend = backend
+
+    def _read_body(self):
+        return self.backend.read_chapter(self)
+
+
+class PackedTransaction:
+    """The records and table of one save; written by PackedBackend on commit()."""
+
+    def __init__(self, backend, comics, records, table, rewrite):
+        self.backend = backend
+        self.comics = comics      # comics whose PackedChapter links may need updating
+        self.records = records    # new record payloads, referred to by position
+        self.table = table        # entries use 'offset'/'length' or 'record'
+        self.rewrite = rewrite    # write a fresh file instead of appending
+
+    def commit(self):
+        self.backend._commit(self)
+
+
+class PackedBackend:
+    """Stores the whole library in one packed file (see the module docstring)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._file = None
+        self._table = None
+
+    # --- reading ---
+    def _open(self):
+        if self._file is None:
+            if not os.path.exists(self.path):
+                self._write_file(self.path, {'index': [], 'comics': {}}, [])
+            self._file = open(self.path, 'r+b')
+            magic, version, table_offset, table_length = HEADER.unpack(self._file.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{self.path} is not a packed comic library")
+            self._table = codec.loads(self._read_raw(table_offset, table_length))
+        return self._file
+
+    def _read_raw(self, offset, length):
+        self._file.seek(offset)
+        data = self._file.read(length)
+        metrics.count_read(len(data), files=0)
+        if len(data) != length:
+            raise ValueError(f"Truncated record at offset {offset} in {self.path}")
+        return data
+
+    def read_record(self, offset, length):
+        with self._lock:
+            self._open()
+            return codec.loads(self._read_raw(offset, length))
+
+    def read_chapter(self, chapter):
+        # The link is read under the lock because compaction moves records
+        with self._lock:
+            self._open()
+            return codec.loads(self._read_raw(chapter.link['offset'], chapter.link['length']))
+
+    def get_chapter_entry(self, comic_id, vol, chap):
+        """Return the table entry (offset, length, ...) of one chapter, or None."""
+        with self._lock:
+            self._open()
+            entry = self._table['comics'].get(str(comic_id))
+            for link in (entry or {}).get('chapters', []):
+                if link['vol'] == vol and link['chap'] == chap:
+                    return dict(link)
+        return None
+
+    def load_comics(self, lazy=True, workers=None):
+        """Same contract as TruyenManagerment.load_comics(); workers is ignored."""
+        with self._lock:
+            self._open()
+            comics = []
+            for entry in self._table['index']:
+                comic_entry = self._table['comics'][str(entry['id'])]
+                comic = codec.loads(self._read_raw(*comic_entry['meta']))
+                if lazy:
+                    chapters = [PackedChapter(self, link) for link in comic_entry['chapters']]
+                else:
+                    chapters = [codec.loads(self._read_raw(link['offset'], link['length']))
+                                for link in comic_entry['chapters']]
+                chapters.sort(key=_chapter_sort_key)
+                comic['chapters'] = chapters
+                comics.append(comic)
+            return comics
+
+    def stamp(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    # --- writing ---
+    def prepare_save(self, comics, changes=None):
+        """Build the transaction for save_comics(); only marked comics get new records."""
+        with self._lock:
+            self._open()
+            old_comics = self._table['comics']
+            records = []
+            table = {'index': [], 'comics': {}}
+
+            def add_record(obj):
+                records.append(_encode(obj))
+                return len(records) - 1
+
+            for comic in comics:
+                key = str(comic['id'])
+                table['index'].append({'id': comic['id'], 'title': comic.get('title', '')})
+                old = old_comics.get(key)
+                if old is not None and changes is not None and not changes.has_comic(comic['id']):
+                    table['comics'][key] = old
+                    continue
+                old_links = {(link['vol'], link['chap']): link for link in (old or {}).get('chapters', [])}
+                chapter_entries = []
+                for chap in comic.get('chapters', []):
+                    if isinstance(chap, PackedChapter) and chap.backend is self and not chap.loaded:
+                        chapter_entries.append(dict(chap.link))
+                        continue
+                    vol = chap.get('vol', 0)
+                    chnum = chap.get('chap', 0)
+                    old_link = old_links.get((vol, chnum))
+                    if old_link is not None and changes is not None and not changes.has_chapter(comic['id'], vol, chnum):
+                        chapter_entries.append(dict(old_link))
+                    else:
+                        chapter_entries.append({'vol': vol, 'chap': chnum, 'record': add_record(chap)})
+                meta = dict(comic)
+                meta['chapters'] = []
+                table['comics'][key] = {'meta': {'record': add_record(meta)}, 'chapters': chapter_entries}
+            return PackedTransaction(self, list(comics), records, table, rewrite=changes is None)
+
+    def save_comics(self, comics, changes=None):
+        self.prepare_save(comics, changes).commit()
+
+    def _live_size(self, table):
+        size = 0
+        for entry in table['comics'].values():
+            meta = entry['meta']
+            if isinstance(meta, list):
+                size += meta[1] + LENGTH.size
+            for link in entry['chapters']:
+                size += link['length'] + LENGTH.size
+        return size
+
+    def _commit(self, tx):
+        with self._lock:
+            f = self._open()
+            if tx.rewrite:
+                self._rewrite(tx)
+                return
+            f.seek(0, os.SEEK_END)
+            start = end = f.tell()
+            offsets = []
+            for payload in tx.records:
+                f.write(LENGTH.pack(len(payload)))
+                offsets.append((end + LENGTH.size, len(payload)))
+                f.write(payload)
+                end += LENGTH.size + len(payload)
+            table = self._resolve(tx.table, offsets)
+            payload = _encode(table)
+            f.write(LENGTH.pack(len(payload)))
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+            # Commit point: the header now points at the new table
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, VERSION, end + LENGTH.size, len(payload)))
+            f.flush()
+            os.fsync(f.fileno())
+            metrics.count_write(end - start + LENGTH.size + len(payload) + HEADER.size, files=0)
+            self._table = table
+            size = end + LENGTH.size + len(payload)
+            if size > MIN_COMPACT_SIZE and size - self._live_size(table) > size // 2:
+                self.compact(tx.comics)
+
+    def _resolve(self, table, offsets):
+        """Replace 'record' positions in a table with the offsets they were written at."""
+        resolved = {'index': table['index'], 'comics': {}}
+        for key, entry in table['comics'].items():
+            meta = entry['meta']
+            if isinstance(meta, dict):
+                meta = list(offsets[meta['record']])
+            chapters = []
+            for link in entry['chapters']:
+                if 'record' in link:
+                    offset, length = offsets[link['record']]
+                    link = {'vol': link['vol'], 'chap': link['chap'], 'offset': offset, 'length': length}
+                chapters.append(link)
+            resolved['comics'][key] = {'meta': meta, 'chapters': chapters}
+        return resolved
+
+    def _rewrite(self, tx):
+        """Write a fresh file holding exactly the records of tx (plus referenced old ones)."""
+        records = list(tx.records)
+        table = {'index': tx.table['index'], 'comics': {}}
+        for key, entry in tx.table['comics'].items():
+            meta = entry['meta']
+            if isinstance(meta, list):
+                records.append(self._read_raw(*meta))
+                meta = {'record': len(records) - 1}
+            chapters = []
+            for link in entry['chapters']:
+                if 'record' not in link:
+                    records.append(self._read_raw(link['offset'], link['length']))
+                    link = {'vol': link['vol'], 'chap': link['chap'], 'record': len(records) - 1}
+                chapters.append(link)
+            table['comics'][key] = {'meta': meta, 'chapters': chapters}
+        self._file.close()
+        self._file = None
+        table = self._write_file(self.path, table, records)
+        self._open()
+        self._relink(tx.comics, table)
+
+    def _write_file(self, path, table, records):
+        """Write a complete pack file atomically (temp file + rename); returns its table."""
+        offsets = []
+        end = HEADER.size
+        with open(path + TMP_SUFFIX, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+            for payload in records:
+                f.write(LENGTH.pack(len(payload)))
+                f.write(payload)
+                offsets.append((end + LENGTH.size, len(payload)))
+                end += LENGTH.size + len(payload)
+            table = self._resolve(table, offsets)
+            payload = _encode(table)
+            f.write(LENGTH.pack(len(payload)))
+            f.write(payload)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, VERSION, end + LENGTH.size, len(payload)))
+            f.flush()
+            os.fsync(f.fileno())
+            metrics.count_write(end + LENGTH.size + len(payload))
+        os.replace(path + TMP_SUFFIX, path)
+        return table
+
+    def _relink(self, comics, table):
+        """Point unread PackedChapters at the offsets their records have after a rewrite."""
+        for comic in comics:
+            entry = table['comics'].get(str(comic['id']))
+            if entry is None:
+                continue
+            links = {(link['vol'], link['chap']): link for link in entry['chapters']}
+            for chap in comic.get('chapters', []):
+                if isinstance(chap, PackedChapter) and chap.backend is self:
+                    link = links.get((chap.link['vol'], chap.link['chap']))
+                    if link is not None:
+                        chap.link = dict(link)
+
+    def compact(self, comics=()):
+        """Rewrite the file without unreferenced records.
+
+        comics is the in-memory library (if any) whose unread chapters must be
+        re-pointed at the moved records.
+        """
+        with self._lock:
+            self._open()
+            tx = PackedTransaction(self, list(comics), [], self._table, rewrite=True)
+            self._rewrite(tx)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def import_directory(comics_dir, pack_path):
+    """Pack a comics/<id>/ folder tree into a single file."""
+    previous = set_comics_dir(comics_dir)
+    try:
+        comics = load_comics(lazy=False)
+    finally:
+        set_comics_dir(previous)
+    if os.path.exists(pack_path):
+        os.remove(pack_path)
+    backend = PackedBackend(pack_path)
+    backend.save_comics(comics)
+    backend.close()
+    return len(comics)
+
+
+def export_directory(pack_path, comics_dir):
+    """Unpack a packed library into the comics/<id>/ folder layout."""
+    backend = PackedBackend(pack_path)
+    comics = backend.load_comics(lazy=False)
+    backend.close()
+    previous = set_comics_dir(comics_dir)
+    try:
+        save_comics(comics)
+    finally:
+        set_comics_dir(previous)
+    return len(comics)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert between comics/ folders and a packed library file.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('import', help="pack a comics/ folder tree into one file")
+    p.add_argument('comics_dir')
+    p.add_argument('pack_path')
+    p = sub.add_parser('export', help="unpack a library file into comics/ folders")
+    p.add_argument('pack_path')
+    p.add_argument('comics_dir')
+    args = parser.parse_args()
+    if args.command == 'import':
+        count = import_directory(args.comics_dir, args.pack_path)
+        print(f"Packed {count} comics into {args.pack_path}")
+    else:
+        count = export_directory(args.pack_path, args.comics_dir)
+        print(f"Exported {count} comics to {args.comics_dir}")
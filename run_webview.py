@@ -1,4 +1,5 @@
 import webview
+import json
 import os
 from api import ComicAPI
 
@@ -11,7 +12,7 @@ if not os.path.exists(HTML_PATH):
 api = ComicAPI()
 
 # Tạo cửa sổ pywebview
-webview.create_window(
+window = webview.create_window(
     'Truyen Managerment',
     HTML_PATH,
     js_api=api,
@@ -21,4 +22,15 @@ webview.create_window(
     confirm_close=True
 )
 
-webview.start()
\ No newline at end of file
+def notify_frontend(comic_ids, index_changed):
+    """Báo cho giao diện khi comics/ bị sửa từ bên ngoài: sự kiện 'comics-changed' trên window."""
+    detail = json.dumps({"comic_ids": comic_ids, "index_changed": index_changed})
+    window.evaluate_js(f"window.dispatchEvent(new CustomEvent('comics-changed', {{detail: {detail}}}))")
+
+# Chỉ nạp lại những comic bị sửa (đồng bộ từ máy khác, sửa tay JSON, ...)
+api._watch(notify_frontend)
+
+webview.start()
+
+# Lưu nốt các thay đổi đang chờ ghi trước khi thoát
+api._close()
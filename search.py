@@ -0,0 +1,164 @@
+"""Full-text search over titles, alt names, authors, artists and descriptions.
+
+Text is folded before it is indexed or searched: lower case, Vietnamese and
+other Latin diacritics removed, đ -> d, so "thien" finds "Thiên". Latin text
+is split into words and the last word of a query also matches as a prefix
+("mag" finds "Magic"). Chinese, Japanese and Korean text has no spaces, so
+it is indexed as single characters plus overlapping character pairs, and a
+CJK query matches wherever its pairs all occur.
+"""
+import bisect
+import re
+import unicodedata
+
+# How much a match in each field counts towards a comic's score
+FIELD_WEIGHTS = (
+    ('title', 5.0),
+    ('alt_names', 3.0),
+    ('author', 3.0),
+    ('artists', 2.0),
+    ('description', 1.0),
+)
+# Extra score when the whole query is the title, or the start of it
+EXACT_TITLE_BONUS = 10.0
+TITLE_PREFIX_BONUS = 5.0
+# A word matched only as a prefix counts this much of a full match
+PREFIX_FACTOR = 0.8
+
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+_CJK_RE = re.compile(f'[{_CJK}]')
+_TOKEN_RE = re.compile(f'[{_CJK}]+|(?:(?![{_CJK}])[^\\W_])+')
+_MARKS_RE = re.compile('[\u0300-\u036f]')
+
+
+def fold(text):
+    """Lower-case text and strip Latin diacritics; CJK characters are kept as they are."""
+    text = str(text).replace('đ', 'd').replace('Đ', 'D')
+    text = _MARKS_RE.sub('', unicodedata.normalize('NFD', text))
+    return unicodedata.normalize('NFC', text).casefold()
+
+
+def _cjk_terms(run, query=False):
+    if len(run) == 1:
+        return [run]
+    pairs = [run[i:i + 2] for i in range(len(run) - 1)]
+    # Indexed text also gets single characters so one-character queries match
+    return pairs if query else list(run) + pairs
+
+
+def tokenize(text, query=False):
+    """Split text into index terms (see the module docstring)."""
+    terms = []
+    for run in _TOKEN_RE.findall(fold(text)):
+        if _CJK_RE.match(run):
+            terms.extend(_cjk_terms(run, query))
+        else:
+            terms.append(run)
+    return terms
+
+
+def _field_texts(comic, field):
+    value = comic.get(field)
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list):
+        texts = []
+        for item in value:
+            if isinstance(item, dict):
+                item = item.get('name')
+            if item:
+                texts.append(str(item))
+        return texts
+    return [str(value)]
+
+
+class SearchIndex:
+    """Inverted index term -> {comic id: score}, updated one comic at a time."""
+
+    def __init__(self, comics=()):
+        self._postings = {}
+        self._terms_of = {}  # comic id -> its terms, to unindex it later
+        self._titles = {}    # comic id -> folded title, for title bonuses and ties
+        self._sorted = None  # sorted terms for prefix lookups, rebuilt when needed
+        for comic in comics:
+            self.add_comic(comic)
+
+    def add_comic(self, comic):
+        key = str(comic['id'])
+        scores = {}
+        for field, weight in FIELD_WEIGHTS:
+            terms = set()
+            for text in _field_texts(comic, field):
+                terms.update(tokenize(text))
+            for term in terms:
+                scores[term] = scores.get(term, 0.0) + weight
+        for term, score in scores.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._sorted = None
+            postings[key] = score
+        self._terms_of[key] = list(scores)
+        self._titles[key] = fold(comic.get('title') or '')
+
+    def remove_comic(self, comic_id):
+        key = str(comic_id)
+        for term in self._terms_of.pop(key, ()):
+            postings = self._postings[term]
+            del postings[key]
+            if not postings:
+                del self._postings[term]
+                self._sorted = None
+        self._titles.pop(key, None)
+
+    def update_comic(self, comic):
+        self.remove_comic(comic['id'])
+        self.add_comic(comic)
+
+    def _prefix_matches(self, prefix):
+        if self._sorted is None:
+            self._sorted = sorted(self._postings)
+        i = bisect.bisect_left(self._sorted, prefix)
+        while i < len(self._sorted) and self._sorted[i].startswith(prefix):
+            yield self._sorted[i]
+            i += 1
+
+    def _term_scores(self, term, prefix):
+        """comic id -> score for one query term."""
+        scores = dict(self._postings.get(term, {}))
+        if prefix:
+            for other in self._prefix_matches(term):
+                if other == term:
+                    continue
+                for key, score in self._postings[other].items():
+                    score *= PREFIX_FACTOR
+                    if score > scores.get(key, 0.0):
+                        scores[key] = score
+        return scores
+
+    def search(self, query):
+        """Return [(comic id, score)] of comics matching every query term, best first."""
+        terms = tokenize(query, query=True)
+        if not terms:
+            return []
+        results = None
+        for term in dict.fromkeys(terms):
+            # Only the last word may be unfinished, so only it matches as a prefix
+            prefix = term == terms[-1] and not _CJK_RE.match(term)
+            scores = self._term_scores(term, prefix)
+            if results is None:
+                results = scores
+            else:
+                results = {key: results[key] + score for key, score in scores.items() if key in results}
+            if not results:
+                return []
+        folded = ' '.join(_TOKEN_RE.findall(fold(query)))
+        for key in results:
+            title = ' '.join(_TOKEN_RE.findall(self._titles[key]))
+            if title == folded:
+                results[key] += EXACT_TITLE_BONUS
+            elif title.startswith(folded):
+                results[key] += TITLE_PREFIX_BONUS
+        return sorted(results.items(), key=lambda item: (-item[1], self._titles[item[0]], item[0]))
@@ -0,0 +1,396 @@
+"""SQLite storage engine for the library, usable as a ComicAPI backend.
+
+Comics, chapters, chapter images, alt names and the list fields (genres,
+themes, formats, tags, artists, arts, demographics, comments) live in their
+own tables, so a save only touches the rows of the comics and chapters marked
+in ComicChanges, in one SQLite transaction, and filters such as "all Ongoing
+Yuri manhua" are indexed queries (find_comic_ids) instead of full scans.
+
+Every row keeps the JSON of the fields that are not split out, so a library
+loads back exactly as it was saved, key order included.
+
+    ComicAPI(backend=SQLiteBackend('library.db'))
+
+    python sqlite_store.py import comics library.db   # folders -> database
+    python sqlite_store.py export library.db comics   # database -> folders
+"""
+import argparse
+import os
+import sqlite3
+import threading
+
+import codec
+import metrics
+from TruyenManagerment import LazyChapter, load_comics, save_comics, set_comics_dir
+
+# Scalar fields copied into their own indexed columns of the comics table
+SCALAR_COLUMNS = ('title', 'status', 'type', 'original_language', 'content_rating', 'star', 'updated_at')
+# List fields stored one item per row in comic_lists
+LIST_FIELDS = ('genres', 'themes', 'formats', 'tags', 'artists', 'arts', 'demographics', 'comments')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS library_meta (key TEXT PRIMARY KEY, value INTEGER);
+INSERT OR IGNORE INTO library_meta VALUES ('generation', 0);
+CREATE TABLE IF NOT EXISTS comics (
+    id INTEGER PRIMARY KEY, position INTEGER,
+    title TEXT, status TEXT, type TEXT, original_language TEXT,
+    content_rating TEXT, star REAL, updated_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS comics_position ON comics(position);
+CREATE INDEX IF NOT EXISTS comics_status_type ON comics(status, type);
+CREATE INDEX IF NOT EXISTS comics_language ON comics(original_language);
+CREATE INDEX IF NOT EXISTS comics_rating ON comics(content_rating);
+CREATE TABLE IF NOT EXISTS comic_lists (
+    comic_id INTEGER NOT NULL REFERENCES comics(id) ON DELETE CASCADE,
+    field TEXT NOT NULL, position INTEGER NOT NULL,
+    value, is_json INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS comic_lists_comic ON comic_lists(comic_id, field, position);
+CREATE INDEX IF NOT EXISTS comic_lists_value ON comic_lists(field, value, comic_id);
+CREATE TABLE IF NOT EXISTS alt_names (
+    comic_id INTEGER NOT NULL REFERENCES comics(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL, language TEXT, name TEXT, data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS alt_names_comic ON alt_names(comic_id, position);
+CREATE INDEX IF NOT EXISTS alt_names_name ON alt_names(name);
+CREATE TABLE IF NOT EXISTS chapters (
+    id INTEGER PRIMARY KEY,
+    comic_id INTEGER NOT NULL REFERENCES comics(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL, vol, chap, data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chapters_comic ON chapters(comic_id, vol, chap);
+CREATE TABLE IF NOT EXISTS chapter_images (
+    chapter_id INTEGER NOT NULL REFERENCES chapters(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL, url TEXT,
+    PRIMARY KEY (chapter_id, position)
+);
+'''
+
+
+def _encode(obj):
+    return codec.dumps(obj)
+
+
+def _list_value(item):
+    """(value, is_json) for one list item: strings are stored as they are."""
+    if isinstance(item, str):
+        return item, 0
+    return _encode(item), 1
+
+
+def _chapter_sort_key(c):
+    return (float(c.get('vol', 0)), float(c.get('chap', 0)))
+
+
+def _chapter_row(chap):
+    """(data json, image urls) for a chapter; 'images' keeps its place as []."""
+    data = dict(chap.items())
+    images = data.get('images')
+    if isinstance(images, list):
+        data['images'] = []
+    else:
+        images = None
+    return _encode(data), images
+
+
+class SQLiteChapter(LazyChapter):
+    """A LazyChapter whose body is a row of the chapters table."""
+
+    def __init__(self, backend, link):
+        super().__init__(None, link)
+        self.backend = backend
+
+    def _read_body(self):
+        return self.backend.read_chapter(self.link['id'])
+
+    def read_images(self, start, count):
+        if self.loaded:
+            return super().read_images(start, count)
+        return self.backend.read_chapter_images(self.link['id'], start, count)
+
+
+class SQLiteTransaction:
+    """Rows of one save, captured at prepare time and written on commit()."""
+
+    def __init__(self, backend, comics, order):
+        self.backend = backend
+        self.comics = comics  # per changed comic: rows to write
+        self.order = order    # [(id, position)] when the comic list itself changed
+
+    def commit(self):
+        self.backend._commit(self)
+
+
+class SQLiteBackend:
+    """Stores the library in a SQLite database (see the module docstring)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # --- reading ---
+    def stamp(self):
+        with self._lock:
+            return self._connect().execute(
+                "SELECT value FROM library_meta WHERE key = 'generation'").fetchone()[0]
+
+    def read_chapter(self, chapter_id):
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute('SELECT data FROM chapters WHERE id = ?', (chapter_id,)).fetchone()
+            if row is None:
+                raise KeyError(f"Chapter row {chapter_id} no longer exists")
+            metrics.count_read(len(row[0]), files=0)
+            chapter = codec.loads(row[0])
+            if isinstance(chapter.get('images'), list):
+                chapter['images'] = [url for (url,) in conn.execute(
+                    'SELECT url FROM chapter_images WHERE chapter_id = ? ORDER BY position', (chapter_id,))]
+            return chapter
+
+    def read_chapter_images(self, chapter_id, start, count):
+        """(total, urls) for images start..start + count of a chapter, read by position."""
+        with self._lock:
+            conn = self._connect()
+            total = conn.execute('SELECT COUNT(*) FROM chapter_images WHERE chapter_id = ?',
+                                 (chapter_id,)).fetchone()[0]
+            images = [url for (url,) in conn.execute(
+                'SELECT url FROM chapter_images WHERE chapter_id = ? AND position >= ? AND position < ? '
+                'ORDER BY position', (chapter_id, start, start + count))]
+            return total, images
+
+    def load_comics(self, lazy=True, workers=None):
+        """Same contract as TruyenManagerment.load_comics(); workers is ignored."""
+        with self._lock:
+            conn = self._connect()
+            comics = []
+            by_id = {}
+            for comic_id, data in conn.execute('SELECT id, data FROM comics ORDER BY position'):
+                comic = codec.loads(data)
+                comic['chapters'] = []
+                by_id[comic_id] = comic
+                comics.append(comic)
+            for comic_id, field, value, is_json in conn.execute(
+                    'SELECT comic_id, field, value, is_json FROM comic_lists ORDER BY comic_id, field, position'):
+                # Split-out lists are stored as [] in data and filled from their rows
+                comic = by_id.get(comic_id)
+                if comic is not None:
+                    comic[field].append(codec.loads(value) if is_json else value)
+            for comic_id, data in conn.execute('SELECT comic_id, data FROM alt_names ORDER BY comic_id, position'):
+                comic = by_id.get(comic_id)
+                if comic is not None:
+                    comic['alt_names'].append(codec.loads(data))
+            for chapter_id, comic_id, vol, chap in conn.execute(
+                    'SELECT id, comic_id, vol, chap FROM chapters ORDER BY comic_id, position'):
+                comic = by_id.get(comic_id)
+                if comic is None:
+                    continue
+                link = {'vol': vol, 'chap': chap, 'id': chapter_id}
+                chapter = SQLiteChapter(self, link)
+                comic['chapters'].append(chapter.load() if not lazy else chapter)
+            for comic in comics:
+                comic['chapters'].sort(key=_chapter_sort_key)
+            return comics
+
+    def find_comic_ids(self, filters):
+        """Ids (in library order) of comics matching every filter.
+
+        Scalar filters (status, type, original_language, content_rating, title)
+        must be equal; list filters (genres, tags, ...) must contain every given value.
+        """
+        where = []
+        params = []
+        for field, wanted in filters.items():
+            if field in SCALAR_COLUMNS:
+                where.append(f'{field} = ?')
+                params.append(wanted)
+            elif field in LIST_FIELDS:
+                for value in ([wanted] if isinstance(wanted, str) else wanted):
+                    value, is_json = _list_value(value)
+                    where.append('id IN (SELECT comic_id FROM comic_lists '
+                                 'WHERE field = ? AND value = ? AND is_json = ?)')
+                    params.extend((field, value, is_json))
+            else:
+                raise ValueError(f"Cannot filter on {field!r}")
+        sql = 'SELECT id FROM comics'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY position'
+        with self._lock:
+            return [comic_id for (comic_id,) in self._connect().execute(sql, params)]
+
+    # --- writing ---
+    def _comic_rows(self, comic, position, changes):
+        data = {}
+        lists = []
+        alt_names = []
+        for key, value in comic.items():
+            if key == 'chapters':
+                data[key] = []
+            elif key in LIST_FIELDS and isinstance(value, list):
+                data[key] = []
+                for i, item in enumerate(value):
+                    lists.append((key, i) + _list_value(item))
+            elif key == 'alt_names' and isinstance(value, list):
+                data[key] = []
+                for i, an in enumerate(value):
+                    fields = an if isinstance(an, dict) else {}
+                    alt_names.append((i, fields.get('language'), fields.get('name'), _encode(an)))
+            else:
+                data[key] = value
+        chapters = []
+        for i, chap in enumerate(comic.get('chapters', [])):
+            if isinstance(chap, SQLiteChapter) and chap.backend is self and not chap.loaded:
+                chapters.append(('keep', i, chap.link['id']))
+                continue
+            vol = chap.get('vol', 0)
+            chnum = chap.get('chap', 0)
+            if changes is not None and not changes.has_chapter(comic['id'], vol, chnum):
+                # Keep the stored row; the chapter is only encoded if there is none
+                chapters.append(('keep_key', i, vol, chnum, chap))
+            else:
+                chapters.append(('write', i, vol, chnum) + _chapter_row(chap))
+        scalars = tuple(comic.get(column) for column in SCALAR_COLUMNS)
+        return (comic['id'], position, scalars, _encode(data), lists, alt_names, chapters)
+
+    def prepare_save(self, comics, changes=None):
+        """Build the transaction for save_comics(); only marked comics are written."""
+        rows = [self._comic_rows(comic, position, changes)
+                for position, comic in enumerate(comics)
+                if changes is None or changes.has_comic(comic['id'])]
+        order = None
+        if changes is None or changes.index:
+            order = [(comic['id'], position) for position, comic in enumerate(comics)]
+        return SQLiteTransaction(self, rows, order)
+
+    def save_comics(self, comics, changes=None):
+        self.prepare_save(comics, changes).commit()
+
+    def _insert_chapter(self, conn, comic_id, position, vol, chap, data, images):
+        cur = conn.execute('INSERT INTO chapters (comic_id, position, vol, chap, data) VALUES (?, ?, ?, ?, ?)',
+                           (comic_id, position, vol, chap, data))
+        if metrics.recording():
+            metrics.count_write(len(data) + sum(len(url) for url in images or ()), files=0)
+        if images:
+            conn.executemany('INSERT INTO chapter_images (chapter_id, position, url) VALUES (?, ?, ?)',
+                             [(cur.lastrowid, i, url) for i, url in enumerate(images)])
+        return cur.lastrowid
+
+    def _write_comic(self, conn, comic_id, position, scalars, data, lists, alt_names, chapters):
+        columns = ', '.join(SCALAR_COLUMNS)
+        updates = ', '.join(f'{c} = excluded.{c}' for c in SCALAR_COLUMNS + ('position', 'data'))
+        conn.execute(f'INSERT INTO comics (id, position, {columns}, data) '
+                     f'VALUES (?, ?, {", ".join("?" * len(SCALAR_COLUMNS))}, ?) '
+                     f'ON CONFLICT(id) DO UPDATE SET {updates}',
+                     (comic_id, position) + scalars + (data,))
+        metrics.count_write(len(data), files=0)
+        conn.execute('DELETE FROM comic_lists WHERE comic_id = ?', (comic_id,))
+        conn.executemany('INSERT INTO comic_lists (comic_id, field, position, value, is_json) VALUES (?, ?, ?, ?, ?)',
+                         [(comic_id,) + row for row in lists])
+        conn.execute('DELETE FROM alt_names WHERE comic_id = ?', (comic_id,))
+        conn.executemany('INSERT INTO alt_names (comic_id, position, language, name, data) VALUES (?, ?, ?, ?, ?)',
+                         [(comic_id,) + row for row in alt_names])
+        existing = {}
+        for chapter_id, vol, chap in conn.execute('SELECT id, vol, chap FROM chapters WHERE comic_id = ?', (comic_id,)):
+            existing.setdefault((vol, chap), []).append(chapter_id)
+        kept = set()
+        for op in chapters:
+            if op[0] == 'keep':
+                _, position, chapter_id = op
+                conn.execute('UPDATE chapters SET position = ? WHERE id = ?', (position, chapter_id))
+                kept.add(chapter_id)
+                continue
+            _, position, vol, chap = op[:4]
+            candidates = [i for i in existing.get((vol, chap), []) if i not in kept]
+            if op[0] == 'keep_key' and candidates:
+                conn.execute('UPDATE chapters SET position = ? WHERE id = ?', (position, candidates[0]))
+                kept.add(candidates[0])
+                continue
+            if op[0] == 'keep_key':
+                data, images = _chapter_row(op[4])
+            else:
+                data, images = op[4], op[5]
+            kept.add(self._insert_chapter(conn, comic_id, position, vol, chap, data, images))
+        stale = [(i,) for ids in existing.values() for i in ids if i not in kept]
+        conn.executemany('DELETE FROM chapters WHERE id = ?', stale)
+
+    def _commit(self, tx):
+        with self._lock:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for rows in tx.comics:
+                    self._write_comic(conn, *rows)
+                if tx.order is not None:
+                    ids = {comic_id for comic_id, _ in tx.order}
+                    stale = [(i,) for (i,) in conn.execute('SELECT id FROM comics') if i not in ids]
+                    conn.executemany('DELETE FROM comics WHERE id = ?', stale)
+                    conn.executemany('UPDATE comics SET position = ? WHERE id = ?',
+                                     [(position, comic_id) for comic_id, position in tx.order])
+                conn.execute("UPDATE library_meta SET value = value + 1 WHERE key = 'generation'")
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+
+def import_directory(comics_dir, db_path):
+    """Copy a comics/<id>/ folder tree into a (new) SQLite database."""
+    previous = set_comics_dir(comics_dir)
+    try:
+        comics = load_comics(lazy=False)
+    finally:
+        set_comics_dir(previous)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    backend = SQLiteBackend(db_path)
+    backend.save_comics(comics)
+    backend.close()
+    return len(comics)
+
+
+def export_directory(db_path, comics_dir):
+    """Write a SQLite library out in the comics/<id>/ folder layout."""
+    backend = SQLiteBackend(db_path)
+    comics = backend.load_comics(lazy=False)
+    backend.close()
+    previous = set_comics_dir(comics_dir)
+    try:
+        save_comics(comics)
+    finally:
+        set_comics_dir(previous)
+    return len(comics)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert between comics/ folders and a SQLite library.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('import', help="copy a comics/ folder tree into a database")
+    p.add_argument('comics_dir')
+    p.add_argument('db_path')
+    p = sub.add_parser('export', help="write a database out as comics/ folders")
+    p.add_argument('db_path')
+    p.add_argument('comics_dir')
+    args = parser.parse_args()
+    if args.command == 'import':
+        count = import_directory(args.comics_dir, args.db_path)
+        print(f"Imported {count} comics into {args.db_path}")
+    else:
+        count = export_directory(args.db_path, args.comics_dir)
+        print(f"Exported {count} comics to {args.comics_dir}")
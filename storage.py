@@ -0,0 +1,184 @@
+"""Crash-safe writes for the comics/ store.
+
+A save is one StoreTransaction: every file is first written next to its
+target as ``<target>.tmp``, then a journal listing the targets is committed and
+the temp files are renamed over the targets. If the process dies half way,
+recover_store() either finishes the renames (journal committed) or throws the
+temp files away (journal still pending), so readers never see a half-written
+JSON file or a comic-index.json that disagrees with the comic folders.
+"""
+import json
+import os
+import shutil
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import codec
+import metrics
+
+JOURNAL_NAME = '.journal.json'
+TMP_SUFFIX = '.tmp'
+
+# Set to False to skip the fsyncs (still atomic, but not durable on power loss)
+SYNC_WRITES = True
+
+# On macOS fsync() can leave the data in the drive's cache; F_FULLFSYNC flushes it
+_FULLFSYNC = getattr(fcntl, 'F_FULLFSYNC', None)
+
+
+def _fsync(fd):
+    if _FULLFSYNC is not None:
+        fcntl.fcntl(fd, _FULLFSYNC)
+    else:
+        os.fsync(fd)
+
+
+def sync_dirs(folders):
+    """fsync folders so that files created, renamed or removed in them stay that way."""
+    if not SYNC_WRITES or os.name != 'posix':
+        # Windows cannot open a folder; NTFS journals its own metadata
+        return
+    for folder in set(folders):
+        fd = os.open(folder, os.O_RDONLY)
+        try:
+            _fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def sync_files(paths, folders=()):
+    """fsync each file, then each folder holding one (and the given folders), once.
+
+    Write every file first and sync them together afterwards: the kernel
+    can then flush them in one go instead of waiting on the disk per file.
+    """
+    if not SYNC_WRITES:
+        return
+    for path in paths:
+        fd = os.open(path, os.O_RDWR)
+        try:
+            _fsync(fd)
+        finally:
+            os.close(fd)
+    sync_dirs([os.path.dirname(os.path.abspath(path)) for path in paths] + [os.path.abspath(f) for f in folders])
+
+
+def _journal_path(root):
+    return os.path.join(root, JOURNAL_NAME)
+
+
+def _write_journal(root, journal, sync=True):
+    path = _journal_path(root)
+    with open(path + TMP_SUFFIX, 'w', encoding='utf-8') as f:
+        json.dump(journal, f, ensure_ascii=False)
+        f.flush()
+        if sync and SYNC_WRITES:
+            _fsync(f.fileno())
+        if metrics.recording():
+            metrics.count_write(f.buffer.tell())
+    os.replace(path + TMP_SUFFIX, path)
+    if sync:
+        sync_dirs([os.path.abspath(root)])
+
+
+def _folders(journal):
+    """The folders a journal's renames and removals change."""
+    paths = journal.get('writes', []) + journal.get('removes', [])
+    folders = {os.path.dirname(os.path.abspath(p)) for p in paths}
+    return [f for f in folders if os.path.isdir(f)]
+
+
+def _roll_back(journal):
+    for target in journal.get('writes', []):
+        if os.path.exists(target + TMP_SUFFIX):
+            os.remove(target + TMP_SUFFIX)
+
+
+def _remove(path, keep):
+    """Delete a file or folder, sparing the temp files listed in keep."""
+    if os.path.isdir(path):
+        if not any(k.startswith(os.path.join(path, '')) for k in keep):
+            shutil.rmtree(path)
+            return
+        for name in os.listdir(path):
+            _remove(os.path.join(path, name), keep)
+    elif os.path.exists(path) and path not in keep:
+        os.remove(path)
+
+
+def _roll_forward(journal):
+    keep = {target + TMP_SUFFIX for target in journal.get('writes', [])}
+    for path in journal.get('removes', []):
+        _remove(path, keep)
+    for target in journal.get('writes', []):
+        if os.path.exists(target + TMP_SUFFIX):
+            os.replace(target + TMP_SUFFIX, target)
+
+
+def recover_store(root):
+    """Finish or undo a save that was interrupted. Returns True if one was found."""
+    path = _journal_path(root)
+    if os.path.exists(path + TMP_SUFFIX):
+        os.remove(path + TMP_SUFFIX)
+    if not os.path.exists(path):
+        return False
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            journal = json.load(f)
+    except ValueError:
+        journal = {}
+    if journal.get('state') == 'committed':
+        _roll_forward(journal)
+    else:
+        _roll_back(journal)
+    sync_dirs(_folders(journal))
+    os.remove(path)
+    return True
+
+
+class StoreTransaction:
+    """Collects the file writes and removals of one save and applies them atomically."""
+
+    def __init__(self, root):
+        self.root = root
+        self.writes = {}  # target path -> encoded JSON bytes
+        self.removes = []
+
+    def write_json(self, path, data):
+        # Encode now so the transaction is a snapshot even if data changes later
+        self.writes[path] = codec.encode_document(data)
+
+    def remove(self, path):
+        """Delete a file (or a whole comic folder) when the transaction commits."""
+        self.removes.append(path)
+
+    def commit(self):
+        removes = [p for p in self.removes if p not in self.writes]
+        if not self.writes and not removes:
+            return
+        journal = {'state': 'pending', 'writes': list(self.writes), 'removes': removes}
+        # Losing a pending journal only leaves temp files behind: no need to sync it
+        _write_journal(self.root, journal, sync=False)
+        try:
+            for path, data in self.writes.items():
+                with open(path + TMP_SUFFIX, 'wb') as f:
+                    f.write(data)
+                metrics.count_write(len(data))
+            # The temp files (and new comic folders) must be on disk before the commit point
+            sync_files([path + TMP_SUFFIX for path in self.writes], [self.root])
+        except BaseException:
+            _roll_back(journal)
+            os.remove(_journal_path(self.root))
+            raise
+        # Commit point: from here on recover_store() finishes the save
+        journal['state'] = 'committed'
+        _write_journal(self.root, journal)
+        _roll_forward(journal)
+        sync_dirs(_folders(journal))
+        # A journal that survives a crash is only replayed again, which changes nothing
+        os.remove(_journal_path(self.root))
+        self.writes = {}
+        self.removes = []
@@ -0,0 +1,22 @@
+"""Shared fixtures. Tests never touch the real comics/ folder: each one gets a copy."""
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import TruyenManagerment  # noqa: E402
+
+
+@pytest.fixture
+def library(tmp_path):
+    """A copy of the sample comics/ library, set as the folder the app works on."""
+    path = str(tmp_path / 'comics')
+    shutil.copytree(os.path.join(ROOT, 'comics'), path)
+    previous = TruyenManagerment.COMICS_DIR
+    TruyenManagerment.set_comics_dir(path)
+    yield path
+    TruyenManagerment.set_comics_dir(previous)
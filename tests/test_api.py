@@ -0,0 +1,382 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import TruyenManagerment
+from api import ComicAPI, ReadWriteLock
+
+
+@pytest.fixture
+def make_api(library):
+    """Build ComicAPI instances on the test library; they are closed afterwards."""
+    apis = []
+
+    def make(**kwargs):
+        api = ComicAPI(**kwargs)
+        apis.append(api)
+        return api
+    yield make
+    for api in apis:
+        api._close()
+
+
+def call(method, *args, **kwargs):
+    return json.loads(method(*args, **kwargs))
+
+
+@pytest.mark.parametrize('write_behind', [True, False])
+def test_failed_prepare_save_keeps_the_changes(make_api, write_behind):
+    api = make_api(write_behind=write_behind, write_delay=0.01)
+    prepare_save = api._backend.prepare_save
+    failing = [True]
+
+    def flaky(comics, changes=None):
+        if failing[0]:
+            raise TypeError('not JSON serializable')
+        return prepare_save(comics, changes)
+    api._backend.prepare_save = flaky
+
+    result = call(api.add_tag, 1, 'kept')
+    # A synchronous save reports its failure; with write-behind the call returns before the save
+    assert result['success'] == write_behind
+    if not write_behind:
+        assert result['error'] == 'Save failed: not JSON serializable'
+    deadline = time.monotonic() + 5
+    while api._write_error is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert api._write_error == 'not JSON serializable'
+    assert api._changes.has_comic(1)
+    if write_behind:
+        assert api._writer.is_alive()
+
+    failing[0] = False
+    assert call(api.flush)['success']
+    assert 'kept' in TruyenManagerment.load_comic(1)['tags']
+
+
+def start(target):
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_readers_share_the_lock():
+    rw = ReadWriteLock()
+    both_inside = threading.Barrier(2, timeout=5)
+
+    def reader():
+        with rw.read():
+            both_inside.wait()
+    threads = [start(reader), start(reader)]
+    for t in threads:
+        t.join(5)
+    assert not any(t.is_alive() for t in threads)
+
+
+def test_waiting_writer_goes_before_new_readers():
+    rw = ReadWriteLock()
+    order = []
+    with rw.read():
+        def writer():
+            with rw.write():
+                order.append('writer')
+        w = start(writer)
+        while not rw._writers_waiting:
+            time.sleep(0.001)
+
+        def reader():
+            with rw.read():
+                order.append('reader')
+        r = start(reader)
+        time.sleep(0.05)
+        # The new reader waits behind the writer instead of joining the held read lock
+        assert order == []
+    w.join(5)
+    r.join(5)
+    assert order == ['writer', 'reader']
+
+
+def test_lock_is_reentrant():
+    rw = ReadWriteLock()
+    with rw.write():
+        assert rw.writing()
+        with rw.write(), rw.read():
+            assert rw.writing()
+        assert rw.writing()
+    assert not rw.writing()
+
+    done = threading.Event()
+    with rw.read():
+        def writer():
+            with rw.write():
+                done.set()
+        w = start(writer)
+        while not rw._writers_waiting:
+            time.sleep(0.001)
+        # A nested read must not queue behind the waiting writer (it would never get in)
+        with rw.read():
+            assert not done.is_set()
+    w.join(5)
+    assert done.is_set()
+
+
+def all_pages(api, sort=None, limit=4):
+    ids = []
+    cursor = None
+    while True:
+        page = call(api.get_comics_page, limit=limit, fields=['id'], sort=sort, cursor=cursor)['data']
+        ids.extend(item['id'] for item in page['items'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return ids
+
+
+def test_cursor_pages_cover_every_comic_once(make_api):
+    api = make_api(write_behind=False)
+    every = sorted(c['id'] for c in call(api.get_comics)['data'])
+    assert all_pages(api) == every
+    assert all_pages(api, sort='-id') == every[::-1]
+    titles = all_pages(api, sort='title', limit=3)
+    assert sorted(titles) == every
+    by_title = {c['id']: c.get('title', '') for c in call(api.get_comics)['data']}
+    assert [by_title[i] for i in titles] == sorted(by_title[i] for i in titles)
+
+
+def test_cursor_does_not_shift_when_comics_change(make_api):
+    api = make_api(write_behind=False)
+    every = sorted(c['id'] for c in call(api.get_comics)['data'])
+    first = call(api.get_comics_page, limit=4, fields=['id'])['data']
+    assert [item['id'] for item in first['items']] == every[:4]
+    # An offset would now skip a comic; the cursor continues after the last one seen
+    assert call(api.delete_comic, every[0])['success']
+    added = call(api.add_comic, {'title': 'New'})['data']['id']
+    second = call(api.get_comics_page, limit=4, fields=['id'], cursor=first['next_cursor'])['data']
+    assert [item['id'] for item in second['items']] == every[4:8]
+    assert second['total'] == len(every)
+    assert all_pages(api)[-1] == added
+
+
+def test_bad_cursors_are_rejected(make_api):
+    api = make_api(write_behind=False)
+    cursor = call(api.get_comics_page, limit=2, sort='title')['data']['next_cursor']
+    assert call(api.get_comics_page, cursor='not a cursor')['error'] == 'Invalid cursor'
+    assert call(api.get_comics_page, cursor=cursor, sort='id')['error'] == 'Cursor was made for a different sort'
+
+
+@pytest.mark.parametrize('write_behind', [True, False])
+def test_apply_batch_does_not_deadlock_with_a_flush(library, write_behind):
+    # Not make_api: if this deadlocks, closing the API would hang the test run
+    api = ComicAPI(write_behind=write_behind, write_delay=0.05)
+    atexit.unregister(api._close)
+    assert call(api.add_tag, 1, 'before')['success']
+    results = []
+    with api._rw.read():
+        # A batch queues for the write lock while a reader holds it ...
+        batch = start(lambda: results.append(call(api.apply_batch, [{'op': 'add_tag', 'args': [2, 'batch']}])))
+        # ... and a flush (the writer thread, or a caller's synchronous save) starts meanwhile
+        flush = start(api.flush)
+        time.sleep(0.2)
+    batch.join(5)
+    flush.join(5)
+    assert not batch.is_alive() and not flush.is_alive(), 'apply_batch deadlocked with a flush'
+    assert results[0]['success']
+    closing = start(api._close)
+    closing.join(5)
+    assert not closing.is_alive()
+    assert 'batch' in TruyenManagerment.load_comic(2)['tags']
+
+
+def test_page_fields_as_a_single_name(make_api):
+    api = make_api(write_behind=False)
+    items = call(api.get_comics_page, limit=2, fields='title')['data']['items']
+    assert items and all(list(item) == ['title'] for item in items)
+    assert not call(api.get_comics_page, fields=5)['success']
+
+
+def test_batch_rejects_badly_typed_arguments(make_api):
+    api = make_api(write_behind=False)
+    tags = call(api.get_tags, 1)['data']
+    result = call(api.apply_batch, [{'op': 'add_tag', 'args': [1, 'ok']},
+                                    {'op': 'add_tag', 'args': '1x'}])
+    assert not result['success']
+    assert result['error'] == 'Operation 1 failed: args of add_tag must be a list'
+    assert call(api.get_tags, 1)['data'] == tags
+    result = call(api.apply_batch, [{'op': 'add_tag', 'kwargs': [1, 'x']}], atomic=False)
+    assert result['data']['results'][0]['error'] == 'kwargs of add_tag must be an object'
+
+
+def test_patch_chapter_renames_on_a_type_only_change(make_api, library):
+    api = make_api(write_behind=False)
+    folder = os.path.join(library, '1')
+    assert os.path.exists(os.path.join(folder, 'vol_1_chapter_1.0.json'))
+    assert call(api.patch_chapter, 1, 1, 1.0, [{'op': 'replace', 'path': '/vol', 'value': 1.0}])['success']
+    assert os.path.exists(os.path.join(folder, 'vol_1.0_chapter_1.0.json'))
+    assert not os.path.exists(os.path.join(folder, 'vol_1_chapter_1.0.json'))
+    # Changing the value onto another chapter is still refused
+    result = call(api.patch_chapter, 1, 1.0, 1.0, [{'op': 'replace', 'path': '/chap', 'value': 2}])
+    assert result['error'] == 'Chapter already exists'
+
+
+def add_external_comic(library, comic_id):
+    """Add a comic the way another program (a sync client) would: folder, then index."""
+    folder = os.path.join(library, str(comic_id))
+    os.makedirs(folder)
+    with open(os.path.join(folder, 'comic.json'), 'w', encoding='utf-8') as f:
+        json.dump({'id': comic_id, 'title': f'External {comic_id}', 'chapters': []}, f)
+    index_path = os.path.join(library, 'comic-index.json')
+    with open(index_path, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    index.append({'id': comic_id, 'title': f'External {comic_id}'})
+    with open(index_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+
+
+def test_external_change_during_write_delay_is_reloaded(make_api, library):
+    api = make_api(write_behind=True, write_delay=0.2)
+    count = len(call(api.get_comics)['data'])
+    assert call(api.add_tag, 1, 'mine')['success']
+    add_external_comic(library, 99)
+    assert call(api.flush)['success']
+    comics = call(api.get_comics)['data']
+    assert len(comics) == count + 1
+    assert 'mine' in next(c for c in comics if c['id'] == 1)['tags']
+
+
+def test_close_reports_changes_it_could_not_save(library, monkeypatch):
+    api = ComicAPI(write_behind=False)
+    atexit.unregister(api._close)
+    def disk_full(paths, folders=()):
+        raise OSError('disk full')
+    monkeypatch.setattr('storage.sync_files', disk_full)
+    result = call(api.add_tag, 1, 'lost')
+    assert result == {'success': False, 'error': 'Save failed: disk full'}
+    assert 'lost' not in TruyenManagerment.load_comic(1)['tags']
+    with pytest.raises(RuntimeError, match='disk full'):
+        api._close()
+
+
+@pytest.mark.parametrize('use_inotify', [True, False])
+def test_watcher_keeps_external_comics_while_edits_are_pending(make_api, library, use_inotify):
+    api = make_api(write_behind=True, write_delay=30)
+    call(api.get_comics)
+    changed = threading.Event()
+    api._watch(lambda ids, index: index and changed.set(), interval=0.1, use_inotify=use_inotify)
+    # The rename is still waiting to be written (it rewrites comic-index.json) ...
+    assert call(api.edit_comic, 1, {'title': 'Renamed'})['success']
+    # ... when a sync client adds a comic
+    add_external_comic(library, 99)
+    assert changed.wait(5)
+    assert call(api.flush)['success']
+    with open(os.path.join(library, 'comic-index.json'), 'r', encoding='utf-8') as f:
+        index = {entry['id']: entry['title'] for entry in json.load(f)}
+    assert index[99] == 'External 99' and index[1] == 'Renamed'
+    comics = {c['id']: c for c in call(api.get_comics)['data']}
+    assert comics[99]['title'] == 'External 99' and comics[1]['title'] == 'Renamed'
+
+
+def counted_from_comics(api, field):
+    counts = {}
+    for comic in call(api.get_comics)['data']:
+        for term in set(comic.get(field) or []):
+            counts[term] = counts.get(term, 0) + 1
+    return counts
+
+
+def assert_taxonomy_in_sync(api):
+    counts = counted_from_comics(api, 'tags')
+    assert call(api.get_taxonomy_counts, 'tags')['data'] == counts
+    assert call(api.get_all_tags)['data'] == sorted(counts)
+
+
+def test_taxonomy_index_follows_edits_and_rollbacks(make_api):
+    api = make_api(write_behind=False)
+    comic_id = call(api.get_comics)['data'][0]['id']
+    assert_taxonomy_in_sync(api)
+    call(api.add_tag, comic_id, 'Brand New Tag')
+    assert_taxonomy_in_sync(api)
+    assert [c['id'] for c in call(api.get_comics_by_term, 'tags', 'Brand New Tag')['data']] == [comic_id]
+    tags = call(api.get_tags, comic_id)['data']
+    call(api.delete_tag, comic_id, tags.index('Brand New Tag'))
+    assert_taxonomy_in_sync(api)
+    assert 'Brand New Tag' not in call(api.get_all_tags)['data']
+    call(api.edit_comic, comic_id, {'tags': ['Only Tag']})
+    assert_taxonomy_in_sync(api)
+    assert 'Only Tag' in call(api.get_all_tags)['data']
+    before = call(api.get_taxonomy_counts, 'tags')['data']
+    result = call(api.apply_batch, [{"op": "add_tag", "args": [comic_id, 'Rolled Back']},
+                                    {"op": "add_tag", "args": [-1, 'Nope']}])
+    assert not result['success']
+    assert call(api.get_taxonomy_counts, 'tags')['data'] == before
+    assert_taxonomy_in_sync(api)
+
+
+def search_ids(api, query):
+    return [hit['comic']['id'] for hit in call(api.search, query)['data']['results']]
+
+
+def test_search_index_follows_edits_and_rollbacks(make_api):
+    api = make_api(write_behind=False)
+    comic = call(api.get_comics)['data'][0]
+    old_title = comic['title']
+    assert comic['id'] in search_ids(api, old_title)
+    call(api.edit_comic, comic['id'], {'title': 'Zyxwvut Quokka'})
+    assert search_ids(api, 'quokka') == [comic['id']]
+    assert comic['id'] not in search_ids(api, old_title)
+    result = call(api.apply_batch, [{"op": "edit_comic", "args": [comic['id'], {'title': 'Marmoset'}]},
+                                    {"op": "add_tag", "args": [-1, 'Nope']}])
+    assert not result['success']
+    assert search_ids(api, 'marmoset') == []
+    assert search_ids(api, 'quokka') == [comic['id']]
+    call(api.delete_comic, comic['id'])
+    assert search_ids(api, 'quokka') == []
+
+
+def cache_stats(api):
+    return call(api.get_metrics)['data']['response_cache']
+
+
+def test_response_cache_is_invalidated_by_writes(make_api):
+    api = make_api(write_behind=False, collect_metrics=True, stamp_interval=0)
+    first, second = [c['id'] for c in call(api.get_comics)['data'][:2]]
+    call(api.get_comic, first)
+    call(api.get_comic, second)
+    hits = cache_stats(api)['hits']
+    assert call(api.get_comic, first)['data']['id'] == first
+    assert cache_stats(api)['hits'] == hits + 1
+    call(api.edit_comic, first, {'title': 'Fresh Title'})
+    assert call(api.get_comic, first)['data']['title'] == 'Fresh Title'
+    hits = cache_stats(api)['hits']
+    call(api.get_comic, second)
+    assert cache_stats(api)['hits'] == hits + 1
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_watcher_reloads_external_edits_only(make_api, library, use_inotify):
+    api = make_api(write_behind=False)
+    call(api.get_comics)
+    reports = []
+    changed = threading.Event()
+
+    def on_change(ids, index_changed):
+        reports.append((list(ids), index_changed))
+        changed.set()
+
+    api._watch(on_change, interval=0.1, use_inotify=use_inotify)
+    # Our own write is not a change from outside
+    assert call(api.add_tag, 2, 'Own Tag')['success']
+    time.sleep(0.5)
+    assert reports == []
+    path = os.path.join(library, '1', 'comic.json')
+    with open(path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    meta['title'] = 'Edited Elsewhere'
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    assert changed.wait(5)
+    assert all(report == ([1], False) for report in reports)
+    assert call(api.get_comic, 1)['data']['title'] == 'Edited Elsewhere'
+    assert 'Own Tag' in call(api.get_comic, 2)['data']['tags']
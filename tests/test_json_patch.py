@@ -0,0 +1,92 @@
+import pytest
+
+from json_patch import apply_patch, parse_pointer, top_level_keys, PatchError
+
+
+def record():
+    return {'title': 'A', 'tags': ['x', 'y'], 'meta': {'a~b': 1, 'c/d': 2}, 'star': 1, 'done': True}
+
+
+def test_pointer_escapes():
+    assert parse_pointer('/meta/a~0b') == ['meta', 'a~b']
+    assert parse_pointer('/meta/c~1d') == ['meta', 'c/d']
+    assert apply_patch(record(), [{'op': 'replace', 'path': '/meta/c~1d', 'value': 3}])['meta']['c/d'] == 3
+
+
+def test_dash_appends_only_on_add():
+    patched = apply_patch(record(), [{'op': 'add', 'path': '/tags/-', 'value': 'z'}])
+    assert patched['tags'] == ['x', 'y', 'z']
+    for op in ({'op': 'remove', 'path': '/tags/-'}, {'op': 'replace', 'path': '/tags/-', 'value': 'z'}):
+        with pytest.raises(PatchError):
+            apply_patch(record(), [op])
+
+
+@pytest.mark.parametrize('index', ['01', '-1', '3', 'x'])
+def test_bad_array_indexes(index):
+    with pytest.raises(PatchError):
+        apply_patch(record(), [{'op': 'add', 'path': f'/tags/{index}', 'value': 'z'}])
+
+
+def test_add_at_end_index_inserts():
+    assert apply_patch(record(), [{'op': 'add', 'path': '/tags/2', 'value': 'z'}])['tags'] == ['x', 'y', 'z']
+    assert apply_patch(record(), [{'op': 'add', 'path': '/tags/0', 'value': 'z'}])['tags'] == ['z', 'x', 'y']
+
+
+def test_move_and_copy():
+    patched = apply_patch(record(), [{'op': 'move', 'from': '/tags/0', 'path': '/tags/-'}])
+    assert patched['tags'] == ['y', 'x']
+    patched = apply_patch(record(), [{'op': 'copy', 'from': '/meta', 'path': '/meta2'}])
+    assert patched['meta2'] == patched['meta'] and patched['meta2'] is not patched['meta']
+    # Moving a value onto itself is allowed and changes nothing
+    assert apply_patch(record(), [{'op': 'move', 'from': '/meta', 'path': '/meta'}]) == record()
+
+
+def test_move_into_its_own_child_fails():
+    with pytest.raises(PatchError):
+        apply_patch(record(), [{'op': 'move', 'from': '/meta', 'path': '/meta/inner'}])
+    # A sibling whose name only starts the same is not a child
+    patched = apply_patch(record(), [{'op': 'move', 'from': '/star', 'path': '/stars'}])
+    assert patched['stars'] == 1 and 'star' not in patched
+
+
+def test_failed_test_leaves_the_record_untouched():
+    original = record()
+    ops = [{'op': 'add', 'path': '/tags/-', 'value': 'z'},
+           {'op': 'remove', 'path': '/meta/a~0b'},
+           {'op': 'test', 'path': '/title', 'value': 'B'}]
+    with pytest.raises(PatchError):
+        apply_patch(original, ops)
+    assert original == record()
+
+
+def test_test_uses_json_equality():
+    apply_patch(record(), [{'op': 'test', 'path': '/star', 'value': 1.0}])
+    with pytest.raises(PatchError):
+        apply_patch(record(), [{'op': 'test', 'path': '/done', 'value': 1}])
+    with pytest.raises(PatchError):
+        apply_patch(record(), [{'op': 'test', 'path': '/star', 'value': True}])
+
+
+def test_untouched_members_are_shared():
+    original = record()
+    patched = apply_patch(original, [{'op': 'add', 'path': '/tags/-', 'value': 'z'}])
+    assert patched['meta'] is original['meta']
+    assert original['tags'] == ['x', 'y']
+
+
+@pytest.mark.parametrize('ops', [
+    {'op': 'add', 'path': '/a', 'value': 1},
+    [{'op': 'add', 'path': '', 'value': {}}],
+    [{'op': 'add', 'path': 'title', 'value': 1}],
+    [{'op': 'add', 'path': '/title'}],
+    [{'op': 'frobnicate', 'path': '/title'}],
+    [{'op': 'copy', 'path': '/title'}],
+])
+def test_malformed_patches(ops):
+    with pytest.raises(PatchError):
+        apply_patch(record(), ops)
+
+
+def test_top_level_keys():
+    ops = [{'op': 'move', 'from': '/tags/0', 'path': '/meta/t'}, {'op': 'test', 'path': '/title', 'value': 'A'}]
+    assert top_level_keys(ops) == ['meta', 'tags', 'title']
@@ -0,0 +1,216 @@
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import migrate
+import storage
+import TruyenManagerment
+from TruyenManagerment import TruyenManagermentApp, ChapterManager, ComicChanges, load_comics
+import packed_store
+import sqlite_store
+from storage import StoreTransaction, recover_store, JOURNAL_NAME, TMP_SUFFIX
+
+
+def read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+@pytest.fixture
+def store(tmp_path):
+    root = tmp_path / 'comics'
+    (root / '1').mkdir(parents=True)
+    write(root / 'comic-index.json', '[{"id": 1}]')
+    write(root / '1' / 'comic.json', '{"id": 1, "title": "old"}')
+    write(root / '1' / 'old.json', '{}')
+    return str(root)
+
+
+def leftovers(root):
+    found = []
+    for folder, _, files in os.walk(root):
+        found.extend(os.path.join(folder, f) for f in files if f.endswith(TMP_SUFFIX) or f == JOURNAL_NAME)
+    return found
+
+
+def test_commit_writes_and_removes(store):
+    os.makedirs(os.path.join(store, '2'))
+    tx = StoreTransaction(store)
+    tx.write_json(os.path.join(store, '1', 'comic.json'), {'id': 1, 'title': 'new'})
+    tx.write_json(os.path.join(store, '2', 'comic.json'), {'id': 2})
+    tx.remove(os.path.join(store, '1', 'old.json'))
+    tx.commit()
+    assert read(os.path.join(store, '1', 'comic.json'))['title'] == 'new'
+    assert read(os.path.join(store, '2', 'comic.json')) == {'id': 2}
+    assert not os.path.exists(os.path.join(store, '1', 'old.json'))
+    assert leftovers(store) == []
+
+
+def test_crash_after_commit_point_is_rolled_forward(store, monkeypatch):
+    def crash(journal):
+        raise KeyboardInterrupt('power cut')
+    monkeypatch.setattr(storage, '_roll_forward', crash)
+    tx = StoreTransaction(store)
+    tx.write_json(os.path.join(store, '1', 'comic.json'), {'id': 1, 'title': 'new'})
+    tx.remove(os.path.join(store, '1', 'old.json'))
+    with pytest.raises(KeyboardInterrupt):
+        tx.commit()
+    # Nothing renamed yet, but the journal says the save is committed
+    assert read(os.path.join(store, '1', 'comic.json'))['title'] == 'old'
+    assert read(os.path.join(store, JOURNAL_NAME))['state'] == 'committed'
+    monkeypatch.undo()
+    assert recover_store(store)
+    assert read(os.path.join(store, '1', 'comic.json'))['title'] == 'new'
+    assert not os.path.exists(os.path.join(store, '1', 'old.json'))
+    assert leftovers(store) == []
+
+
+def test_crash_before_commit_point_is_rolled_back(store):
+    target = os.path.join(store, '1', 'comic.json')
+    # What a process that died while writing temp files leaves behind
+    write(os.path.join(store, JOURNAL_NAME),
+          json.dumps({'state': 'pending', 'writes': [target], 'removes': [os.path.join(store, '1', 'old.json')]}))
+    write(target + TMP_SUFFIX, '{"id": 1, "ti')
+    assert recover_store(store)
+    assert read(target)['title'] == 'old'
+    assert os.path.exists(os.path.join(store, '1', 'old.json'))
+    assert leftovers(store) == []
+
+
+def test_crash_while_writing_the_committed_journal(store):
+    target = os.path.join(store, '1', 'comic.json')
+    journal = {'state': 'pending', 'writes': [target], 'removes': []}
+    write(os.path.join(store, JOURNAL_NAME), json.dumps(journal))
+    write(target + TMP_SUFFIX, '{"id": 1, "title": "new"}')
+    # The committed journal never replaced the pending one
+    write(os.path.join(store, JOURNAL_NAME) + TMP_SUFFIX, json.dumps(dict(journal, state='committed')))
+    assert recover_store(store)
+    assert read(target)['title'] == 'old'
+    assert leftovers(store) == []
+
+
+def test_replaying_a_finished_journal_changes_nothing(store):
+    target = os.path.join(store, '1', 'comic.json')
+    write(os.path.join(store, JOURNAL_NAME),
+          json.dumps({'state': 'committed', 'writes': [target], 'removes': []}))
+    assert recover_store(store)
+    assert read(target)['title'] == 'old'
+    assert not recover_store(store)
+
+
+def test_failed_write_rolls_back_at_once(store, monkeypatch):
+    def fail(paths, folders=()):
+        raise OSError('disk full')
+    monkeypatch.setattr(storage, 'sync_files', fail)
+    tx = StoreTransaction(store)
+    tx.write_json(os.path.join(store, '1', 'comic.json'), {'id': 1, 'title': 'new'})
+    with pytest.raises(OSError):
+        tx.commit()
+    assert read(os.path.join(store, '1', 'comic.json'))['title'] == 'old'
+    assert leftovers(store) == []
+
+
+@pytest.mark.parametrize('backend', [packed_store, sqlite_store])
+def test_round_trip_keeps_the_comics_dir(library, tmp_path, backend):
+    path = str(tmp_path / 'library.db')
+    out = str(tmp_path / 'exported')
+    count = backend.import_directory(library, path)
+    assert backend.export_directory(path, out) == count
+    assert TruyenManagerment.COMICS_DIR == library
+    assert sorted(os.listdir(out)) == sorted(os.listdir(library))
+
+
+def test_migrate_keeps_the_comics_dir(library, tmp_path):
+    source = str(tmp_path / 'comics.json')
+    with open(source, 'w', encoding='utf-8') as f:
+        json.dump({'comics': [{'id': 1, 'title': 'A', 'chapters': [{'vol': 1, 'chap': 1, 'images': []}]},
+                              {'id': 2, 'title': 'B', 'chapters': []}]}, f)
+    out = str(tmp_path / 'migrated')
+    result = migrate.migrate(source, out)
+    assert (result['migrated'], result['failed']) == (2, [])
+    assert migrate.verify(source, out) == []
+    assert TruyenManagerment.COMICS_DIR == library
+
+
+def test_app_deletes_in_the_same_save(library, monkeypatch):
+    # The Tk handlers, run without a window: the deletions must wait for the save
+    monkeypatch.setattr(TruyenManagerment.messagebox, 'askyesno', lambda *args: True)
+    comics = load_comics()
+    seen = []
+
+    def save_changes():
+        seen.append([os.path.exists(p) for p in app.changes.removed])
+        TruyenManagerment.save_comics(app.comics, app.changes)
+        app.changes.clear()
+    app = SimpleNamespace(comics=comics, changes=ComicChanges(), save_changes=save_changes,
+                          load_tree=lambda: None, selected_comic=lambda: comics[0])
+
+    comic = comics[0]
+    chapter = comic['chapters'][0]
+    chapter_file = os.path.join(library, str(comic['id']), chapter.link['file'])
+    manager = SimpleNamespace(comic=comic, selected_chapter=lambda: (0, chapter), load_chapters=lambda: None,
+                              on_save=lambda **kw: TruyenManagermentApp.save_comic_and_reload(app, **kw))
+    ChapterManager.delete_chapter(manager)
+    assert seen == [[True]] and not os.path.exists(chapter_file)
+    assert chapter.link['file'] not in [c['file'] for c in read(os.path.join(library, str(comic['id']), 'comic.json'))['chapters']]
+
+    folder = os.path.join(library, str(comic['id']))
+    TruyenManagermentApp.delete_comic(app)
+    assert seen[-1] == [True] and not os.path.exists(folder)
+    assert comic['id'] not in [c['id'] for c in read(os.path.join(library, 'comic-index.json'))]
+
+
+def test_app_reload_keeps_the_comic_an_open_window_edits(library):
+    comics = load_comics()
+    app = SimpleNamespace(comics=comics, comic_by_key={str(c['id']): c for c in comics}, load_tree=lambda: None)
+    open_in_manager = comics[0]
+    index_path = os.path.join(library, 'comic-index.json')
+    index = read(index_path)
+    write(index_path, json.dumps(index[1:] + index[:1]))
+    TruyenManagermentApp.reload_from_disk(app, set(), True)
+    assert app.comics is comics
+    assert any(c is open_in_manager for c in app.comics)
+    assert [c['id'] for c in app.comics] == [e['id'] for e in index[1:] + index[:1]]
+
+
+def test_save_writes_only_what_changed(library):
+    comics = load_comics()
+    comic = comics[0]
+    chapter = comic['chapters'][0]
+    chapter['title'] = 'Edited'
+    folder = os.path.join(library, str(comic['id']))
+    changes = ComicChanges()
+    changes.mark_chapter(comic['id'], chapter['vol'], chapter['chap'])
+    tx = TruyenManagerment.prepare_save(comics, changes)
+    assert sorted(tx.writes) == sorted([os.path.join(folder, 'comic.json'),
+                                        os.path.join(folder, chapter.link['file'])])
+    changes = ComicChanges()
+    changes.mark_index()
+    assert list(TruyenManagerment.prepare_save(comics, changes).writes) == [os.path.join(library, 'comic-index.json')]
+    # Without changes everything is written
+    assert len(TruyenManagerment.prepare_save(comics).writes) > len(comics) + 1
+
+
+def test_chapters_load_lazily(library):
+    lazy = load_comics()
+    eager = load_comics(lazy=False)
+    chapter = lazy[0]['chapters'][0]
+    assert isinstance(chapter, TruyenManagerment.LazyChapter)
+    # vol and chap come from comic.json, the body is read on first use
+    assert (chapter['vol'], chapter['chap']) == (chapter.link['vol'], chapter.link['chap'])
+    assert not chapter.loaded
+    assert json.loads(json.dumps(lazy)) == json.loads(json.dumps(eager))
+    assert chapter.loaded
+
+
+@pytest.mark.parametrize("lazy", [True, False])
+def test_threaded_load_matches_the_sequential_load(library, lazy):
+    sequential = json.loads(json.dumps(load_comics(lazy=lazy)))
+    assert json.loads(json.dumps(load_comics(lazy=lazy, workers=4))) == sequential
@@ -0,0 +1,259 @@
+"""Notice changes that other programs make to the comics/ folder.
+
+LibraryWatcher runs a background thread that reports which comic folders
+changed (comic.json or a chapter file written, added or removed) and whether
+comic-index.json changed. On Linux it waits for inotify events; elsewhere, or
+when inotify cannot be used, it rescans the folders every `interval` seconds.
+
+A folder only counts as changed when the stats of its JSON files differ from
+the last ones seen, so after saving, the owner calls sync() for what it wrote
+and its own saves are not reported back to it. Bursts of events (one save
+writes several files) are gathered until the folder has been quiet for
+`settle` seconds, and nothing is reported while a save's journal is present.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import traceback
+
+from storage import JOURNAL_NAME
+
+INDEX_NAME = 'comic-index.json'
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+_EVENT = struct.Struct('iIII')
+
+
+def folder_signature(folder):
+    """Sorted (name, mtime_ns, size) of the JSON files in a folder, or None if it is gone.
+
+    Temp files of a save in progress (*.json.tmp) are left out.
+    """
+    signature = []
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name.endswith('.json') and entry.is_file():
+                    st = entry.stat()
+                    signature.append((entry.name, st.st_mtime_ns, st.st_size))
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return tuple(sorted(signature))
+
+
+def file_signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class _Inotify:
+    """Minimal inotify binding through ctypes: one watch per folder."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.folders = {}  # watch descriptor -> folder name ('' for the root)
+
+    def add(self, path, name):
+        wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {path}')
+        self.folders[wd] = name
+
+    def read(self, timeout):
+        """Events that arrive within timeout seconds, as (folder name, mask, file name)."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'surrogateescape')
+            offset += length
+            if mask & IN_IGNORED:
+                self.folders.pop(wd, None)
+            events.append((self.folders.get(wd), mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class LibraryWatcher:
+    """Report changes to a comics/ folder as callback(comic ids, index changed).
+
+    comic ids is a set of folder names (str(id)); the callback runs on the
+    watcher thread. use_inotify=False forces polling.
+    """
+
+    def __init__(self, root, callback, interval=1.0, settle=0.3, use_inotify=True):
+        self.root = root
+        self.callback = callback
+        self.interval = interval
+        self.settle = settle
+        self.use_inotify = use_inotify
+        self.mode = None
+        self._folders = {}  # folder name -> folder_signature
+        self._index = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._inotify = None
+
+    def _index_path(self):
+        return os.path.join(self.root, INDEX_NAME)
+
+    def _folder_names(self):
+        try:
+            with os.scandir(self.root) as entries:
+                return {entry.name for entry in entries if entry.is_dir()}
+        except FileNotFoundError:
+            return set()
+
+    def start(self):
+        """Record the current state and start watching."""
+        with self._lock:
+            self._folders = {name: folder_signature(os.path.join(self.root, name))
+                             for name in self._folder_names()}
+            self._index = file_signature(self._index_path())
+        if self.use_inotify and sys.platform.startswith('linux'):
+            try:
+                self._inotify = _Inotify()
+                self._inotify.add(self.root, '')
+                for name in self._folders:
+                    self._inotify.add(os.path.join(self.root, name), name)
+            except (OSError, AttributeError):
+                # No inotify (or out of watches): fall back to polling
+                if self._inotify is not None:
+                    self._inotify.close()
+                self._inotify = None
+        self.mode = 'inotify' if self._inotify is not None else 'polling'
+        self._thread = threading.Thread(target=self._run, name='LibraryWatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def sync(self, comic_ids=(), index=False):
+        """Take the current state of these folders (and the index) as known: they were written by us."""
+        with self._lock:
+            for name in comic_ids:
+                name = str(name)
+                signature = folder_signature(os.path.join(self.root, name))
+                if signature is None:
+                    self._folders.pop(name, None)
+                else:
+                    self._folders[name] = signature
+            if index:
+                self._index = file_signature(self._index_path())
+
+    def _check(self, names, index):
+        """Compare folders (and the index) with the known state; return what changed."""
+        changed = set()
+        with self._lock:
+            for name in names:
+                signature = folder_signature(os.path.join(self.root, name))
+                if signature == self._folders.get(name):
+                    continue
+                changed.add(name)
+                if signature is None:
+                    self._folders.pop(name, None)
+                else:
+                    self._folders[name] = signature
+            index_changed = False
+            if index:
+                signature = file_signature(self._index_path())
+                if signature != self._index:
+                    self._index = signature
+                    index_changed = True
+        return changed, index_changed
+
+    def _report(self, names, index):
+        changed, index_changed = self._check(names, index)
+        if changed or index_changed:
+            try:
+                self.callback(changed, index_changed)
+            except Exception:
+                traceback.print_exc()
+
+    def _saving(self):
+        return os.path.exists(os.path.join(self.root, JOURNAL_NAME))
+
+    def _run(self):
+        if self._inotify is not None:
+            self._run_inotify()
+        else:
+            self._run_polling()
+
+    def _run_polling(self):
+        while not self._stop.wait(self.interval):
+            if self._saving():
+                continue
+            with self._lock:
+                names = self._folder_names() | set(self._folders)
+            self._report(names, True)
+
+    def _run_inotify(self):
+        pending = set()
+        index = False
+        last_event = 0.0
+        while not self._stop.is_set():
+            timeout = self.settle if pending or index else self.interval
+            for folder, mask, name in self._inotify.read(timeout):
+                last_event = time.monotonic()
+                if mask & IN_Q_OVERFLOW:
+                    # Events were lost: check everything
+                    pending |= self._folder_names() | set(self._folders)
+                    index = True
+                elif folder == '':
+                    if mask & IN_ISDIR:
+                        if mask & (IN_CREATE | IN_MOVED_TO):
+                            try:
+                                self._inotify.add(os.path.join(self.root, name), name)
+                            except OSError:
+                                pass
+                        pending.add(name)
+                    elif name == INDEX_NAME:
+                        index = True
+                elif folder is not None and (name.endswith('.json') or mask & IN_DELETE_SELF):
+                    pending.add(folder)
+            pending.discard(None)
+            quiet = time.monotonic() - last_event >= self.settle
+            if (pending or index) and quiet and not self._saving():
+                self._report(pending, index)
+                pending = set()
+                index = False
@@ -0,0 +1,272 @@
+"""Reusable Tk widgets for the desktop app."""
+import tkinter as tk
+from tkinter import ttk
+import tkinter.font as tkfont
+
+
+class VirtualTreeview(ttk.Frame):
+    """A list view that only creates Treeview items for the rows on screen.
+
+    Rows are identified by string keys (set_rows) and their column values come
+    from row_values(key), which is only called for rows that become visible.
+    Redrawing compares the new values with what is shown, so after an edit
+    only the rows that really changed are touched. The selection is kept by
+    key, so it survives scrolling and reloads.
+
+    Column headings and widths are set on self.tree as on a plain Treeview.
+    """
+
+    STYLE = 'Virtual.Treeview'
+    WHEEL_UNITS = 3
+
+    def __init__(self, master, columns, row_values, **kwargs):
+        super().__init__(master, **kwargs)
+        self.row_values = row_values
+        self.keys = []
+        self.first = 0
+        self.visible = 1
+        self.selected = None
+        self._positions = None  # key -> row number, built when needed
+        self._values = {}       # key -> column values, until the next set_rows()
+        self._shown = {}        # item -> values currently in the Treeview
+
+        # A fixed row height lets the number of visible rows be computed
+        self.row_height = tkfont.nametofont('TkDefaultFont').metrics('linespace') + 4
+        ttk.Style(self).configure(self.STYLE, rowheight=self.row_height)
+
+        self.tree = ttk.Treeview(self, columns=columns, show='headings',
+                                 selectmode='browse', style=self.STYLE)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+
+        self.tree.bind('<Configure>', self._on_configure)
+        self.tree.bind('<<TreeviewSelect>>', self._on_select)
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.tree.bind(sequence, self._on_wheel)
+        for sequence, step in (('<Up>', -1), ('<Down>', 1), ('<Prior>', 'page-up'),
+                               ('<Next>', 'page-down'), ('<Home>', 'home'), ('<End>', 'end')):
+            self.tree.bind(sequence, lambda event, step=step: self._on_key(step))
+
+    # --- rows ---
+    def set_rows(self, keys):
+        """Show these rows (in this order) and recompute the visible ones."""
+        self.keys = list(keys)
+        self._positions = None
+        self._values = {}
+        if self.selected is not None and self.index(self.selected) is None:
+            self.selected = None
+        self._render()
+
+    def refresh(self, keys):
+        """Re-read the values of these rows (after their data changed) and redraw them if visible."""
+        for key in keys:
+            self._values.pop(key, None)
+        self._render()
+
+    def index(self, key):
+        """Row number of key, or None."""
+        if self._positions is None:
+            self._positions = {k: i for i, k in enumerate(self.keys)}
+        return self._positions.get(key)
+
+    def key_at(self, y):
+        """Key of the row at window y, or None."""
+        return self.tree.identify_row(y) or None
+
+    def select(self, key):
+        """Select a row and scroll it into view."""
+        i = self.index(key)
+        if i is None:
+            return
+        self.selected = key
+        if i < self.first:
+            self.first = i
+        elif i >= self.first + self._page():
+            self.first = i - self._page() + 1
+        self._render()
+
+    def _values_of(self, key):
+        values = self._values.get(key)
+        if values is None:
+            values = self._values[key] = tuple(self.row_values(key))
+        return values
+
+    def _page(self):
+        """Rows that are fully visible (the last materialized one may be cut off)."""
+        return max(1, self.visible - 1)
+
+    def _render(self):
+        self.first = max(0, min(self.first, len(self.keys) - self._page()))
+        window = self.keys[self.first:self.first + self.visible]
+        wanted = set(window)
+        stale = [item for item in self.tree.get_children() if item not in wanted]
+        if stale:
+            self.tree.delete(*stale)
+            for item in stale:
+                self._shown.pop(item, None)
+        for key in window:
+            values = self._values_of(key)
+            if key not in self._shown:
+                self.tree.insert('', tk.END, iid=key, values=values)
+            elif self._shown[key] != values:
+                self.tree.item(key, values=values)
+            self._shown[key] = values
+        if tuple(self.tree.get_children()) != tuple(window):
+            self.tree.set_children('', *window)
+        # Keep the Treeview's own scroll position at the top of the window
+        self.tree.yview_moveto(0)
+        if self.selected in wanted:
+            if self.tree.selection() != (self.selected,):
+                self.tree.selection_set(self.selected)
+            self.tree.focus(self.selected)
+        elif self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+        self._update_scrollbar()
+
+    # --- scrolling ---
+    def _update_scrollbar(self):
+        total = len(self.keys)
+        if not total:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.first / total, min(1.0, (self.first + self._page()) / total))
+
+    def yview(self, *args):
+        """Scrollbar command: ('moveto', fraction) or ('scroll', n, 'units'/'pages')."""
+        if not args:
+            return
+        if args[0] == 'moveto':
+            self.first = int(round(float(args[1]) * len(self.keys)))
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            self.first += step * self._page() if args[2] == 'pages' else step
+        self._render()
+
+    def _on_configure(self, event):
+        # The heading takes about one row; one more row may show partly
+        visible = max(1, event.height // self.row_height)
+        if visible != self.visible:
+            self.visible = visible
+            self._render()
+
+    def _on_wheel(self, event):
+        if event.num == 4 or getattr(event, 'delta', 0) > 0:
+            self.yview('scroll', -self.WHEEL_UNITS, 'units')
+        else:
+            self.yview('scroll', self.WHEEL_UNITS, 'units')
+        return 'break'
+
+    def _on_select(self, event):
+        selection = self.tree.selection()
+        # An empty selection only means the selected row scrolled out of the window
+        if selection:
+            self.selected = selection[0]
+
+    def _on_key(self, step):
+        if not self.keys:
+            return 'break'
+        i = self.index(self.selected) if self.selected is not None else None
+        if step == 'home':
+            i = 0
+        elif step == 'end':
+            i = len(self.keys) - 1
+        elif i is None:
+            i = self.first
+        elif step == 'page-up':
+            i -= self._page()
+        elif step == 'page-down':
+            i += self._page()
+        else:
+            i += step
+        self.select(self.keys[max(0, min(i, len(self.keys) - 1))])
+        return 'break'
+
+
+class Tooltip:
+    """A tooltip for the rows of a widget, shown once the pointer rests on a row.
+
+    key_at(y) names the row under the pointer and text_for(key) returns its
+    text (or None for no tooltip). Moving within the same row does nothing;
+    moving to another row restarts the hover delay. The window is created once
+    and reused, and the wrapped text is cached per row until clear() is called.
+    """
+
+    def __init__(self, widget, key_at, text_for, delay=400, duration=5000, width=60, max_chars=300):
+        self.widget = widget
+        self.key_at = key_at
+        self.text_for = text_for
+        self.delay = delay
+        self.duration = duration
+        self.width = width
+        self.max_chars = max_chars
+        self.key = None
+        self.window = None
+        self.label = None
+        self._texts = {}
+        self._pending = None
+        self._position = (0, 0)
+        widget.bind('<Motion>', self._on_motion, add='+')
+        widget.bind('<Leave>', lambda event: self.hide(), add='+')
+        widget.bind('<ButtonPress>', lambda event: self.hide(), add='+')
+
+    def clear(self):
+        """Forget the cached texts (call after the rows change) and hide the tooltip."""
+        self._texts = {}
+        self.hide()
+
+    def hide(self):
+        self.key = None
+        self._cancel()
+        if self.window is not None:
+            self.window.withdraw()
+
+    def _cancel(self):
+        if self._pending is not None:
+            self.widget.after_cancel(self._pending)
+            self._pending = None
+
+    def _on_motion(self, event):
+        self._position = (event.x_root, event.y_root + 10)
+        key = self.key_at(event.y)
+        if key == self.key:
+            return
+        self.hide()
+        self.key = key
+        if key is not None:
+            self._pending = self.widget.after(self.delay, self._show)
+
+    def _wrapped(self, key):
+        if key not in self._texts:
+            text = self.text_for(key)
+            if text:
+                # Limit the length and make sure it's not too wide
+                if len(text) > self.max_chars:
+                    text = text[:self.max_chars - 3] + "..."
+                text = "\n".join(text[i:i + self.width] for i in range(0, len(text), self.width))
+            self._texts[key] = text or None
+        return self._texts[key]
+
+    def _show(self):
+        self._pending = None
+        text = self._wrapped(self.key)
+        if text is None:
+            return
+        if self.window is None:
+            self.window = tk.Toplevel(self.widget)
+            self.window.wm_overrideredirect(True)
+            self.label = tk.Label(self.window, justify=tk.LEFT,
+                                  background="#ffffe0", relief=tk.SOLID, borderwidth=1,
+                                  font=("Arial", "9", "normal"), padx=5, pady=5)
+            self.label.pack()
+        self.label.configure(text=text)
+        self.window.wm_geometry("+%d+%d" % self._position)
+        self.window.deiconify()
+        self.window.lift()
+        # Auto-hide after a while, like before
+        self._pending = self.widget.after(self.duration, self._expire)
+
+    def _expire(self):
+        self._pending = None
+        if self.window is not None:
+            self.window.withdraw()